@@ -171,6 +171,9 @@ inline void export_suite_to_json(const std::string& filename,
         const auto& r = suite.results[i];
         file << "    {\n";
         file << "      \"name\": \"" << r.name << "\",\n";
+        if (!r.module.empty()) {
+            file << "      \"module\": \"" << r.module << "\",\n";
+        }
         file << "      \"iterations\": " << r.iterations << ",\n";
         file << "      \"real_time\": " << r.real_time_ns << ",\n";
         file << "      \"cpu_time\": " << r.cpu_time_ns << "\n";
@@ -0,0 +1,1592 @@
+#!/usr/bin/env python3
+"""
+Benchmark Comparison Tool Tests
+Validates: Requirements 6.2
+
+Tests that tools/analysis/benchmark_compare.py loads Google Benchmark JSON
+output correctly and classifies performance changes.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools" / "analysis"))
+
+import benchmark_caches  # noqa: E402
+import benchmark_changepoint  # noqa: E402
+import benchmark_compare  # noqa: E402
+import benchmark_external  # noqa: E402
+import benchmark_families  # noqa: E402
+import benchmark_history  # noqa: E402
+import benchmark_io  # noqa: E402
+import benchmark_json  # noqa: E402
+import benchmark_jsonl  # noqa: E402
+import benchmark_loader  # noqa: E402
+import benchmark_metrics  # noqa: E402
+import benchmark_parallel  # noqa: E402
+import benchmark_parse_cache  # noqa: E402
+import benchmark_result_cache  # noqa: E402
+import benchmark_runner  # noqa: E402
+import benchmark_stats  # noqa: E402
+import benchmark_topology  # noqa: E402
+import benchmark_table  # noqa: E402
+from benchmark_compare import (  # noqa: E402
+    BenchmarkComparison,
+    ChangeType,
+    _compare_runs,
+    check_regression,
+    collect_result_files,
+    compare_benchmarks,
+    compare_benchmarks_external,
+    compare_result_sets,
+    generate_combined_report,
+    compare_with_history,
+    generate_markdown_report,
+    load_benchmark_json,
+    load_results,
+    write_markdown_report_stream,
+)
+
+
+def make_entry(name: str, cpu_time: float, **extra) -> dict:
+    """Build a Google Benchmark style result entry."""
+    entry = {
+        "name": name,
+        "run_name": name,
+        "run_type": "iteration",
+        "iterations": 1000,
+        "real_time": cpu_time * 1.01,
+        "cpu_time": cpu_time,
+        "time_unit": "ns",
+    }
+    entry.update(extra)
+    return entry
+
+
+def write_results(directory: Path, filename: str, entries: list,
+                  **context) -> str:
+    """Write a Google Benchmark style JSON document and return its path."""
+    path = directory / filename
+    path.write_text(json.dumps({
+        "context": {"host_name": "test", "num_cpus": 4, **context},
+        "benchmarks": entries,
+    }, indent=2))
+    return str(path)
+
+
+def test_streaming_loader_matches_json_load():
+    """The streaming loader must decode the same entries at any chunk size."""
+    entries = [make_entry(f"BM_Test/{i}", 10.0 + i, label="x" * (i % 7))
+               for i in range(50)]
+    text = json.dumps({"context": {"num_cpus": 4}, "benchmarks": entries})
+
+    all_passed = True
+    for chunk_size in (1, 7, 64, 1 << 20):
+        events = benchmark_loader.JsonEventStream(io.StringIO(text), chunk_size)
+        decoded = []
+        for key in events.members():
+            if key == "benchmarks":
+                decoded.extend(events.elements())
+            else:
+                events.value()
+        if decoded != entries:
+            print(f"FAIL: chunk_size={chunk_size} decoded {len(decoded)} entries")
+            all_passed = False
+    if all_passed:
+        print("PASS: streaming loader matches json.load at all chunk sizes")
+    return all_passed
+
+
+def test_json_backends_decode_identically():
+    """Every installed JSON backend yields the stdlib's entries, batch or not."""
+    entries = [make_entry(f"BM_Test/{i}", 10.0 + i / 3, label="}, {" * (i % 3))
+               for i in range(40)]
+    entries[5]["counters"] = {"hits": 2 ** 70}          # beyond 64-bit integers
+    entries[9]["cpu_time"] = float("nan")
+    text = json.dumps({"context": {"num_cpus": 4}, "benchmarks": entries})
+    expected = json.loads(text)["benchmarks"]
+
+    failures = []
+    for name in benchmark_json.available_backends():
+        backend = benchmark_json.get_backend(name)
+        for chunk_size in (16, 256, 1 << 20):
+            events = benchmark_loader.JsonEventStream(io.StringIO(text), chunk_size, backend)
+            decoded = []
+            for key in events.members():
+                if key == "benchmarks":
+                    decoded.extend(events.elements())
+                else:
+                    events.value()
+            # NaN != NaN: compare the serialized form.
+            if json.dumps(decoded) != json.dumps(expected):
+                failures.append(f"{name} at chunk_size={chunk_size}")
+        value = backend.decode('{"x": NaN}')["x"]
+        if value == value:
+            failures.append(f"{name} decode() without NaN fallback")
+
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print(f"PASS: backends {benchmark_json.available_backends()} decode identically")
+    return True
+
+
+def test_loader_keeps_only_needed_fields():
+    """Loaded entries must drop fields the comparator does not use."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_results(Path(tmp), "a.json", [
+            make_entry("BM_A", 5.0, label="unused", counter_x=1.0),
+        ])
+        loaded = list(benchmark_loader.iter_benchmarks(path))
+
+    unexpected = set(loaded[0]) - set(benchmark_loader.KEPT_FIELDS)
+    if unexpected:
+        print(f"FAIL: loader kept unused fields {sorted(unexpected)}")
+        return False
+    print("PASS: loader keeps only needed fields")
+    return True
+
+
+def test_loader_legacy_and_empty_formats():
+    """Empty result sets and the legacy name -> result format must load."""
+    with tempfile.TemporaryDirectory() as tmp:
+        empty = Path(tmp) / "empty.json"
+        empty.write_text('{\n  "benchmarks": []\n}\n')
+        legacy = Path(tmp) / "legacy.json"
+        legacy.write_text(json.dumps({"BM_A": {"cpu_time": 3.0}}))
+
+        if load_benchmark_json(str(empty)) != {}:
+            print("FAIL: empty benchmarks array did not load as {}")
+            return False
+        if load_benchmark_json(str(legacy)) != {"BM_A": {"cpu_time": 3.0}}:
+            print("FAIL: legacy format did not round-trip")
+            return False
+    print("PASS: empty and legacy formats load")
+    return True
+
+
+def test_repetitions_grouped_by_run_name():
+    """Repetitions and aggregates of one run must not overwrite each other."""
+    entries = [make_entry("BM_A", t, repetition_index=i)
+               for i, t in enumerate([10.0, 30.0, 11.0, 12.0, 10.5])]
+    entries += [
+        make_entry("BM_A_mean", 14.7, run_name="BM_A", run_type="aggregate",
+                   aggregate_name="mean"),
+        make_entry("BM_A_median", 11.0, run_name="BM_A", run_type="aggregate",
+                   aggregate_name="median"),
+        make_entry("BM_A_stddev", 8.5, run_name="BM_A", run_type="aggregate",
+                   aggregate_name="stddev"),
+        make_entry("BM_B_mean", 4.0, run_name="BM_B", run_type="aggregate",
+                   aggregate_name="mean"),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = load_benchmark_json(write_results(Path(tmp), "reps.json", entries))
+
+    run = runs["BM_A"]
+    checks = [
+        (sorted(runs) == ["BM_A", "BM_B"], f"run names {sorted(runs)}"),
+        (list(run.time_samples) == [10.0, 30.0, 11.0, 12.0, 10.5],
+         f"samples {list(run.time_samples)}"),
+        (run.aggregates["stddev"]["cpu_time"] == 8.5, "stddev aggregate"),
+        (run.time == 11.0, f"median time {run.time}"),
+        (runs["BM_B"].time == 4.0, "aggregate-only run falls back to mean"),
+    ]
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: repetitions grouped by run_name")
+    return True
+
+
+def test_threshold_classification():
+    """Changes beyond the threshold are classified as regressions/improvements."""
+    baseline = {"BM_A": {"cpu_time": 100.0}, "BM_B": {"cpu_time": 100.0},
+                "BM_C": {"cpu_time": 100.0}, "BM_Old": {"cpu_time": 1.0}}
+    current = {"BM_A": {"cpu_time": 120.0}, "BM_B": {"cpu_time": 80.0},
+               "BM_C": {"cpu_time": 105.0}, "BM_New": {"cpu_time": 1.0}}
+    expected = {
+        "BM_A": ChangeType.REGRESSION,
+        "BM_B": ChangeType.IMPROVEMENT,
+        "BM_C": ChangeType.UNCHANGED,
+        "BM_New": ChangeType.NEW,
+        "BM_Old": ChangeType.REMOVED,
+    }
+    got = {c.name: c.change_type for c in compare_benchmarks(baseline, current, 0.1)}
+    if got != expected:
+        print(f"FAIL: classification {got}")
+        return False
+    print("PASS: threshold classification")
+    return True
+
+
+def make_run(name: str, samples: list) -> "benchmark_loader.BenchmarkRun":
+    """Build a BenchmarkRun from per-repetition cpu_time samples."""
+    return benchmark_loader.group_runs(
+        make_entry(name, t, repetition_index=i) for i, t in enumerate(samples)
+    )[name]
+
+
+def test_statistical_mode_requires_significance():
+    """A change beyond the threshold must also be significant to count."""
+    baseline = {
+        # Nanosecond-scale and noisy: median moves 20% but samples overlap.
+        "BM_Noisy": make_run("BM_Noisy", [5.0, 9.0, 4.0, 8.0, 5.5, 9.5, 4.5]),
+        # Stable: every current sample is ~4% slower than every baseline one.
+        "BM_Stable": make_run("BM_Stable", [100.0, 100.2, 99.9, 100.1, 100.0, 99.8]),
+    }
+    current = {
+        "BM_Noisy": make_run("BM_Noisy", [9.0, 4.5, 8.5, 6.6, 4.2, 9.8, 5.0]),
+        "BM_Stable": make_run("BM_Stable", [104.0, 104.1, 103.9, 104.2, 104.0, 103.8]),
+    }
+
+    all_passed = True
+    for method in benchmark_stats.STAT_TESTS:
+        got = {c.name: c for c in compare_benchmarks(
+            baseline, current, threshold=0.03, stat_test=method, alpha=0.05)}
+        if got["BM_Noisy"].change_type != ChangeType.UNCHANGED:
+            print(f"FAIL: {method} flagged noisy benchmark "
+                  f"(p={got['BM_Noisy'].p_value})")
+            all_passed = False
+        stable = got["BM_Stable"]
+        if stable.change_type != ChangeType.REGRESSION or stable.effect_size <= 0:
+            print(f"FAIL: {method} missed stable regression "
+                  f"(p={stable.p_value}, effect={stable.effect_size})")
+            all_passed = False
+    if all_passed:
+        print("PASS: statistical mode requires significance")
+    return all_passed
+
+
+def test_exact_mann_whitney_p_value():
+    """Fully separated 5 vs 5 samples give the exact two-sided p = 2/252."""
+    result = benchmark_stats.mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+    if abs(result.p_value - 2 / 252) > 1e-12 or result.effect_size != 1.0:
+        print(f"FAIL: {result}")
+        return False
+    print("PASS: exact Mann-Whitney p-value")
+    return True
+
+
+def test_bootstrap_speedup_intervals():
+    """Bootstrap intervals must bracket the speedup and flag inconclusive ones."""
+    baseline = {
+        "BM_Faster": make_run("BM_Faster", [100.0, 101.0, 99.0, 100.5, 99.5, 100.2]),
+        "BM_Same": make_run("BM_Same", [100.0, 104.0, 97.0, 102.0, 99.0, 101.0]),
+    }
+    current = {
+        "BM_Faster": make_run("BM_Faster", [50.0, 50.5, 49.5, 50.2, 49.8, 50.1]),
+        "BM_Same": make_run("BM_Same", [101.0, 98.0, 103.0, 99.5, 100.5, 97.5]),
+    }
+    comparisons = compare_benchmarks(baseline, current, confidence=0.95, resamples=500)
+    repeat = compare_benchmarks(baseline, current, confidence=0.95, resamples=500)
+    got = {c.name: c for c in comparisons}
+
+    faster, same = got["BM_Faster"], got["BM_Same"]
+    checks = [
+        (faster.speedup_ci[0] <= faster.speedup <= faster.speedup_ci[1],
+         f"speedup {faster.speedup} outside {faster.speedup_ci}"),
+        (faster.speedup_ci[0] > 1.0, f"faster CI {faster.speedup_ci}"),
+        (same.speedup_ci[0] <= 1.0 <= same.speedup_ci[1], f"same CI {same.speedup_ci}"),
+        ([c.speedup_ci for c in comparisons] == [c.speedup_ci for c in repeat],
+         "bootstrap is not deterministic"),
+    ]
+    report = generate_markdown_report(comparisons, "a.json", "b.json")
+    checks.append(("🟡" in report and "Speedup CI" in report, "report lacks CI column"))
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: bootstrap speedup intervals")
+    return True
+
+
+def test_multiple_testing_correction():
+    """Chance regressions among many tests must not survive BH/Holm."""
+    def comparison(name, p_value):
+        return BenchmarkComparison(
+            name=name, baseline_time=100.0, current_time=115.0,
+            change_percent=0.15, change_type=ChangeType.REGRESSION,
+            speedup=100.0 / 115.0, p_value=p_value,
+        )
+
+    # One real regression and one chance hit among 200 tests.
+    def make_set():
+        return ([comparison("BM_Real", 1e-6), comparison("BM_Chance", 0.02)] +
+                [comparison(f"BM_Null/{i}", 0.05 + i / 220) for i in range(198)])
+
+    all_passed = True
+    for method in benchmark_stats.CORRECTIONS:
+        comparisons = make_set()
+        _, regressions = check_regression(comparisons, 0.1, 0.05, method)
+        names = [c.name for c in regressions]
+        if names != ["BM_Real"] or comparisons[1].adjusted_p_value < 0.05:
+            print(f"FAIL: {method} kept {names}")
+            all_passed = False
+
+    _, raw = check_regression(make_set(), 0.1, 0.05)
+    if [c.name for c in raw] != ["BM_Real", "BM_Chance"]:
+        print(f"FAIL: uncorrected check returned {[c.name for c in raw]}")
+        all_passed = False
+
+    # Without p-values there is nothing to correct; the CLI says so.
+    argv = sys.argv
+    sys.argv = ["benchmark_compare.py", "baseline.json", "current.json", "--correction", "bh"]
+    stderr = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(stderr):
+            benchmark_compare.main()
+        code = 0
+    except SystemExit as e:
+        code = e.code
+    finally:
+        sys.argv = argv
+    if code != 2 or "--correction requires --stat-test" not in stderr.getvalue():
+        print(f"FAIL: --correction without --stat-test exited {code}: {stderr.getvalue()}")
+        all_passed = False
+    if all_passed:
+        print("PASS: multiple-testing correction")
+    return all_passed
+
+
+def test_history_ingest_and_trend():
+    """Ingested runs must be queryable per host, oldest first."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = benchmark_history.open_history(str(Path(tmp) / "history.sqlite"))
+        for day, base in enumerate([100.0, 110.0, 120.0], start=1):
+            path = write_results(
+                Path(tmp), f"run{day}.json",
+                [make_entry("BM_A", base + d, repetition_index=i)
+                 for i, d in enumerate([-1.0, 0.0, 1.0])],
+                date=f"2026-10-0{day}T12:00:00+00:00",
+            )
+            benchmark_history.ingest_run(conn, path, git_sha=f"sha{day}")
+        # Same benchmark on different hardware must not mix in.
+        other = write_results(Path(tmp), "other.json", [make_entry("BM_A", 1.0)],
+                              num_cpus=64, date="2026-10-04T12:00:00+00:00")
+        benchmark_history.ingest_run(conn, other)
+
+        host = benchmark_history.host_fingerprint({"num_cpus": 4})
+        trend = benchmark_history.benchmark_trend(conn, "BM_A", host, last=2)
+        medians = benchmark_history.run_medians(conn, host, last=10)
+        conn.close()
+
+    checks = [
+        ([(sha, median) for _, sha, median, _ in trend] == [("sha2", 110.0), ("sha3", 120.0)],
+         f"trend {trend}"),
+        ([m for _, m in medians["BM_A"]] == [100.0, 110.0, 120.0], f"medians {medians}"),
+        (benchmark_history.rolling_median([1.0, 3.0, 2.0, 10.0], 3) == [1.0, 2.0, 2.0, 3.0],
+         "rolling median"),
+    ]
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: history ingest and trend")
+    return True
+
+
+def test_history_window_is_per_benchmark():
+    """Each benchmark gets its own last K runs, however the nights are split into files."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = benchmark_history.open_history(str(Path(tmp) / "history.sqlite"))
+        # Five nights, each split into one file per suite like the nightly CI.
+        for night in range(1, 6):
+            for suite in ("A", "B", "C"):
+                path = write_results(
+                    Path(tmp), f"night{night}_{suite}.json",
+                    [make_entry(f"BM_{suite}/{i}", 100.0 * night + i, repetition_index=r)
+                     for i in range(2) for r in range(3)],
+                    date=f"2026-10-0{night}T0{ord(suite) - 64}:00:00+00:00",
+                )
+                benchmark_history.ingest_run(conn, path)
+        host = benchmark_history.host_fingerprint({"num_cpus": 4})
+        medians = benchmark_history.run_medians(conn, host, last=3)
+        baseline = benchmark_history.history_baseline(conn, host, 3, "BM_A/*")
+        stats = io.StringIO()
+        with contextlib.redirect_stdout(stats):
+            benchmark_history.cmd_stats(
+                conn, argparse.Namespace(host=None, last=3, filter=None))
+            benchmark_history.cmd_changepoints(conn, argparse.Namespace(
+                host=None, last=3, filter=None, method="binseg",
+                penalty=benchmark_changepoint.DEFAULT_PENALTY, min_size=1,
+                min_shift=0.02, jobs=1))
+        conn.close()
+
+    checks = [
+        (len(medians) == 6, f"benchmarks {sorted(medians)}"),
+        (all(len(series) == 3 for series in medians.values()),
+         f"runs per benchmark {[len(s) for s in medians.values()]}"),
+        ([m for _, m in medians["BM_B/1"]] == [301.0, 401.0, 501.0],
+         f"BM_B/1 {medians['BM_B/1']}"),
+        (sorted(baseline) == ["BM_A/0", "BM_A/1"], f"baseline {sorted(baseline)}"),
+        (baseline["BM_A/0"].run_medians == [300.0, 400.0, 500.0],
+         f"BM_A/0 {baseline['BM_A/0']}"),
+        (sum(line.startswith("BM_") and line.split()[1] == "3"
+             for line in stats.getvalue().splitlines()) == 6, f"stats {stats.getvalue()}"),
+        ("(6 benchmarks" in stats.getvalue(), f"changepoints {stats.getvalue()}"),
+    ]
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: history window is per benchmark")
+    return True
+
+
+def test_history_rejects_legacy_files():
+    """Files in the legacy name -> result format are refused, naming the file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = Path(tmp) / "legacy.json"
+        legacy.write_text(json.dumps({"BM_A": {"cpu_time": 1.0}}))
+        current = write_results(Path(tmp), "current.json", [make_entry("BM_A", 1.0)])
+        conn = benchmark_history.open_history(str(Path(tmp) / "history.sqlite"))
+        errors = []
+        try:
+            benchmark_history.ingest_run(conn, str(legacy))
+        except ValueError as e:
+            errors.append(str(e))
+        try:
+            list(benchmark_parallel.iter_parsed([current, str(legacy)], workers=2))
+        except ValueError as e:
+            errors.append(str(e))
+        runs = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        conn.close()
+
+    checks = [
+        (len(errors) == 2, f"errors {errors}"),
+        (all(str(legacy) in e for e in errors), f"file not named: {errors}"),
+        (runs == 0, f"{runs} runs stored"),
+    ]
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: history rejects legacy files")
+    return True
+
+
+def test_history_baseline_outlier_test():
+    """History baselines flag only runs outside the historical spread."""
+    history = {
+        # One unlucky historical run (130) must not shift the reference.
+        "BM_Stable": benchmark_history.HistoryBaseline(
+            "BM_Stable", [100.0, 101.0, 99.5, 130.0, 100.5, 100.2]),
+        "BM_Noisy": benchmark_history.HistoryBaseline(
+            "BM_Noisy", [100.0, 140.0, 80.0, 125.0, 90.0, 110.0]),
+    }
+    current = {"BM_Stable": {"cpu_time": 115.0}, "BM_Noisy": {"cpu_time": 120.0},
+               "BM_New": {"cpu_time": 1.0}}
+    got = {c.name: c for c in compare_with_history(history, current, 0.1, 0.05)}
+
+    checks = [
+        (got["BM_Stable"].change_type == ChangeType.REGRESSION,
+         f"stable: {got['BM_Stable']}"),
+        (got["BM_Stable"].baseline_time == 100.35, "baseline is the history median"),
+        (got["BM_Noisy"].change_type == ChangeType.UNCHANGED, f"noisy: {got['BM_Noisy']}"),
+        (got["BM_New"].change_type == ChangeType.NEW, "new benchmark"),
+    ]
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: history baseline outlier test")
+    return True
+
+
+def test_changepoint_detection():
+    """A 6% step in a noisy history is located; a flat history has none."""
+    import random
+    rng = random.Random(42)
+    stepped = [100.0 * (1 + rng.gauss(0, 0.01)) * (1.06 if i >= 60 else 1.0)
+               for i in range(120)]
+    flat = [100.0 * (1 + rng.gauss(0, 0.01)) for _ in range(120)]
+
+    all_passed = True
+    for method in benchmark_changepoint.METHODS:
+        points = benchmark_changepoint.detect_changepoints(
+            {"BM_Stepped": stepped, "BM_Flat": flat}, workers=1, method=method)
+        got = [(p.benchmark, p.index) for p in points]
+        if got != [("BM_Stepped", 60)] or not 0.05 < points[0].shift < 0.07 \
+                or points[0].confidence < 0.99:
+            print(f"FAIL: {method} found {points}")
+            all_passed = False
+    if all_passed:
+        print("PASS: change-point detection")
+    return all_passed
+
+
+def test_name_parsing_and_scaling_curves():
+    """Names split into family/args/threads/aggregate; curves locate divergence."""
+    parsed = benchmark_families.parse_benchmark_name(
+        "BM_FalseSharing_Packed/4/threads:8/real_time_mean")
+    checks = [
+        ((parsed.family, parsed.args, parsed.threads, parsed.options, parsed.aggregate)
+         == ("BM_FalseSharing_Packed", (4,), 8, ("real_time",), "mean"), f"{parsed}"),
+    ]
+
+    sizes = [1024 * 4 ** i for i in range(7)]
+    baseline = {f"BM_AOS_Update/{n}": {"cpu_time": float(n)} for n in sizes}
+    current = {f"BM_AOS_Update/{n}": {"cpu_time": n * (1.3 if n > 65536 else 1.01)}
+               for n in sizes}
+    baseline["BM_Single/8"] = current["BM_Single/8"] = {"cpu_time": 1.0}
+    curves = benchmark_families.compare_scaling_curves(
+        compare_benchmarks(baseline, current, 0.1), 0.1)
+    checks.append((len(curves) == 1, f"expected one curve, got {len(curves)}"))
+    if curves:
+        curve = curves[0]
+        checks.append((curve.diverged_at == 262144, f"diverged at {curve.diverged_at}"))
+        checks.append((abs(curve.change_after - 0.3) < 1e-9, f"after {curve.change_after}"))
+        checks.append((abs(curve.change_before - 0.01) < 1e-9, f"before {curve.change_before}"))
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: name parsing and scaling curves")
+    return True
+
+
+def test_cache_level_annotation():
+    """Working sets are tagged with their cache level and summarized per level."""
+    context = {"caches": [
+        {"type": "Data", "level": 1, "size": 32768, "num_sharing": 1},
+        {"type": "Instruction", "level": 1, "size": 32768, "num_sharing": 1},
+        {"type": "Unified", "level": 2, "size": 1048576, "num_sharing": 1},
+        {"type": "Unified", "level": 3, "size": 33554432, "num_sharing": 8},
+    ]}
+    hierarchy = benchmark_caches.cache_hierarchy(context)
+    sizes = [1024 * 4 ** i for i in range(8)]
+    baseline = {f"BM_Sequential_NoPrefetch/{n}": {"cpu_time": float(n)} for n in sizes}
+    current = {f"BM_Sequential_NoPrefetch/{n}": {"cpu_time": n * (1.5 if n * 8 > 33554432 else 1.0)}
+               for n in sizes}
+    baseline["BM_Unknown/1024"] = current["BM_Unknown/1024"] = {"cpu_time": 1.0}
+    comparisons = compare_benchmarks(baseline, current, 0.1)
+    benchmark_caches.annotate_cache_levels(comparisons, hierarchy)
+    levels = {c.name: c.cache_level for c in comparisons}
+    summaries = benchmark_caches.summarize_cache_levels(comparisons, hierarchy)
+
+    checks = [
+        (hierarchy == [("L1d", 32768), ("L2", 1048576), ("L3", 33554432)], f"{hierarchy}"),
+        (levels["BM_Sequential_NoPrefetch/1024"] == "L1d", f"{levels}"),
+        (levels["BM_Sequential_NoPrefetch/16384"] == "L2", f"{levels}"),
+        (levels["BM_Sequential_NoPrefetch/4194304"] == "L3", f"{levels}"),
+        (levels["BM_Sequential_NoPrefetch/16777216"] == "DRAM", f"{levels}"),
+        (levels["BM_Unknown/1024"] is None, f"{levels}"),
+        ([(s.level, s.regressions) for s in summaries]
+         == [("L1d", 0), ("L2", 0), ("L3", 0), ("DRAM", 1)], f"{summaries}"),
+        (benchmark_caches.regression_locality(summaries)
+         == "Regressed in DRAM-resident sizes only", "verdict"),
+    ]
+    report = generate_markdown_report(comparisons, "b.json", "c.json",
+                                      cache_levels=summaries)
+    checks.append(("## 🧱 Cache Levels" in report and "| DRAM |" in report,
+                   "report lacks the cache-level section"))
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: cache-level annotation")
+    return True
+
+
+def test_multi_metric_comparison():
+    """Units are normalized and throughput/counters compare with their direction."""
+    with tempfile.TemporaryDirectory() as tmp:
+        base = write_results(Path(tmp), "base.json", [
+            make_entry("BM_AddArrays_SIMD/4096", 2.0, time_unit="us",
+                       bytes_per_second=4.0e9, Flops=100.0),
+        ])
+        cur = write_results(Path(tmp), "cur.json", [
+            make_entry("BM_AddArrays_SIMD/4096", 2050.0, time_unit="ns",
+                       bytes_per_second=3.0e9, Flops=130.0),
+        ])
+        metrics = [benchmark_metrics.resolve_metric(m)
+                   for m in ("time", "bytes_per_second", "Flops:higher")]
+        baseline = load_benchmark_json(base, metrics)
+        current = load_benchmark_json(cur, metrics)
+        time_only = load_benchmark_json(base)
+        every = load_benchmark_json(base, [benchmark_metrics.resolve_metric("all")])
+
+    comparisons = {c.metric: c for c in compare_benchmarks(
+        baseline, current, 0.1, metrics=metrics)}
+    run = baseline["BM_AddArrays_SIMD/4096"]
+    throughput = comparisons.get("bytes_per_second")
+    checks = [
+        (run.time == 2000.0, f"time not normalized to ns: {run.time}"),
+        (run.metrics == ["Flops", "bytes_per_second", "cpu_time", "real_time"],
+         f"metrics {run.metrics}"),
+        (time_only["BM_AddArrays_SIMD/4096"].metrics == ["cpu_time", "real_time"],
+         "unselected metrics loaded"),
+        (every["BM_AddArrays_SIMD/4096"].metrics == run.metrics, "'all' misses metrics"),
+        (comparisons["time"].change_type == ChangeType.UNCHANGED, "time"),
+        (throughput.change_type == ChangeType.REGRESSION
+         and abs(throughput.change_percent + 0.25) < 1e-9
+         and abs(throughput.speedup - 0.75) < 1e-9, f"{throughput}"),
+        (comparisons["Flops"].change_type == ChangeType.IMPROVEMENT, "Flops"),
+        (not benchmark_metrics.resolve_metric("Particles").higher_is_better
+         and benchmark_metrics.resolve_metric("mem_bandwidth").higher_is_better,
+         "counter direction guess"),
+    ]
+    report = generate_markdown_report(list(comparisons.values()), "b", "c")
+    checks.append(("BM_AddArrays_SIMD/4096 [bytes_per_second] | 3.73 GiB/s | 2.79 GiB/s"
+                   in report, "report lacks the throughput row"))
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: multi-metric comparison")
+    return True
+
+
+def test_directory_comparison():
+    """Result directories pair by file name and compare in a process pool."""
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir, cur_dir = Path(tmp) / "baseline", Path(tmp) / "results"
+        base_dir.mkdir()
+        cur_dir.mkdir()
+        write_results(base_dir, "memory_bench.json", [make_entry("BM_AOS_Update/1024", 10.0)])
+        write_results(cur_dir, "memory_bench.json", [make_entry("BM_AOS_Update/1024", 13.0)])
+        write_results(base_dir, "simd_bench.json", [make_entry("BM_AddArrays_SIMD/64", 5.0)])
+        write_results(cur_dir, "simd_bench.json", [make_entry("BM_AddArrays_SIMD/64", 5.0)])
+        write_results(cur_dir, "atomic_bench.json", [make_entry("BM_Atomic_SeqCst", 2.0)])
+
+        baseline_files = collect_result_files(str(base_dir))
+        current_files = collect_result_files(str(cur_dir / "*_bench.json"))
+        modules = compare_result_sets(baseline_files, current_files, 0.1, workers=2)
+
+    summary = {m.module: [c.change_type for c in m.comparisons] for m in modules}
+    report = generate_combined_report(modules, "baseline", "results")
+    checks = [
+        (sorted(current_files) == ["atomic_bench", "memory_bench", "simd_bench"],
+         f"{current_files}"),
+        (summary == {
+            "atomic_bench": [ChangeType.NEW],
+            "memory_bench": [ChangeType.REGRESSION],
+            "simd_bench": [ChangeType.UNCHANGED],
+        }, f"{summary}"),
+        ("| **Total** | **0** | **1** | **1** | **1** | **0** |" in report,
+         "combined summary row"),
+        ("## memory_bench" in report and "### ❌ Regressions" in report,
+         "per-module sections"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: directory comparison")
+    return True
+
+
+def test_columnar_tables_match_objects():
+    """Columnar tables classify exactly like per-benchmark comparison objects."""
+    with tempfile.TemporaryDirectory() as tmp:
+        base_entries = [make_entry("BM_Removed", 3.0), make_entry("BM_Aggregate_median", 9.0,
+                        run_name="BM_Aggregate", run_type="aggregate", aggregate_name="median")]
+        cur_entries = [make_entry("BM_New", 1.0), make_entry("BM_Aggregate_median", 12.0,
+                       run_name="BM_Aggregate", run_type="aggregate", aggregate_name="median")]
+        for i, t in enumerate([10.0, 30.0, 11.0]):
+            base_entries.append(make_entry("BM_Rep/8", t, run_name="BM_Rep/8"))
+            cur_entries.append(make_entry("BM_Rep/8", t * 0.5, run_name="BM_Rep/8"))
+        for i in range(20):
+            base_entries.append(make_entry(f"BM_Sweep/{i}", 10.0 + i))
+            cur_entries.append(make_entry(f"BM_Sweep/{i}", (10.0 + i) * (1.0 + 0.02 * i),
+                                          items_per_second=1e6 / (1.0 + 0.02 * i)))
+        base = write_results(Path(tmp), "base.json", base_entries)
+        cur = write_results(Path(tmp), "cur.json", cur_entries)
+        runs = (load_benchmark_json(base), load_benchmark_json(cur))
+        objects = _compare_runs(*runs, 0.1, None, 0.05, None, 0, 1, None, None)
+        comparator = compare_benchmarks(*runs, 0.1)
+        baseline = benchmark_table.ResultTable.from_entries(benchmark_loader.iter_benchmarks(base))
+        current = benchmark_table.ResultTable.from_entries(
+            benchmark_loader.iter_benchmarks(cur, metrics=["items_per_second"]))
+        # The CLI's threshold-only path loads tables, also through the cache.
+        threshold_only = {"threshold": 0.1}
+        loaded = [load_results(path, {}, threshold_only, cache_dir)
+                  for cache_dir in (None, str(Path(tmp) / "cache"), str(Path(tmp) / "cache"))
+                  for path in (base, cur)]
+        cli = compare_benchmarks(*loaded[4:], 0.1)
+    table = benchmark_table.compare_tables(baseline, current, 0.1)
+    columns = list(table.rows())
+    throughput = benchmark_table.compare_tables(
+        baseline, current, 0.1, "items_per_second", higher_is_better=True)
+    sweep = comparator.names.index("BM_Sweep/3")
+    comparator.annotate(sweep, cache_level="L2")
+    comparator[sweep].cache_level = "L3"        # a fresh object: not kept
+
+    checks = [
+        ([(c.name, c.change_type, c.baseline_time, c.current_time) for c in objects]
+         == [(c.name, c.change_type, c.baseline_time, c.current_time) for c in columns],
+         "classification differs from compare_benchmarks"),
+        (all(abs(a.change_percent - b.change_percent) < 1e-12 for a, b in zip(objects, columns)),
+         "change_percent differs"),
+        (baseline.repetitions[baseline.ids["BM_Rep/8"]] == 3, "repetitions"),
+        (table.counts()[ChangeType.REGRESSION]
+         == sum(c.change_type == ChangeType.REGRESSION for c in objects), "counts"),
+        (isinstance(comparator, benchmark_table.ComparisonTable)
+         and list(comparator) == [*comparator[:3], *comparator[3:]]
+         and [(c.name, c.change_type, c.speedup) for c in comparator]
+         == [(c.name, c.change_type, c.speedup) for c in objects],
+         "threshold-only compare_benchmarks is not the equivalent table"),
+        (comparator[sweep].cache_level == "L2" and comparator[-1].name == objects[-1].name,
+         "table annotations"),
+        (all(isinstance(t, benchmark_table.ResultTable) for t in loaded)
+         and all(t.names == u.names and t.column("time") == u.column("time")
+                 for t, u in zip(loaded[2:], loaded * 2))
+         and [(c.name, c.change_type, c.speedup) for c in cli]
+         == [(c.name, c.change_type, c.speedup) for c in objects],
+         "threshold-only loads are not the equivalent tables"),
+        (throughput.counts()[ChangeType.NEW] == 20
+         and [c.name for c in throughput.rows(ChangeType.NEW)][0] == "BM_Sweep/0",
+         f"throughput {throughput.counts()}"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: columnar tables match objects")
+    return True
+
+
+def test_external_sort_merge_matches_in_memory():
+    """The external sort-merge join yields the in-memory comparisons and report."""
+    import random
+    rng = random.Random(7)
+    base_entries, cur_entries = [], []
+    for i in rng.sample(range(300), 300):
+        for _ in range(3):
+            if i % 10 != 1:
+                base_entries.append(make_entry(f"BM_Case/{i}", 10.0 + rng.random(),
+                                               run_name=f"BM_Case/{i}"))
+            if i % 10 != 2:
+                cur_entries.append(make_entry(f"BM_Case/{i}", 10.0 * (1.0 + i % 3 * 0.1)
+                                              + rng.random(), run_name=f"BM_Case/{i}"))
+    rng.shuffle(cur_entries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = write_results(Path(tmp), "base.json", base_entries)
+        cur = write_results(Path(tmp), "cur.json", cur_entries)
+        expected = compare_benchmarks(load_benchmark_json(base), load_benchmark_json(cur),
+                                      0.1, "mannwhitney")
+        # Tiny runs and fan-in force several spilled runs and a merge pass.
+        original_fan_in = benchmark_external.MERGE_FAN_IN
+        benchmark_external.MERGE_FAN_IN = 4
+        try:
+            streamed = list(compare_benchmarks_external(base, cur, 0.1, "mannwhitney",
+                                                        run_size=50, spill_dir=tmp))
+            report_path = str(Path(tmp) / "report.md")
+            write_markdown_report_stream(
+                compare_benchmarks_external(base, cur, 0.1, "mannwhitney", run_size=50),
+                report_path, "b", "c", stat_test=True)
+            streamed_report = Path(report_path).read_text()
+        finally:
+            benchmark_external.MERGE_FAN_IN = original_fan_in
+        leftovers = [p.name for p in Path(tmp).iterdir() if p.name.startswith("bench-merge-")]
+
+    in_memory_report = generate_markdown_report(expected, "b", "c")
+    key = lambda c: (c.name, c.change_type, c.baseline_time, c.current_time, c.p_value)
+    checks = [
+        ([key(c) for c in streamed] == [key(c) for c in expected],
+         "streamed comparisons differ from compare_benchmarks"),
+        (streamed_report.rstrip("\n") == in_memory_report, "streamed report differs"),
+        (not leftovers, f"spill directories left behind: {leftovers}"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: external sort-merge matches in-memory comparison")
+    return True
+
+
+def test_parse_cache_hits_and_eviction():
+    """Cached parses equal direct loads, are keyed by content and evicted LRU."""
+    entries = [make_entry("BM_A", 10.0 + r, run_name="BM_A",
+                          bytes_per_second=1e9, counters={"hits": 3.0})
+               for r in range(3)]
+    entries.append(make_entry("BM_A_median", 11.0, run_name="BM_A",
+                              run_type="aggregate", aggregate_name="median"))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_results(Path(tmp), "a.json", entries, mhz_per_cpu=3000)
+        cache = benchmark_parse_cache.ParseCache(str(Path(tmp) / "cache"))
+        direct_context, cold_context, warm_context = {}, {}, {}
+        direct = benchmark_loader.load_benchmarks(path, direct_context)
+        cold = cache.load(path, cold_context)
+        warm = cache.load(path, warm_context)
+        first = (cache.hits, cache.misses)
+
+        # Same content under another name hits; changed content misses.
+        copy = Path(tmp) / "copy.json"
+        copy.write_bytes(Path(path).read_bytes())
+        cache.load(str(copy))
+        write_results(Path(tmp), "a.json", entries[:2])
+        changed = cache.load(path)
+        second = (cache.hits, cache.misses)
+
+        # Corrupt sidecars are re-parsed, not trusted.
+        sidecar = cache.path_for(benchmark_parse_cache.content_key(path))
+        sidecar.write_bytes(b"garbage")
+        reparsed = cache.load(path)
+        third = cache.misses
+
+        persisted = cache.stats()
+        # The kept metrics are part of the key.
+        counters = [cache.load(path, metrics=["hits"]) for _ in range(2)]
+        selection = (cache.hits - persisted["hits"], cache.misses - persisted["misses"])
+        cache.max_bytes = 0
+        evicted = cache.evict()
+        remaining = cache.entries()
+
+    as_tuple = lambda runs: {n: (dict(r.samples), r.aggregates) for n, r in runs.items()}
+    checks = [
+        (as_tuple(cold) == as_tuple(direct), "cold load differs from load_benchmarks"),
+        (as_tuple(warm) == as_tuple(direct), "warm load differs from load_benchmarks"),
+        (warm_context == direct_context == cold_context, "context not restored"),
+        (first == (1, 1), f"expected one miss then one hit, got {first}"),
+        (second == (2, 2), f"expected copy to hit and change to miss, got {second}"),
+        (len(changed["BM_A"].samples["cpu_time"]) == 2, "stale parse served"),
+        (as_tuple(reparsed) == as_tuple(changed) and third == 3,
+         "corrupt sidecar not re-parsed"),
+        (persisted == {"hits": 2, "misses": 3, "evictions": 0},
+         f"persisted stats wrong: {persisted}"),
+        (selection == (1, 1) and "hits" not in changed["BM_A"].samples
+         and all(list(c["BM_A"].samples["hits"]) == [3.0, 3.0] for c in counters),
+         f"metric selection: {selection}"),
+        (evicted == 3 and not remaining and cache.evictions == 3,
+         f"eviction left {remaining}"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: parse cache hits, invalidation and eviction")
+    return True
+
+
+def test_compressed_results_round_trip():
+    """Compressed results load like plain ones and history exports re-ingest."""
+    entries = [make_entry("BM_A", 10.0 + r, run_name="BM_A", repetition_index=r)
+               for r in range(3)] + [make_entry("BM_B", 5.0)]
+    suffixes = [".gz", ".xz"] + ([".zst"] if benchmark_io.zstd_available() else [])
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = write_results(Path(tmp), "plain.json", entries,
+                              date="2026-10-01T12:00:00+00:00")
+        text = Path(plain).read_text()
+        expected = benchmark_loader.load_benchmarks(plain)
+        loaded = {}
+        for suffix in suffixes:
+            path = str(Path(tmp) / f"mod{suffix[1:]}.json{suffix}")
+            with benchmark_io.open_result(path, "wt") as f:
+                f.write(text)
+            loaded[suffix] = benchmark_loader.load_benchmarks(path)
+        modules = collect_result_files(tmp)
+
+        conn = benchmark_history.open_history(str(Path(tmp) / "history.sqlite"))
+        run_id = benchmark_history.ingest_run(conn, plain)
+        export = str(Path(tmp) / "export.json.gz")
+        exported = benchmark_history.export_run(conn, run_id, export)
+        reingested = benchmark_history.ingest_run(conn, export)
+        rows = lambda rid: conn.execute(
+            "SELECT benchmark, host_fingerprint, timestamp, repetition, cpu_time, "
+            "real_time FROM results WHERE run_id = ? ORDER BY benchmark, repetition",
+            (rid,)).fetchall()
+        original_rows, exported_rows = rows(run_id), rows(reingested)
+        conn.close()
+
+    as_tuple = lambda runs: {n: dict(r.samples) for n, r in runs.items()}
+    checks = [
+        (all(as_tuple(runs) == as_tuple(expected) for runs in loaded.values()),
+         "compressed loads differ from plain"),
+        (set(modules) == {"plain"} | {f"mod{s[1:]}" for s in suffixes},
+         f"result files collected: {sorted(modules)}"),
+        (exported == 4, f"exported {exported} samples"),
+        (exported_rows == original_rows, "re-ingested export differs"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print(f"PASS: compressed results ({', '.join(suffixes)}) round-trip")
+    return True
+
+
+def test_jsonl_index_filter_and_concat():
+    """JSONL shards concatenate, index incrementally and filter by seeking."""
+    entries = [make_entry(f"BM_{kind}/{i}", 10.0 + i + r, run_name=f"BM_{kind}/{i}",
+                          repetition_index=r)
+               for kind in ("Random", "Sequential") for i in range(4) for r in range(2)]
+    with tempfile.TemporaryDirectory() as tmp:
+        document = write_results(Path(tmp), "doc.json", entries)
+        expected = benchmark_loader.load_benchmarks(document)
+        context = json.loads(Path(document).read_text())["context"]
+
+        shards = []
+        for n, half in enumerate((entries[:8], entries[8:])):
+            shard = str(Path(tmp) / f"shard{n}.jsonl")
+            with benchmark_jsonl.JsonlWriter(shard, context) as out:
+                for entry in half:
+                    out.write(entry)
+            shards.append(shard)
+        combined = str(Path(tmp) / "all.jsonl")
+        appended = benchmark_jsonl.concat_jsonl(combined, shards)
+        loaded_context = {}
+        full = benchmark_loader.load_benchmarks(combined, loaded_context)
+        filtered = benchmark_loader.load_benchmarks(combined, pattern="BM_Random_*")
+        random_only = benchmark_loader.load_benchmarks(combined, pattern="BM_Random/*")
+
+        # Lines appended behind the index's back, plus a partial line.
+        with open(combined, "ab") as f:
+            f.write((json.dumps(make_entry("BM_Late", 1.0)) + "\n").encode())
+            f.write(b'{"name": "BM_Parti')
+        late = benchmark_loader.load_benchmarks(combined, pattern="BM_*")
+        index_lines = len(Path(benchmark_jsonl.index_path(combined)).read_text().splitlines())
+
+        converted = str(Path(tmp) / "converted.jsonl.gz")
+        benchmark_jsonl.convert_document(document, converted)
+        with benchmark_jsonl.JsonlWriter(converted) as out:   # appends a gzip member
+            out.write(make_entry("BM_Late", 1.0))
+        compressed = benchmark_loader.load_benchmarks(converted)
+        compressed_filtered = benchmark_loader.load_benchmarks(converted, pattern="BM_Late")
+
+    as_tuple = lambda runs: {n: dict(r.samples) for n, r in runs.items()}
+    random_names = {n for n in expected if n.startswith("BM_Random/")}
+    checks = [
+        (appended == len(entries), f"concat appended {appended}"),
+        (as_tuple(full) == as_tuple(expected), "concatenated JSONL differs from document"),
+        (loaded_context == context, "context header not loaded"),
+        (not filtered, f"non-matching filter loaded {sorted(filtered)}"),
+        (set(random_only) == random_names and
+         as_tuple(random_only) == {n: as_tuple(expected)[n] for n in random_names},
+         f"filtered load: {sorted(random_only)}"),
+        (set(late) == set(expected) | {"BM_Late"}, f"appended line not indexed: {sorted(late)}"),
+        (index_lines == 1 + 2 + len(entries) + 1, f"index has {index_lines} lines"),
+        (set(compressed) == set(expected) | {"BM_Late"}, "compressed JSONL append"),
+        (set(compressed_filtered) == {"BM_Late"}, "compressed JSONL filter"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: JSONL index, filter and concatenation")
+    return True
+
+
+def test_jsonl_index_detects_rewrites():
+    """A rewritten JSONL file gets a new index; convert replaces unless appending."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "run.jsonl")
+        with benchmark_jsonl.JsonlWriter(path, {"host_name": "a"}) as out:
+            out.write(make_entry("BM_Old", 1.0))
+        # Same length and line boundaries, different contents: the old
+        # index still passes the size and newline checks.
+        Path(path).write_text(Path(path).read_text().replace('"a"', '"b"')
+                                                    .replace("BM_Old", "BM_New"))
+        rewritten = benchmark_loader.load_benchmarks(path, pattern="BM_*")
+
+        document = write_results(Path(tmp), "doc.json", [make_entry("BM_A", 1.0)])
+        converted = str(Path(tmp) / "doc.jsonl")
+        benchmark_jsonl.convert_document(document, converted)
+        twice = benchmark_jsonl.convert_document(document, converted)
+        once = len(benchmark_jsonl.load_index(converted))
+        benchmark_jsonl.convert_document(document, converted, append=True)
+        appended = benchmark_jsonl.load_index(converted)
+        fresh = list(benchmark_jsonl._scan(converted, 0))
+
+    checks = [
+        (set(rewritten) == {"BM_New"}, f"stale index used: {sorted(rewritten)}"),
+        (twice == 1 and once == 2, f"convert twice left {once} index entries"),
+        (appended == fresh and len(appended) == 4,
+         f"append: {appended}"),
+    ]
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: JSONL index detects rewritten files")
+    return True
+
+
+def test_parallel_ingest_matches_serial():
+    """Files parsed in worker processes through shared memory ingest identically."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n in range(3):
+            entries = [make_entry(f"BM_Case/{i}", 10.0 * n + i + r / 10,
+                                  run_name=f"BM_Case/{i}", repetition_index=r)
+                       for i in range(20) for r in range(3)]
+            entries.append(make_entry("BM_RealOnly", 1.0))
+            del entries[-1]["cpu_time"]
+            entries.append(make_entry("BM_Aggregates_mean", 5.0, run_name="BM_Aggregates",
+                                      run_type="aggregate", aggregate_name="mean"))
+            paths.append(write_results(Path(tmp), f"run{n}.json", entries,
+                                       date=f"2026-10-0{n + 1}T12:00:00+00:00"))
+        query = ("SELECT benchmark, host_fingerprint, timestamp, repetition, cpu_time, "
+                 "real_time FROM results ORDER BY run_id, benchmark, repetition")
+
+        serial = benchmark_history.open_history(str(Path(tmp) / "serial.sqlite"))
+        for path in paths:
+            benchmark_history.ingest_run(serial, path)
+        expected = serial.execute(query).fetchall()
+        serial.close()
+
+        parallel = benchmark_history.open_history(str(Path(tmp) / "parallel.sqlite"))
+        order = []
+        for columns in benchmark_parallel.iter_parsed(paths, workers=2):
+            order.append(Path(columns.filepath).name)
+            benchmark_history.ingest_columns(parallel, columns)
+        rows = parallel.execute(query).fetchall()
+        parallel.close()
+
+        # Abandoning the iteration early must still free every segment.
+        stream = benchmark_parallel.iter_parsed(paths, workers=2)
+        first = next(stream)
+        segment = first._shm.name
+        stream.close()
+        leaked = Path("/dev/shm", segment).exists()
+
+    checks = [
+        (order == ["run0.json", "run1.json", "run2.json"], f"order {order}"),
+        (rows == expected, "parallel ingest differs from serial"),
+        (len(rows) == 3 * (60 + 1), f"{len(rows)} samples"),
+        (not leaked, "shared memory segment leaked"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: parallel shared-memory ingest matches serial")
+    return True
+
+
+def test_suite_format_grouped_by_module():
+    """BenchmarkSuite results keep their metadata and compare per module."""
+    def suite(path, times, module_field=True):
+        document = {
+            "version": "1.0.0",
+            "compiler": "GCC 13.2.0",
+            "cpu_info": "AMD EPYC 7763",
+            "benchmarks": [
+                dict({"name": name, "iterations": 1000, "real_time": t, "cpu_time": t},
+                     **({"module": module} if module_field else {}))
+                for module, name, t in times
+            ],
+        }
+        path.write_text(json.dumps(document))
+        return str(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir, cur_dir = Path(tmp) / "baseline", Path(tmp) / "results"
+        base_dir.mkdir()
+        cur_dir.mkdir()
+        # Two files, each holding results of several modules.
+        suite(base_dir / "run_a.json", [("02-memory-cache", "BM_AOS", 10.0),
+                                        ("04-simd-vectorization", "BM_Add_SIMD", 5.0)])
+        suite(base_dir / "run_b.json", [("02-memory-cache", "BM_SOA", 8.0)])
+        suite(cur_dir / "run_a.json", [("02-memory-cache", "BM_AOS", 13.0),
+                                       ("04-simd-vectorization", "BM_Add_SIMD", 5.0)])
+        suite(cur_dir / "run_b.json", [("02-memory-cache", "BM_SOA", 8.0)])
+
+        context = {}
+        runs = benchmark_loader.load_benchmarks(str(cur_dir / "run_a.json"), context)
+        modules = compare_result_sets(collect_result_files(str(base_dir)),
+                                      collect_result_files(str(cur_dir)), 0.1, workers=1)
+        selected = compare_result_sets(collect_result_files(str(base_dir)),
+                                       collect_result_files(str(cur_dir)), 0.1,
+                                       workers=1, module_pattern="04-*")
+        plain = suite(Path(tmp) / "plain_bench.json", [("", "BM_X", 1.0)],
+                      module_field=False)
+        plain_modules = compare_result_sets({"plain_bench": plain},
+                                            {"plain_bench": plain}, 0.1, workers=1)
+
+    summary = {m.module: sorted(c.name for c in m.comparisons) for m in modules}
+    report = generate_combined_report(modules, "baseline", "results")
+    checks = [
+        (context.get("compiler") == "GCC 13.2.0" and
+         context.get("cpu_info") == "AMD EPYC 7763", f"context {context}"),
+        (runs["BM_AOS"].module == "02-memory-cache", "module not kept on run"),
+        (summary == {"02-memory-cache": ["BM_AOS", "BM_SOA"],
+                     "04-simd-vectorization": ["BM_Add_SIMD"]}, f"{summary}"),
+        ([c.change_type for c in modules[0].comparisons if c.name == "BM_AOS"] ==
+         [ChangeType.REGRESSION], "regression not attributed to its module"),
+        ([m.module for m in selected] == ["04-simd-vectorization"],
+         f"{[m.module for m in selected]}"),
+        ([m.module for m in plain_modules] == ["plain_bench"],
+         "results without a module fall back to the file name"),
+        ("## 02-memory-cache" in report and "## 04-simd-vectorization" in report,
+         "per-module sections"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: BenchmarkSuite results grouped by module")
+    return True
+
+
+def write_fake_bench(directory: Path, name: str, script: str) -> Path:
+    """An executable standing in for a Google Benchmark binary."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_text(f"#!{sys.executable}\nimport json, sys\n{script}\n")
+    path.chmod(0o755)
+    return path
+
+
+def test_runner_discovers_and_runs_binaries():
+    """The runner finds *_bench executables, keeps good JSON and records failures."""
+    good = ('assert "--benchmark_format=json" in sys.argv\n'
+            'print(json.dumps({"context": {"argv": sys.argv[1:]}, "benchmarks": '
+            '[{"name": "BM_Copy", "run_name": "BM_Copy", "run_type": "iteration", '
+            '"iterations": 10, "real_time": 5.0, "cpu_time": 5.0, "time_unit": "ns"}]}))')
+    bad = 'print(\'{"benchmarks": [\')\nsys.stderr.write("boom\\n")\nsys.exit(3)'
+    with tempfile.TemporaryDirectory() as tmp:
+        build, out = Path(tmp) / "build", Path(tmp) / "results"
+        write_fake_bench(build / "examples" / "02-memory-cache", "aos_vs_soa_bench", good)
+        write_fake_bench(build / "examples" / "05-concurrency", "atomic_bench", bad)
+        write_fake_bench(build / "examples" / "02-memory-cache" / "CMakeFiles", "x_bench", good)
+        (build / "examples" / "02-memory-cache" / "notes_bench").write_text("")  # not executable
+
+        binaries = benchmark_runner.discover_benchmarks(str(build))
+        results = benchmark_runner.run_all(binaries, str(out), ["--benchmark_repetitions=2"])
+        log = benchmark_runner.read_run_log(str(out))
+        context = {}
+        runs = benchmark_loader.load_benchmarks(str(out / "aos_vs_soa_bench.json"), context)
+        files = collect_result_files(str(out))
+        stderr = (out / "atomic_bench.stderr").read_text()
+        compressed = benchmark_runner.run_all(binaries[:1], str(out), compress="gz")
+
+    checks = [
+        ([(b.module, b.name) for b in binaries] ==
+         [("02-memory-cache", "aos_vs_soa_bench"), ("05-concurrency", "atomic_bench")],
+         f"{binaries}"),
+        ([r.ok for r in results] == [True, False], f"{[r.returncode for r in results]}"),
+        (runs["BM_Copy"].time == 5.0 and
+         context["argv"] == ["--benchmark_format=json", "--benchmark_repetitions=2"],
+         f"{context}"),
+        (list(files) == ["aos_vs_soa_bench"], f"failed run published a result: {files}"),
+        (stderr == "boom\n" and log[1]["returncode"] == 3 and log[1]["output"] is None,
+         f"{log[1]}"),
+        (all(record["wall_time"] > 0 for record in log), "wall time not recorded"),
+        (compressed[0].output.endswith("aos_vs_soa_bench.json.gz"), "compressed output"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: runner discovers and runs benchmark binaries")
+    return True
+
+
+FAKE_FAMILY_BENCH = """
+import os, re, time
+NAMES = {names!r}
+if "--benchmark_list_tests=true" in sys.argv:
+    print("\\n".join(NAMES))
+    sys.exit(0)
+pattern = [a.split("=", 1)[1] for a in sys.argv if a.startswith("--benchmark_filter=")]
+selected = [n for n in NAMES if not pattern or re.search(pattern[0], n)]
+start = time.time()
+time.sleep(0.3)
+with open({events!r}, "a") as f:
+    f.write(json.dumps([selected[0].split("/")[0], start, time.time(),
+                        sorted(os.sched_getaffinity(0))]) + "\\n")
+print(json.dumps({{"context": {{}}, "benchmarks": [
+    {{"name": n, "run_name": n, "run_type": "iteration", "iterations": 1,
+      "real_time": 1.0, "cpu_time": 1.0, "time_unit": "ns"}} for n in selected]}}))
+"""
+
+
+def test_topology_and_pinned_scheduling():
+    """Families run concurrently, one per core, with bandwidth/exclusive rules."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Two physical cores with two hardware threads each, one shared L3.
+        sysfs = Path(tmp) / "cpu"
+        for cpu, siblings in ((0, "0,2"), (1, "1,3"), (2, "0,2"), (3, "1,3")):
+            (sysfs / f"cpu{cpu}" / "topology").mkdir(parents=True)
+            (sysfs / f"cpu{cpu}" / "topology" / "thread_siblings_list").write_text(siblings)
+            for index, (level, kind, shared) in enumerate(
+                    ((1, "Data", siblings), (1, "Instruction", siblings), (3, "Unified", "0-3"))):
+                cache = sysfs / f"cpu{cpu}" / "cache" / f"index{index}"
+                cache.mkdir(parents=True)
+                (cache / "level").write_text(f"{level}\n")
+                (cache / "type").write_text(f"{kind}\n")
+                (cache / "shared_cpu_list").write_text(f"{shared}\n")
+                (cache / "size").write_text("32K\n" if level == 1 else "16384K\n")
+        (sysfs / "online").write_text("0-3\n")
+        topology = benchmark_topology.read_topology(str(sysfs), allowed={0, 1, 2, 3})
+
+        # Two scheduling slots sharing an LLC, on a CPU this process may use.
+        cpu = min(os.sched_getaffinity(0))
+        Core = benchmark_topology.Core
+        slots = benchmark_topology.CpuTopology([
+            Core(cpu, frozenset({cpu}), 0),
+            Core(cpu, frozenset({-1}), 0),
+        ])
+        build, out = Path(tmp) / "build" / "examples", Path(tmp) / "results"
+        events = str(Path(tmp) / "events.log")
+        write_fake_bench(build / "02-memory-cache", "prefetch_bench", FAKE_FAMILY_BENCH.format(
+            names=["BM_Sequential_Read/1", "BM_Sequential_Read/2", "BM_Copy/1"], events=events))
+        write_fake_bench(build / "05-concurrency", "mixed_bench", FAKE_FAMILY_BENCH.format(
+            names=["BM_Random_Read/1", "BM_Add/1", "BM_Counter/threads:2"], events=events))
+        binaries = benchmark_runner.discover_benchmarks(str(build.parent))
+        jobs = benchmark_runner.plan_jobs(binaries)
+        # 4M particles of 24 bytes (~100 MB) overflow any LLC; 1K of them do not.
+        write_fake_bench(Path(tmp) / "layout" / "examples" / "02-memory-cache", "aos_bench",
+                         FAKE_FAMILY_BENCH.format(names=["BM_AOS_Update/1024",
+                                                         "BM_AOS_Update/4194304",
+                                                         "BM_SOA_Update/1024"], events=events))
+        layout = benchmark_runner.discover_benchmarks(str(Path(tmp) / "layout"))
+        sized = {job.family: job.bandwidth for job in benchmark_runner.plan_jobs(layout)}
+        small_llc = {job.family: job.bandwidth
+                     for job in benchmark_runner.plan_jobs(layout, llc_bytes=16 * 1024)}
+        results = benchmark_runner.run_all(binaries, str(out), jobs=2, topology=slots)
+        merged = benchmark_loader.load_benchmarks(str(out / "prefetch_bench.json"))
+        with open(events) as f:
+            spans = {family: (start, end) for family, start, end, _ in map(json.loads, f)}
+
+    def overlap(a, b):
+        return spans[a][0] < spans[b][1] and spans[b][0] < spans[a][1]
+
+    plan = {job.family: (job.exclusive, job.bandwidth) for job in jobs}
+    checks = [
+        ([(c.cpu, sorted(c.siblings), c.llc) for c in topology.cores] ==
+         [(0, [0, 2], 0), (1, [1, 3], 0)], f"{topology}"),
+        (topology.llc_bytes == 16 << 20, f"LLC size {topology.llc_bytes}"),
+        (sized == {"BM_AOS_Update": True, "BM_SOA_Update": False}, f"{sized}"),
+        (small_llc == {"BM_AOS_Update": True, "BM_SOA_Update": True}, f"{small_llc}"),
+        (plan == {"BM_Sequential_Read": (False, True), "BM_Copy": (False, False),
+                  "BM_Random_Read": (False, True), "BM_Add": (False, False),
+                  "BM_Counter": (True, False)}, f"{plan}"),
+        (all(r.ok for r in results), f"{[(r.name, r.error, r.stderr) for r in results]}"),
+        (list(merged) == ["BM_Sequential_Read/1", "BM_Sequential_Read/2", "BM_Copy/1"],
+         f"merged {list(merged)}"),
+        (any(overlap(a, b) for a in spans for b in spans if a < b), "nothing ran concurrently"),
+        (not any(overlap("BM_Counter", other) for other in spans if other != "BM_Counter"),
+         "exclusive family overlapped"),
+        (not overlap("BM_Sequential_Read", "BM_Random_Read"),
+         "bandwidth-bound families shared an LLC"),
+        (results[0].cpus == [cpu], f"{results[0].cpus}"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: topology read and families scheduled on pinned cores")
+    return True
+
+
+FAKE_AB_BENCH = """
+import os, re
+NAMES = ["BM_Work/1", "BM_Work/2"]
+if "--benchmark_list_tests=true" in sys.argv:
+    print("\\n".join(NAMES))
+    sys.exit(0)
+pattern = [a.split("=", 1)[1] for a in sys.argv if a.startswith("--benchmark_filter=")][0]
+name = [n for n in NAMES if re.search(pattern, n)][0]
+# The machine drifts: every invocation is slower than the previous one.
+counter = {counter!r}
+calls = int(open(counter).read()) if os.path.exists(counter) else 0
+open(counter, "w").write(str(calls + 1))
+time = {scale} * 100.0 + calls * 1.0
+print(json.dumps({{"context": {{}}, "benchmarks": [
+    {{"name": name, "run_name": name, "run_type": "iteration", "iterations": 1,
+      "real_time": time, "cpu_time": time, "time_unit": "ns"}}]}}))
+"""
+
+
+def test_interleaved_ab_paired_test():
+    """Interleaved A/B samples pair up and the paired test sees through drift."""
+    exact = benchmark_stats.wilcoxon_signed_rank([1, 2, 3, 4, 5, 6], [2, 4, 6, 8, 10, 12])
+    unpaired = benchmark_stats.wilcoxon_signed_rank([1, 2, 3], [1, 2])
+    schedule = benchmark_runner.ab_schedule(["x", "y"], 4, "abba", seed=1)
+    first_side = [side for r, name, side in schedule[::2] if name == "x"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        counter = str(Path(tmp) / "calls")
+        for build, scale in (("base", 1.0), ("cand", 1.03)):
+            write_fake_bench(Path(tmp) / build / "examples" / "02-memory-cache",
+                             "prefetch_bench", FAKE_AB_BENCH.format(counter=counter, scale=scale))
+        pairs = benchmark_runner.pair_binaries(
+            benchmark_runner.discover_benchmarks(str(Path(tmp) / "base")),
+            benchmark_runner.discover_benchmarks(str(Path(tmp) / "cand")))
+        out = Path(tmp) / "ab"
+        results = benchmark_runner.run_interleaved(pairs, str(out), rounds=8, seed=7)
+        contexts = [{}, {}]
+        base = benchmark_loader.load_benchmarks(str(out / "baseline" / "prefetch_bench.json"),
+                                                contexts[0])
+        cand = benchmark_loader.load_benchmarks(str(out / "candidate" / "prefetch_bench.json"),
+                                                contexts[1])
+
+    paired = {c.name: c for c in compare_benchmarks(base, cand, 0.01, stat_test="wilcoxon")}
+    unpaired_mwu = {c.name: c for c in compare_benchmarks(base, cand, 0.01,
+                                                          stat_test="mannwhitney")}
+    sessions = {c["interleaved"]["session"] for c in contexts}
+    checks = [
+        (abs(exact.p_value - 2 / 64) < 1e-12 and exact.effect_size == 1.0, f"{exact}"),
+        (unpaired.p_value is None, "samples of different lengths were paired"),
+        (first_side == [0, 1, 0, 1], f"ABBA order {first_side}"),
+        (all(r.ok for r in results), f"{[(r.name, r.error) for r in results]}"),
+        (len(sessions) == 1 and contexts[1]["interleaved"]["side"] == "candidate",
+         f"{contexts}"),
+        ([base[n].repetitions for n in base] == [8, 8] and
+         [cand[n].repetitions for n in cand] == [8, 8], "samples per side"),
+        (all(c.change_type == ChangeType.REGRESSION and c.p_value < 0.05
+             for c in paired.values()), f"{[(c.name, c.p_value) for c in paired.values()]}"),
+        (all(c.p_value > paired[c.name].p_value for c in unpaired_mwu.values()),
+         "the unpaired test should suffer from the drift"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: interleaved A/B run with paired test")
+    return True
+
+
+FAKE_ADAPTIVE_BENCH = """
+import random, re, time
+NAMES = ["BM_Stable", "BM_Noisy", "BM_Slow"]
+if "--benchmark_list_tests=true" in sys.argv:
+    print("\\n".join(NAMES))
+    sys.exit(0)
+pattern = [a.split("=", 1)[1] for a in sys.argv if a.startswith("--benchmark_filter=")][0]
+name = [n for n in NAMES if re.search(pattern, n)][0]
+reps = int([a.split("=", 1)[1] for a in sys.argv
+            if a.startswith("--benchmark_repetitions=")][0])
+entries = []
+for i in range(reps):
+    if name == "BM_Slow":
+        time.sleep(0.1)
+    spread = 0.001 if name == "BM_Stable" else 0.5
+    t = 100.0 * (1 + spread * random.uniform(-1, 1))
+    entries.append({{"name": name, "run_name": name, "run_type": "iteration",
+                    "repetitions": reps, "repetition_index": i, "iterations": 1,
+                    "real_time": t, "cpu_time": t, "time_unit": "ns"}})
+entries.append({{"name": name + "_mean", "run_name": name, "run_type": "aggregate",
+                "aggregate_name": "mean", "iterations": reps,
+                "real_time": 100.0, "cpu_time": 100.0, "time_unit": "ns"}})
+print(json.dumps({{"context": {{}}, "benchmarks": entries}}))
+"""
+
+
+def test_adaptive_repetitions():
+    """Adaptive runs stop on precision, the repetition cap or the time budget."""
+    t95 = benchmark_stats.t_quantile(0.95, 4)
+    invalid = []
+    for confidence, df in ((1.5, 4), (1.0, 4), (0.0, 4), (0.95, 0)):
+        try:
+            benchmark_stats.t_quantile(confidence, df)
+        except ValueError:
+            invalid.append((confidence, df))
+    precise = benchmark_stats.relative_ci_half_width([10, 10.1, 9.9, 10.05, 9.95])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_fake_bench(Path(tmp) / "build" / "examples" / "01-cpu", "noise_bench",
+                         FAKE_ADAPTIVE_BENCH.format())
+        binaries = benchmark_runner.discover_benchmarks(str(Path(tmp) / "build"))
+        policy = benchmark_runner.AdaptivePolicy(target=0.01, batch=2, min_repetitions=5,
+                                                 max_repetitions=12, time_budget=0.5)
+        out = Path(tmp) / "results"
+        results = benchmark_runner.run_adaptive(
+            binaries, str(out), policy, ["--benchmark_repetitions=3"])
+        context = {}
+        runs = benchmark_loader.load_benchmarks(str(out / "noise_bench.json"), context)
+        log = benchmark_runner.read_run_log(str(out))
+
+    records = results[0].adaptive
+    stopped = {name: record["stopped"] for name, record in records.items()}
+    checks = [
+        (abs(t95 - 2.776) < 1e-3, f"t quantile {t95}"),
+        (abs(precise - 0.0098) < 1e-3, f"relative CI {precise}"),
+        (benchmark_stats.relative_ci_half_width([5.0]) == float("inf"), "one sample"),
+        (len(invalid) == 4, f"accepted invalid t quantiles: {invalid}"),
+        (results[0].ok, f"{results[0].error}"),
+        (stopped == {"BM_Stable": "precision", "BM_Noisy": "max_repetitions",
+                     "BM_Slow": "time_budget"}, f"{stopped}"),
+        (records["BM_Stable"]["repetitions"] == 5, f"{records['BM_Stable']}"),
+        (records["BM_Noisy"]["repetitions"] == 12, f"{records['BM_Noisy']}"),
+        ({n: r.repetitions for n, r in runs.items()} ==
+         {n: r["repetitions"] for n, r in records.items()}, "samples in the result file"),
+        (context["adaptive"]["benchmarks"] == records, f"{context.get('adaptive')}"),
+        (log[0]["adaptive"] == records, "run log records the stopping reasons"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: adaptive repetitions")
+    return True
+
+
+def test_runner_rejects_invalid_adaptive_options():
+    """Out-of-range adaptive options are CLI errors, also next to --cache-dir."""
+    rejected = []
+    for options in (["--confidence", "1.5"], ["--batch", "0"], ["--max-repetitions", "0"],
+                    ["--cache-dir", "cache"]):
+        argv = sys.argv
+        sys.argv = ["benchmark_runner.py", "no-such-build", "--adaptive", *options]
+        stderr = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(stderr):
+                benchmark_runner.main()
+            code = 0
+        except SystemExit as e:
+            code = e.code
+        finally:
+            sys.argv = argv
+        rejected.append((options[0], code, "error:" in stderr.getvalue()))
+
+    failures = [r for r in rejected if r[1] != 2 or not r[2]]
+    if failures:
+        print(f"FAIL: accepted or misreported: {failures}")
+        return False
+    print("PASS: invalid adaptive options rejected")
+    return True
+
+
+def test_result_cache_skips_unchanged_binaries():
+    """Unchanged executables are restored from the result cache, not rerun."""
+    script = ('from pathlib import Path\n'
+              'calls = Path(sys.argv[0] + ".calls")\n'
+              'calls.write_text(str(int(calls.read_text()) + 1 if calls.exists() else 1))\n'
+              'print(json.dumps({"context": {}, "benchmarks": [{"name": "BM_X", '
+              '"run_type": "iteration", "iterations": 1, "real_time": 5.0, '
+              '"cpu_time": 5.0, "time_unit": "ns"}]}))\n')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build = Path(tmp) / "build" / "examples" / "01-cpu"
+        first = write_fake_bench(build, "a_bench", script)
+        second = write_fake_bench(build, "b_bench", script)
+        binaries = benchmark_runner.discover_benchmarks(str(Path(tmp) / "build"))
+        out = Path(tmp) / "results"
+
+        def cache(env=None, max_bytes=benchmark_parse_cache.DEFAULT_MAX_BYTES):
+            return benchmark_result_cache.ResultCache(str(Path(tmp) / "cache"), max_bytes,
+                                                      env=env or {}, host="h")
+
+        def calls(path):
+            return int(Path(str(path) + ".calls").read_text())
+
+        cold = benchmark_runner.run_all(binaries, str(out), cache=cache())
+        fresh = (out / "a_bench.json").read_text()
+        warm = benchmark_runner.run_all(binaries, str(out), cache=cache(), compress="gz")
+        with benchmark_io.open_result(str(out / "a_bench.json.gz")) as f:
+            restored = f.read()
+        log = benchmark_runner.read_run_log(str(out))
+        calls_warm = (calls(first), calls(second))
+
+        second.write_text(second.read_text() + "# rebuilt\n")
+        rebuilt = benchmark_runner.run_all(binaries, str(out), cache=cache())
+        other_env = benchmark_runner.run_all(binaries, str(out),
+                                             cache=cache({"OMP_NUM_THREADS": "4"}))
+        key = cache().key_for(str(first), ["--benchmark_min_time=1"])
+        other_args = cache().key_for(str(first), ["--benchmark_min_time=2"])
+        tiny = cache(max_bytes=1)
+        tiny.evict()
+        remaining = tiny.entries()
+
+    checks = [
+        (all(r.ok and not r.cached for r in cold), f"{[(r.name, r.error) for r in cold]}"),
+        (all(r.ok and r.cached for r in warm), f"{[(r.name, r.cached) for r in warm]}"),
+        (calls_warm == (1, 1), f"cached executables were run again: {calls_warm}"),
+        (restored == fresh, "restored result differs from the stored one"),
+        ([record["cached"] for record in log] == [True, True], f"{log}"),
+        ([r.cached for r in rebuilt] == [True, False], "rebuilt executable not rerun"),
+        (not any(r.cached for r in other_env), "environment not part of the key"),
+        (key != other_args, "arguments not part of the key"),
+        (remaining == [] and tiny.evictions > 0, f"{remaining}"),
+    ]
+
+    failures = [msg for ok, msg in checks if not ok]
+    if failures:
+        print(f"FAIL: {failures}")
+        return False
+    print("PASS: result cache skips unchanged executables")
+    return True
+
+
+def main():
+    """Run all benchmark comparison tests."""
+    print("=" * 60)
+    print("Benchmark Comparison Tool Tests")
+    print("Validates: Requirements 6.2")
+    print("=" * 60)
+    print()
+
+    tests = [
+        test_streaming_loader_matches_json_load,
+        test_json_backends_decode_identically,
+        test_loader_keeps_only_needed_fields,
+        test_loader_legacy_and_empty_formats,
+        test_repetitions_grouped_by_run_name,
+        test_threshold_classification,
+        test_statistical_mode_requires_significance,
+        test_exact_mann_whitney_p_value,
+        test_bootstrap_speedup_intervals,
+        test_multiple_testing_correction,
+        test_history_ingest_and_trend,
+        test_history_window_is_per_benchmark,
+        test_history_rejects_legacy_files,
+        test_history_baseline_outlier_test,
+        test_changepoint_detection,
+        test_name_parsing_and_scaling_curves,
+        test_cache_level_annotation,
+        test_multi_metric_comparison,
+        test_directory_comparison,
+        test_columnar_tables_match_objects,
+        test_external_sort_merge_matches_in_memory,
+        test_parse_cache_hits_and_eviction,
+        test_compressed_results_round_trip,
+        test_jsonl_index_filter_and_concat,
+        test_jsonl_index_detects_rewrites,
+        test_parallel_ingest_matches_serial,
+        test_suite_format_grouped_by_module,
+        test_runner_discovers_and_runs_binaries,
+        test_topology_and_pinned_scheduling,
+        test_interleaved_ab_paired_test,
+        test_adaptive_repetitions,
+        test_runner_rejects_invalid_adaptive_options,
+        test_result_cache_skips_unchanged_binaries,
+    ]
+
+    results = []
+    for test in tests:
+        print(test.__doc__)
+        print("-" * 40)
+        results.append(test())
+        print()
+
+    print("=" * 60)
+    if all(results):
+        print("All tests PASSED")
+        return 0
+    else:
+        print("Some tests FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+loader_memory_bench.py - Peak memory of the streaming loader vs json.load
+
+Usage:
+    python loader_memory_bench.py [--sizes 10000 50000 200000] [--counters 16]
+
+Generates synthetic Google Benchmark JSON files of increasing size (each entry
+padded with user counters, as in our nightly runs with counters enabled) and
+reports the peak traced allocation for:
+- json.load of the whole document (the previous loader)
+- iter_benchmarks (pure streaming, nothing retained)
+- load_benchmarks (streaming, slimmed entries retained)
+
+The iter_benchmarks column should stay flat as the file grows.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_loader import iter_benchmarks, load_benchmarks  # noqa: E402
+
+
+def write_synthetic_results(path: str, entries: int, counters: int):
+    """Write a Google Benchmark style JSON file with ``entries`` benchmarks."""
+    with open(path, "w") as f:
+        f.write('{\n  "context": {"host_name": "bench", "num_cpus": 8},\n')
+        f.write('  "benchmarks": [\n')
+        for i in range(entries):
+            entry = {
+                "name": f"BM_Synthetic/{i}",
+                "run_name": f"BM_Synthetic/{i}",
+                "run_type": "iteration",
+                "repetitions": 1,
+                "repetition_index": 0,
+                "threads": 1,
+                "iterations": 1000 + i,
+                "real_time": 100.0 + i % 97,
+                "cpu_time": 99.0 + i % 89,
+                "time_unit": "ns",
+            }
+            for c in range(counters):
+                entry[f"counter_{c}"] = float(c * i)
+            f.write("    " + json.dumps(entry))
+            f.write(",\n" if i + 1 < entries else "\n")
+        f.write("  ]\n}\n")
+
+
+def measure(fn) -> tuple:
+    """Return (peak traced bytes, seconds) for one call of ``fn``."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def drain(path: str):
+    for _ in iter_benchmarks(path):
+        pass
+
+
+def json_load(path: str):
+    with open(path) as f:
+        json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--counters", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'file MB':>9} | {'json.load MB':>13} "
+          f"{'iter MB':>9} {'load MB':>9} | {'iter s':>7}")
+    print("-" * 70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, f"bench_{n}.json")
+            write_synthetic_results(path, n, args.counters)
+            size_mb = os.path.getsize(path) / 1e6
+
+            json_peak, _ = measure(lambda: json_load(path))
+            iter_peak, iter_s = measure(lambda: drain(path))
+            load_peak, _ = measure(lambda: load_benchmarks(path))
+
+            print(f"{n:>10} {size_mb:>9.1f} | {json_peak / 1e6:>13.1f} "
+                  f"{iter_peak / 1e6:>9.2f} {load_peak / 1e6:>9.1f} | {iter_s:>7.2f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
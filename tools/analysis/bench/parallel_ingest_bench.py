@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+parallel_ingest_bench.py - Scaling of parallel result parsing with workers
+
+Usage:
+    python parallel_ingest_bench.py [--files 32] [--benchmarks 20000] [--workers 1 2 4 8 16 32]
+
+Writes ``--files`` synthetic Google Benchmark documents and, for each worker
+count, times:
+- parse: benchmark_parallel.iter_parsed over all files, touching every
+  sample column in the parent (no database)
+- ingest: the same feeding benchmark_history.ingest_columns into a fresh
+  database, whose writes stay serial
+
+and reports MB/s and the speedup over one worker. With one worker the files
+still go through the pool and shared memory, so the speedups are those of
+the pipeline itself.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_history import ingest_columns, open_history  # noqa: E402
+from benchmark_parallel import iter_parsed  # noqa: E402
+
+
+def write_document(path: Path, benchmarks: int, seed: int):
+    with open(path, "w") as f:
+        f.write('{"context": {"host_name": "bench", "num_cpus": 32}, "benchmarks": [')
+        for i in range(benchmarks):
+            name = f"BM_Synthetic/{i}"
+            for r in range(3):
+                entry = {
+                    "name": name, "run_name": name, "run_type": "iteration",
+                    "repetitions": 3, "repetition_index": r, "iterations": 1000,
+                    "real_time": 100.0 + (i * seed) % 97 + r,
+                    "cpu_time": 99.0 + (i * seed) % 89 + r, "time_unit": "ns",
+                }
+                f.write(("," if i or r else "") + json.dumps(entry))
+        f.write("]}")
+
+
+def parse_only(paths, workers) -> int:
+    total = 0
+    for columns in iter_parsed(paths, workers):
+        total += len(columns) + int(sum(columns.cpu_time) > 0)
+    return total
+
+
+def ingest(paths, workers, db: str) -> int:
+    conn = open_history(db)
+    try:
+        for columns in iter_parsed(paths, workers):
+            ingest_columns(conn, columns)
+    finally:
+        conn.close()
+    return len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--benchmarks", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n in range(args.files):
+            path = Path(tmp) / f"run{n}.json"
+            write_document(path, args.benchmarks, n + 1)
+            paths.append(str(path))
+        size = sum(Path(p).stat().st_size for p in paths) / 1e6
+        print(f"{args.files} files, {size:.0f} MB")
+        print(f"{'workers':>7} | {'parse MB/s':>10} {'speedup':>7} | "
+              f"{'ingest MB/s':>11} {'speedup':>7}")
+        print("-" * 52)
+        base = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            parse_only(paths, workers)
+            parse_s = time.perf_counter() - start
+            start = time.perf_counter()
+            ingest(paths, workers, str(Path(tmp) / f"history{workers}.sqlite"))
+            ingest_s = time.perf_counter() - start
+            base = base or (parse_s, ingest_s)
+            print(f"{workers:>7} | {size / parse_s:>10.1f} {base[0] / parse_s:>6.1f}x | "
+                  f"{size / ingest_s:>11.1f} {base[1] / ingest_s:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+parse_cache_bench.py - Cold parse vs warm parse-cache load of a result file
+
+Usage:
+    python parse_cache_bench.py [--sizes 10000 100000] [--repetitions 3]
+
+Writes a synthetic Google Benchmark document per size and times:
+- parse: benchmark_loader.load_benchmarks (streaming JSON parse)
+- miss: ParseCache.load on an empty cache (parse, then write the sidecar)
+- hit: ParseCache.load with the sidecar present (hash + mmap, no JSON)
+
+Each warm load must return the same runs as the parse.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_loader import load_benchmarks  # noqa: E402
+from benchmark_parse_cache import ParseCache  # noqa: E402
+
+
+def write_document(path: Path, benchmarks: int, repetitions: int):
+    """A result file with ``repetitions`` iteration entries per benchmark."""
+    with open(path, "w") as f:
+        f.write('{"context": {"host_name": "bench", "num_cpus": 8}, "benchmarks": [')
+        first = True
+        for i in range(benchmarks):
+            name = f"BM_Synthetic/{i}"
+            for r in range(repetitions):
+                entry = {
+                    "name": name, "run_name": name, "run_type": "iteration",
+                    "repetitions": repetitions, "repetition_index": r,
+                    "iterations": 1000, "real_time": 100.0 + i % 97 + r,
+                    "cpu_time": 99.0 + i % 89 + r, "time_unit": "ns",
+                    "bytes_per_second": 1e9 + i, "label": "", "family_index": i,
+                }
+                f.write(("" if first else ",") + json.dumps(entry))
+                first = False
+        f.write("]}")
+
+
+def timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'benchmarks':>10} {'file MB':>8} | {'parse s':>8} {'miss s':>8} "
+          f"{'hit s':>8} | {'speedup':>7} | match")
+    print("-" * 70)
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "results.json"
+            write_document(path, n, args.repetitions)
+            parsed, parse_s = timed(load_benchmarks, str(path))
+            cache = ParseCache(str(Path(tmp) / "cache"))
+            _, miss_s = timed(cache.load, str(path))
+            cached, hit_s = timed(cache.load, str(path))
+            match = all(
+                cached[k].samples == run.samples and cached[k].aggregates == run.aggregates
+                for k, run in parsed.items()
+            ) and len(cached) == len(parsed)
+            size = path.stat().st_size / 1e6
+        print(f"{n:>10} {size:>8.1f} | {parse_s:>8.2f} {miss_s:>8.2f} {hit_s:>8.2f} | "
+              f"{parse_s / hit_s:>6.1f}x | {'yes' if match else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
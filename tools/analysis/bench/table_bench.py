@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+table_bench.py - Object graph vs columnar tables for large comparisons
+
+Usage:
+    python table_bench.py [--sizes 10000 100000 300000] [--counters 4]
+    python table_bench.py --sizes 1000000     # needs several GB for the objects
+
+Writes a synthetic baseline and current result file (Google Benchmark JSON,
+every 7th benchmark slower in the current one) and compares them through:
+- objects: load_benchmarks -> BenchmarkRun per benchmark, then one
+  BenchmarkComparison per benchmark (the comparator's path when statistics
+  are requested), counted per classification
+- comparator: what benchmark_compare.py does in threshold-only mode -
+  load_results streams each file into a ResultTable (no BenchmarkRun
+  objects), compare_benchmarks compares the columns
+- cached: the same through a warm parse cache (benchmark_parse_cache)
+
+and reports the peak traced allocation and wall time of each. All must
+classify every benchmark identically.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_compare import (  # noqa: E402
+    _compare_runs, compare_benchmarks, count_types, load_results
+)
+from benchmark_loader import load_benchmarks  # noqa: E402
+
+# compare_benchmarks options of a threshold-only comparison.
+THRESHOLD_ONLY = {"threshold": 0.1}
+
+
+def write_synthetic_results(path: str, entries: int, counters: int, scale: float):
+    """A Google Benchmark JSON file; every 7th benchmark is ``scale`` times slower."""
+    with open(path, "w") as f:
+        f.write('{"context": {"host_name": "bench", "num_cpus": 8},\n"benchmarks": [\n')
+        for i in range(entries):
+            factor = scale if i % 7 == 0 else 1.0
+            entry = {
+                "name": f"BM_Synthetic/{i}",
+                "run_name": f"BM_Synthetic/{i}",
+                "run_type": "iteration",
+                "iterations": 1000,
+                "cpu_time": (99.0 + i % 89) * factor,
+                "real_time": (100.0 + i % 97) * factor,
+                "time_unit": "ns",
+            }
+            for c in range(counters):
+                entry[f"counter_{c}"] = float(c * i)
+            f.write(json.dumps(entry) + (",\n" if i + 1 < entries else "\n"))
+        f.write("]}\n")
+
+
+def with_objects(baseline: str, current: str, cache_dir: str) -> Counter:
+    comparisons = _compare_runs(load_benchmarks(baseline), load_benchmarks(current),
+                                0.1, None, 0.05, None, 0, 1, None, None)
+    return Counter(c.change_type for c in comparisons)
+
+
+def with_comparator(baseline: str, current: str, cache_dir: str) -> Counter:
+    return count_types(compare_benchmarks(load_results(baseline, {}, THRESHOLD_ONLY),
+                                          load_results(current, {}, THRESHOLD_ONLY), 0.1))
+
+
+def with_cache(baseline: str, current: str, cache_dir: str) -> Counter:
+    return count_types(compare_benchmarks(
+        load_results(baseline, {}, THRESHOLD_ONLY, cache_dir),
+        load_results(current, {}, THRESHOLD_ONLY, cache_dir), 0.1))
+
+
+def measure(fn, *args) -> tuple:
+    """
+    Return (result, peak traced bytes, seconds) for ``fn``: timed in a
+    first, untraced call (tracemalloc slows allocation-heavy code several
+    times over), then called again under tracemalloc for the peak.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--counters", type=int, default=4)
+    args = parser.parse_args()
+
+    ways = (("objects", with_objects), ("comparator", with_comparator),
+            ("cached", with_cache))
+    print(f"{'benchmarks':>10} | " + " ".join(f"{w + ' MB':>13}" for w, _ in ways) + " | "
+          + " ".join(f"{w + ' s':>12}" for w, _ in ways) + " | match")
+    print("-" * 101)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            baseline = os.path.join(tmp, f"baseline_{n}.json")
+            current = os.path.join(tmp, f"current_{n}.json")
+            write_synthetic_results(baseline, n, args.counters, 1.0)
+            write_synthetic_results(current, n, args.counters, 1.3)
+            cache_dir = os.path.join(tmp, f"cache_{n}")
+            with_cache(baseline, current, cache_dir)        # warm the cache
+            results = [measure(fn, baseline, current, cache_dir) for _, fn in ways]
+            match = "yes" if all(+r[0] == +results[0][0] for r in results) else "NO"
+            print(f"{n:>10} | " + " ".join(f"{r[1] / 1e6:>13.1f}" for r in results) + " | "
+                  + " ".join(f"{r[2]:>12.2f}" for r in results) + f" | {match}")
+
+
+if __name__ == "__main__":
+    main()
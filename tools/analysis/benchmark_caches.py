@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+benchmark_caches.py - Cache-hierarchy annotation of working-set sweeps
+
+Usage:
+    from benchmark_caches import annotate_cache_levels, summarize_cache_levels
+
+    hierarchy = cache_hierarchy(context)        # from the JSON "context"
+    annotate_cache_levels(comparisons, hierarchy)
+    summaries = summarize_cache_levels(comparisons, hierarchy)
+    print(regression_locality(summaries))
+    # "Regressed in DRAM-resident sizes only"
+
+Features:
+- Working-set size in bytes for the swept argument of known families
+  (AOS/SOA particles, prefetch arrays, alignment buffers)
+- Reads the L1d/L2/L3 sizes Google Benchmark writes to context.caches
+- Tags every result with the cache level its working set fits in
+- Aggregates regressions per cache level, so a change that only hurts
+  DRAM-resident sizes (prefetching, bandwidth) is told apart from one that
+  hurts every size (compute)
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from benchmark_families import parse_benchmark_name
+
+DRAM = "DRAM"
+
+# Bytes touched per element of range(0), from the allocations in
+# examples/02-memory-cache/bench/*.cpp.
+WORKING_SET_BYTES_PER_ELEMENT: Dict[str, int] = {
+    "BM_AOS_Update": 24,                # std::vector<ParticleAOS>, 6 floats each
+    "BM_SOA_Update": 24,                # 6 std::vector<float>
+    "BM_Sequential_NoPrefetch": 8,      # std::vector<int64_t>
+    "BM_Sequential_WithPrefetch": 8,
+    "BM_Random_NoPrefetch": 16,         # int64_t data + size_t shuffled indices
+    "BM_Random_WithPrefetch": 16,
+    "BM_Scalar": 12,                    # a, b, c float buffers
+    "BM_AVX_Aligned": 12,
+    "BM_AVX_Unaligned": 12,
+}
+
+
+@dataclass
+class CacheLevelSummary:
+    level: str
+    size: Optional[int]              # capacity in bytes, None for DRAM
+    benchmarks: int = 0
+    regressions: int = 0
+    improvements: int = 0
+    mean_change: float = 0.0         # mean change_percent of the level
+
+
+def working_set_bytes(name: str) -> Optional[int]:
+    """Working-set size of a benchmark in bytes, or None for unknown families."""
+    parsed = parse_benchmark_name(name)
+    per_element = WORKING_SET_BYTES_PER_ELEMENT.get(parsed.family)
+    if per_element is None or not isinstance(parsed.size, int):
+        return None
+    return parsed.size * per_element
+
+
+def cache_hierarchy(context: Dict) -> List[Tuple[str, int]]:
+    """
+    Data cache levels from a Google Benchmark context, smallest first.
+
+    Instruction caches are skipped; the level-1 data cache is named "L1d",
+    higher levels "L2", "L3", ... Returns [] if the context has no caches.
+    """
+    levels: Dict[int, int] = {}
+    for cache in context.get("caches") or []:
+        if cache.get("type") == "Instruction":
+            continue
+        level, size = cache.get("level"), cache.get("size")
+        if isinstance(level, int) and isinstance(size, int) and size > 0:
+            levels[level] = max(size, levels.get(level, 0))
+    return [
+        ("L1d" if level == 1 else f"L{level}", levels[level])
+        for level in sorted(levels)
+    ]
+
+
+def cache_level(size: int, hierarchy: Sequence[Tuple[str, int]]) -> str:
+    """The smallest cache level a working set of ``size`` bytes fits in."""
+    for level, capacity in hierarchy:
+        if size <= capacity:
+            return level
+    return DRAM
+
+
+def annotate_cache_levels(comparisons, hierarchy: Sequence[Tuple[str, int]]):
+    """
+    Set ``working_set`` and ``cache_level`` on BenchmarkComparison objects
+    of known families. Others are left untouched (None). A ComparisonTable
+    (benchmark_table) keeps them through its annotate().
+    """
+    annotate = getattr(comparisons, "annotate", None)
+    for i, c in enumerate(comparisons):
+        size = working_set_bytes(c.name)
+        if size is not None:
+            c.working_set = size
+            c.cache_level = cache_level(size, hierarchy)
+            if annotate is not None:
+                annotate(i, working_set=size, cache_level=c.cache_level)
+
+
+def summarize_cache_levels(comparisons, hierarchy: Sequence[Tuple[str, int]]) -> List[CacheLevelSummary]:
+    """
+    Aggregate annotated comparisons per cache level, smallest level first.
+
+    Only comparisons present in both runs count; levels without any
+    benchmark are omitted.
+    """
+    summaries = {
+        level: CacheLevelSummary(level, size) for level, size in hierarchy
+    }
+    summaries[DRAM] = CacheLevelSummary(DRAM, None)
+    changes: Dict[str, List[float]] = {}
+    for c in comparisons:
+        level = getattr(c, "cache_level", None)
+        if level is None or c.baseline_time is None or c.current_time is None:
+            continue
+        summary = summaries[level]
+        summary.benchmarks += 1
+        kind = c.change_type.value
+        if kind == "regression":
+            summary.regressions += 1
+        elif kind == "improvement":
+            summary.improvements += 1
+        changes.setdefault(level, []).append(c.change_percent)
+    for level, values in changes.items():
+        summaries[level].mean_change = sum(values) / len(values)
+    return [s for s in summaries.values() if s.benchmarks]
+
+
+def regression_locality(summaries: Sequence[CacheLevelSummary]) -> Optional[str]:
+    """
+    One-line verdict on where regressions live, e.g.
+    "Regressed in DRAM-resident sizes only". None if nothing regressed.
+    """
+    regressed = [s.level for s in summaries if s.regressions]
+    if not regressed:
+        return None
+    if len(regressed) == len(summaries):
+        return "Regressed at every cache level"
+    return f"Regressed in {'/'.join(regressed)}-resident sizes only"
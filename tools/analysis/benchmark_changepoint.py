@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+benchmark_changepoint.py - Change-point detection over benchmark history
+
+Usage:
+    from benchmark_changepoint import detect_changepoints
+
+    points = detect_changepoints({"BM_Random_WithPrefetch/4194304": medians})
+
+    # or from the command line, over a benchmark_history.py database:
+    python benchmark_history.py changepoints --last 200 --min-shift 0.02
+
+Features:
+- Change-in-mean segmentation of each benchmark's per-run medians on
+  log-time, so shifts are relative: binary segmentation (default, O(n log n))
+  or PELT (Pruned Exact Linear Time, exact optimum, slower on long
+  histories with few changes)
+- Noise level estimated per benchmark from successive differences (robust to
+  the shifts themselves)
+- Reports where each shift happened, its magnitude and a confidence derived
+  from Welch's t-test between the adjacent segments
+- All benchmarks are processed in one batch, spread over a process pool for
+  large suites
+"""
+
+import math
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from benchmark_stats import MAD_SCALE, welch_t_test
+
+METHODS = ("binseg", "pelt")
+
+# Penalty per change point, in units of log(n) (BIC-style).
+DEFAULT_PENALTY = 3.0
+
+# Minimum number of runs in a segment.
+DEFAULT_MIN_SIZE = 3
+
+# Number of series from which detection uses a process pool.
+PARALLEL_MIN_SERIES = 512
+
+
+@dataclass
+class ChangePoint:
+    benchmark: str
+    index: int           # first run of the new segment
+    before: float        # median of the segment before
+    after: float         # median of the segment after
+    shift: float         # relative change, (after - before) / before
+    confidence: float    # 1 - p of Welch's t-test between the segments
+
+
+def noise_level(log_values: Sequence[float]) -> float:
+    """
+    Robust noise estimate from successive differences.
+
+    Level shifts only affect a handful of differences, so the scaled MAD of
+    the differences divided by sqrt(2) estimates the per-run noise without
+    being inflated by the changes we are looking for.
+    """
+    diffs = [b - a for a, b in zip(log_values, log_values[1:])]
+    if not diffs:
+        return 0.0
+    center = statistics.median(diffs)
+    return MAD_SCALE * statistics.median(abs(d - center) for d in diffs) / math.sqrt(2.0)
+
+
+def pelt(values: Sequence[float], penalty: float, min_size: int = DEFAULT_MIN_SIZE) -> List[int]:
+    """
+    Optimal change-in-mean segmentation with PELT.
+
+    ``values`` must already be scaled to unit noise. Returns the indices at
+    which new segments start (excluding 0).
+    """
+    n = len(values)
+    if n < 2 * min_size:
+        return []
+
+    s1 = [0.0] * (n + 1)
+    s2 = [0.0] * (n + 1)
+    for i, v in enumerate(values):
+        s1[i + 1] = s1[i] + v
+        s2[i + 1] = s2[i] + v * v
+
+    best = [-penalty] + [math.inf] * n
+    last = [0] * (n + 1)
+    # A candidate start s added at step t is t - min_size + 1, so every
+    # candidate is at least min_size runs behind the next segment end.
+    candidates = [0]
+    for t in range(min_size, n + 1):
+        st1, st2 = s1[t], s2[t]
+        scored = [
+            (best[s] + st2 - s2[s] - (st1 - s1[s]) ** 2 / (t - s), s)
+            for s in candidates
+        ]
+        f, s_best = min(scored)
+        bound = f + penalty
+        best[t] = bound
+        last[t] = s_best
+        # PELT pruning: a start that cannot beat the optimum now never will.
+        candidates = [s for score, s in scored if score <= bound]
+        candidates.append(t - min_size + 1)
+
+    points = []
+    t = last[n]
+    while t > 0:
+        points.append(t)
+        t = last[t]
+    points.reverse()
+    return points
+
+
+def binary_segmentation(
+    values: Sequence[float],
+    penalty: float,
+    min_size: int = DEFAULT_MIN_SIZE
+) -> List[int]:
+    """
+    Change-in-mean segmentation by recursive best splits.
+
+    ``values`` must already be scaled to unit noise. A segment is split at
+    the point that most reduces the squared-error cost, as long as the
+    reduction exceeds ``penalty``. Returns the indices at which new segments
+    start (excluding 0).
+    """
+    n = len(values)
+    s1 = [0.0] * (n + 1)
+    for i, v in enumerate(values):
+        s1[i + 1] = s1[i] + v
+
+    points = []
+    stack = [(0, n)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2 * min_size:
+            continue
+        total = s1[b] - s1[a]
+        base = total * total / (b - a)
+        sa = s1[a]
+        # Cost reduction of splitting at k (the sum-of-squares terms cancel).
+        gain, k = max(
+            ((s1[k] - sa) ** 2 / (k - a) + (total - s1[k] + sa) ** 2 / (b - k), k)
+            for k in range(a + min_size, b - min_size + 1)
+        )
+        if gain - base > penalty:
+            points.append(k)
+            stack.append((a, k))
+            stack.append((k, b))
+    points.sort()
+    return points
+
+
+def series_changepoints(
+    name: str,
+    series: Sequence[float],
+    penalty: float = DEFAULT_PENALTY,
+    min_size: int = DEFAULT_MIN_SIZE,
+    min_shift: float = 0.0,
+    method: str = "binseg"
+) -> List[ChangePoint]:
+    """Change points of one benchmark's series of per-run times."""
+    if len(series) < 2 * min_size or any(v <= 0 for v in series):
+        return []
+    logs = [math.log(v) for v in series]
+    sigma = noise_level(logs)
+    if sigma == 0:
+        sigma = max(1e-9, 1e-6 * abs(statistics.median(logs)))
+    scaled = [v / sigma for v in logs]
+    segment = pelt if method == "pelt" else binary_segmentation
+    starts = segment(scaled, penalty * math.log(len(series)), min_size)
+
+    bounds = [0] + starts + [len(series)]
+    points = []
+    for i, start in enumerate(starts):
+        segment_before = series[bounds[i]:start]
+        segment_after = series[start:bounds[i + 2]]
+        before = statistics.median(segment_before)
+        after = statistics.median(segment_after)
+        shift = (after - before) / before
+        if abs(shift) < min_shift:
+            continue
+        test = welch_t_test(logs[bounds[i]:start], logs[start:bounds[i + 2]])
+        confidence = 1.0 - test.p_value if test.p_value is not None else 0.0
+        points.append(ChangePoint(name, start, before, after, shift, confidence))
+    return points
+
+
+def _detect_chunk(
+    items: List[Tuple[str, List[float]]],
+    penalty: float,
+    min_size: int,
+    min_shift: float,
+    method: str
+) -> List[ChangePoint]:
+    points = []
+    for name, series in items:
+        points.extend(series_changepoints(name, series, penalty, min_size,
+                                          min_shift, method))
+    return points
+
+
+def detect_changepoints(
+    series: Dict[str, Sequence[float]],
+    penalty: float = DEFAULT_PENALTY,
+    min_size: int = DEFAULT_MIN_SIZE,
+    min_shift: float = 0.0,
+    workers: Optional[int] = None,
+    method: str = "binseg"
+) -> List[ChangePoint]:
+    """
+    Detect change points in the history of every benchmark.
+
+    ``series`` maps benchmark name -> per-run times, oldest first. Suites of
+    PARALLEL_MIN_SERIES benchmarks or more are split over a process pool
+    (``workers`` defaults to the CPU count; 1 disables the pool). ``method``
+    is "binseg" or "pelt".
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown change-point method: {method}")
+    items = [(name, list(values)) for name, values in sorted(series.items())]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(items) < PARALLEL_MIN_SERIES:
+        return _detect_chunk(items, penalty, min_size, min_shift, method)
+
+    chunk = -(-len(items) // (workers * 4))
+    points: List[ChangePoint] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_detect_chunk, items[i:i + chunk], penalty, min_size,
+                        min_shift, method)
+            for i in range(0, len(items), chunk)
+        ]
+        for future in futures:
+            points.extend(future.result())
+    return points
@@ -5,54 +5,139 @@ benchmark_compare.py - Compare benchmark results and detect performance regressi
 Usage:
     python benchmark_compare.py baseline.json current.json [--threshold 0.1]
     python benchmark_compare.py --report baseline.json current.json output.md
+    python benchmark_compare.py baseline.json current.json --stat-test mannwhitney
+    python benchmark_compare.py ab/baseline ab/candidate --stat-test wilcoxon
+    python benchmark_compare.py --baseline-history history.sqlite current.json
+    python benchmark_compare.py baseline.json current.json --metric time --metric bytes_per_second
+    python benchmark_compare.py baseline/ results/ --report comparison.md
+    python benchmark_compare.py 'baseline/*_bench.json' 'results/*_bench.json'
+    python benchmark_compare.py baseline.json current.json --external-sort -r out.md
+    python benchmark_compare.py baseline/ results/ --cache-dir .benchmark-cache
+    python benchmark_compare.py baseline.jsonl current.jsonl --filter 'BM_Random_*'
+    python benchmark_compare.py baseline_suite.json suite.json --module '04-*'
 
 Features:
 - Compare two benchmark JSON files
 - Detect performance regressions
 - Generate markdown reports
 - Calculate speedup/slowdown percentages
+- Stream large result files with bounded memory
+- Group --benchmark_repetitions output by run_name instead of keeping the
+  last entry of each name
+- Optional Mann-Whitney U / Welch's t significance testing over repetitions
+  (--stat-test mannwhitney --alpha 0.05)
+- Paired Wilcoxon signed-rank testing of interleaved A/B runs
+  (benchmark_runner.py --ab, then --stat-test wilcoxon)
+- Bootstrap confidence intervals for speedup/change (--ci 0.95)
+- Benjamini-Hochberg / Holm correction across the comparison set
+  (--correction bh)
+- Rolling baseline from benchmark_history.py: median of the last K runs on
+  the same host, with the current run tested as an outlier
+- Scaling-curve comparison per benchmark family (--curves): where a
+  Range() sweep diverged, at which argument, and by how much
+- Cache-level annotation of working-set sweeps (--cache-levels): each result
+  is tagged L1d/L2/L3/DRAM from context.caches and regressions are
+  aggregated per level
+- Multi-metric comparison (--metric): throughput (bytes_per_second,
+  items_per_second) and user counters alongside time, each with its
+  direction, times normalized to nanoseconds
+- Reads .json.gz/.json.xz/.json.zst results directly (benchmark_io.py)
+- Parses with orjson/simdjson when installed (--json-backend, see
+  benchmark_json.py)
+- Reads JSON-Lines results (benchmark_jsonl.py); --filter restricts the
+  comparison to matching benchmarks and seeks straight to them in indexed
+  .jsonl files
+- Directory-wide comparison: two result directories (or globs) are paired
+  by file name and compared concurrently in a process pool, with one
+  combined report that has a section per module
+- Bounded-memory comparison of suites larger than RAM (--external-sort):
+  external sort-merge join streaming into the report writer
+- On-disk cache of parsed result files keyed by content hash (--cache-dir),
+  so unchanged baselines are not re-parsed on every comparison
+- Per-module comparison of BenchmarkSuite results (benchmark_utils.hpp):
+  results carrying a "module" are grouped by it, whichever files they came
+  from, and reported and gated per module (--module restricts to some)
 """
 
 import json
 import argparse
+import fnmatch
+import glob
+import os
+import shutil
 import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
-from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, field
 
+from benchmark_caches import (
+    CacheLevelSummary,
+    annotate_cache_levels,
+    cache_hierarchy,
+    regression_locality,
+    summarize_cache_levels,
+)
+from benchmark_comparison import BenchmarkComparison, ChangeType
+from benchmark_external import RUN_SIZE, iter_joined_runs
+from benchmark_families import CurveComparison, compare_scaling_curves, format_size
+from benchmark_history import (
+    HistoryBaseline,
+    history_baseline,
+    host_fingerprint,
+    open_history,
+)
+from benchmark_io import RESULT_PATTERNS
+from benchmark_json import BACKEND_ENV, BACKEND_NAMES, get_backend
+from benchmark_loader import BenchmarkRun, load_benchmarks
+from benchmark_metrics import (
+    ALL,
+    BUILTIN_METRICS,
+    TIME,
+    Metric,
+    available_metrics,
+    format_metric,
+    loaded_metrics,
+    metric_samples,
+    metric_value,
+    resolve_metric,
+)
+from benchmark_parse_cache import load_cached, load_cached_table
+from benchmark_stats import (
+    CORRECTIONS,
+    STAT_TESTS,
+    adjust_p_values,
+    bootstrap_speedup_ci,
+    outlier_test,
+    run_tests,
+)
+from benchmark_table import ComparisonTable, ResultTable, compare_tables
 
-class ChangeType(Enum):
-    IMPROVEMENT = "improvement"
-    REGRESSION = "regression"
-    UNCHANGED = "unchanged"
-    NEW = "new"
-    REMOVED = "removed"
 
+def load_benchmark_json(filepath: str, metrics: Optional[Sequence[Metric]] = None) -> Dict:
+    """
+    Load benchmark results from JSON file.
 
-@dataclass
-class BenchmarkComparison:
-    name: str
-    baseline_time: Optional[float]
-    current_time: Optional[float]
-    change_percent: float
-    change_type: ChangeType
-    speedup: float
-
-
-def load_benchmark_json(filepath: str) -> Dict:
-    """Load benchmark results from JSON file."""
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-    
+    The "benchmarks" array is streamed one entry at a time (see
+    benchmark_loader.py), so memory stays bounded by what is kept per entry
+    rather than by the size of the document. Throughput fields and user
+    counters are only kept for the ``metrics`` to be compared.
+    """
     # Handle both Google Benchmark format and our custom format
-    if 'benchmarks' in data:
-        return {b['name']: b for b in data['benchmarks']}
-    return data
+    return load_benchmarks(filepath, metrics=loaded_metrics(metrics))
+
 
+def get_time(benchmark) -> float:
+    """
+    Extract time from benchmark result (prefer cpu_time, fallback to real_time).
 
-def get_time(benchmark: Dict) -> float:
-    """Extract time from benchmark result (prefer cpu_time, fallback to real_time)."""
+    For a BenchmarkRun with repetitions this is the median of the samples;
+    for a HistoryBaseline it is the median over the stored runs.
+    """
+    if isinstance(benchmark, (BenchmarkRun, HistoryBaseline)):
+        return benchmark.time
     if 'cpu_time' in benchmark:
         return benchmark['cpu_time']
     if 'real_time' in benchmark:
@@ -60,54 +145,184 @@ def get_time(benchmark: Dict) -> float:
     raise ValueError(f"No time field found in benchmark: {benchmark}")
 
 
+def get_samples(benchmark) -> List[float]:
+    """
+    Extract the per-repetition time samples of a benchmark result.
+
+    Plain result dicts (and runs that only reported aggregates) yield a
+    single sample: their representative time.
+    """
+    if isinstance(benchmark, BenchmarkRun) and benchmark.repetitions:
+        return list(benchmark.time_samples)
+    return [get_time(benchmark)]
+
+
+def _select_metrics(
+    metrics: Sequence[Metric],
+    baseline_bench,
+    current_bench
+) -> List[Metric]:
+    """Expand ALL to TIME plus every non-time metric either side reported."""
+    selected: List[Metric] = []
+    for metric in metrics:
+        if metric.name != ALL:
+            selected.append(metric)
+            continue
+        selected.append(BUILTIN_METRICS[TIME])
+        names = set()
+        for bench in (baseline_bench, current_bench):
+            if bench is not None:
+                names.update(available_metrics(bench))
+        selected.extend(
+            resolve_metric(name) for name in sorted(names)
+            if name not in ("cpu_time", "real_time")
+        )
+    unique = {}
+    for metric in selected:
+        unique.setdefault(metric.name, metric)
+    return list(unique.values())
+
+
 def compare_benchmarks(
+    baseline: Union[Dict, ResultTable],
+    current: Union[Dict, ResultTable],
+    threshold: float = 0.1,
+    stat_test: Optional[str] = None,
+    alpha: float = 0.05,
+    confidence: Optional[float] = None,
+    resamples: int = 1000,
+    workers: Optional[int] = None,
+    correction: Optional[str] = None,
+    metrics: Optional[Sequence[Metric]] = None
+) -> Sequence[BenchmarkComparison]:
+    """
+    Compare two sets of benchmark results.
+
+    Each side may be a BenchmarkRun (from load_benchmark_json) or a plain
+    result dict; runs with repetitions are compared by their median sample.
+
+    With ``stat_test`` ("mannwhitney", "welch", or "wilcoxon" for samples
+    paired by position) the repetition samples of
+    every benchmark are tested in one batch, and a change is only classified
+    as a regression/improvement when it exceeds ``threshold`` *and* its
+    p-value is below ``alpha``. Benchmarks without enough repetitions to be
+    tested keep the threshold-only classification. With ``correction``
+    ("bh" or "holm") the p-values are adjusted across the whole comparison
+    set and the adjusted value is compared against ``alpha``.
+
+    With ``confidence`` (e.g. 0.95) a bootstrap interval for speedup and
+    change_percent is computed for every benchmark with repetitions, using
+    ``resamples`` resamples and up to ``workers`` processes.
+
+    With ``metrics`` (see benchmark_metrics.resolve_metric) each selected
+    metric of each benchmark becomes its own comparison, tagged with
+    ``metric``; all of them go through the same batch of tests. The
+    ``baseline_time``/``current_time`` fields then hold the metric's value
+    and change_percent its relative change, so a higher-is-better metric
+    (throughput) regresses when it drops by more than ``threshold``; speedup
+    is always > 1 for an improvement.
+
+    Without any of these (threshold-only), the times are compared as
+    columns (see benchmark_table) and a ComparisonTable is returned: a
+    read-only sequence whose BenchmarkComparison objects are only created
+    for the rows that are read. Only then may either side be a ResultTable
+    (see load_results), which skips BenchmarkRun objects altogether.
+    """
+    if not (stat_test or confidence or metrics):
+        return compare_tables(_as_table(baseline), _as_table(current), threshold)
+    if isinstance(baseline, ResultTable) or isinstance(current, ResultTable):
+        raise ValueError("result tables only support threshold-only comparisons")
+    return _compare_runs(baseline, current, threshold, stat_test, alpha, confidence,
+                         resamples, workers, correction, metrics)
+
+
+def _as_table(results: Union[Dict, ResultTable]) -> ResultTable:
+    if isinstance(results, ResultTable):
+        return results
+    return ResultTable.from_runs(results, get_time)
+
+
+def _compare_runs(
     baseline: Dict,
     current: Dict,
-    threshold: float = 0.1
+    threshold: float,
+    stat_test: Optional[str],
+    alpha: float,
+    confidence: Optional[float],
+    resamples: int,
+    workers: Optional[int],
+    correction: Optional[str],
+    metrics: Optional[Sequence[Metric]]
 ) -> List[BenchmarkComparison]:
-    """Compare two sets of benchmark results."""
+    """compare_benchmarks() with one BenchmarkComparison per benchmark and metric."""
     comparisons = []
+    sample_pairs = []
+    
+    def value(bench, metric: Optional[Metric]) -> Optional[float]:
+        if bench is None:
+            return None
+        return get_time(bench) if metric is None else metric_value(bench, metric.name)
+    
+    def samples(bench, metric: Optional[Metric]) -> List[float]:
+        return get_samples(bench) if metric is None else metric_samples(bench, metric.name)
     
     all_names = set(baseline.keys()) | set(current.keys())
     
     for name in sorted(all_names):
         baseline_bench = baseline.get(name)
         current_bench = current.get(name)
+        selected = [None] if metrics is None else \
+            _select_metrics(metrics, baseline_bench, current_bench)
         
-        if baseline_bench is None:
-            # New benchmark
-            comparisons.append(BenchmarkComparison(
-                name=name,
-                baseline_time=None,
-                current_time=get_time(current_bench),
-                change_percent=0,
-                change_type=ChangeType.NEW,
-                speedup=1.0
-            ))
-        elif current_bench is None:
-            # Removed benchmark
-            comparisons.append(BenchmarkComparison(
-                name=name,
-                baseline_time=get_time(baseline_bench),
-                current_time=None,
-                change_percent=0,
-                change_type=ChangeType.REMOVED,
-                speedup=1.0
-            ))
-        else:
-            baseline_time = get_time(baseline_bench)
-            current_time = get_time(current_bench)
+        for metric in selected:
+            baseline_time = value(baseline_bench, metric)
+            current_time = value(current_bench, metric)
+            higher_is_better = metric is not None and metric.higher_is_better
+            tags = {} if metric is None else {
+                "metric": metric.name, "higher_is_better": higher_is_better,
+            }
+            
+            if baseline_time is None and current_time is None:
+                continue
+            if baseline_time is None:
+                # New benchmark
+                comparisons.append(BenchmarkComparison(
+                    name=name,
+                    baseline_time=None,
+                    current_time=current_time,
+                    change_percent=0,
+                    change_type=ChangeType.NEW,
+                    speedup=1.0,
+                    **tags
+                ))
+                continue
+            if current_time is None:
+                # Removed benchmark
+                comparisons.append(BenchmarkComparison(
+                    name=name,
+                    baseline_time=baseline_time,
+                    current_time=None,
+                    change_percent=0,
+                    change_type=ChangeType.REMOVED,
+                    speedup=1.0,
+                    **tags
+                ))
+                continue
             
             if baseline_time > 0:
                 change_percent = (current_time - baseline_time) / baseline_time
-                speedup = baseline_time / current_time if current_time > 0 else 0
+                if higher_is_better:
+                    speedup = current_time / baseline_time
+                else:
+                    speedup = baseline_time / current_time if current_time > 0 else 0
             else:
                 change_percent = 0
                 speedup = 1.0
             
-            if change_percent > threshold:
+            worse = -change_percent if higher_is_better else change_percent
+            if worse > threshold:
                 change_type = ChangeType.REGRESSION
-            elif change_percent < -threshold:
+            elif worse < -threshold:
                 change_type = ChangeType.IMPROVEMENT
             else:
                 change_type = ChangeType.UNCHANGED
@@ -118,21 +333,388 @@ def compare_benchmarks(
                 current_time=current_time,
                 change_percent=change_percent,
                 change_type=change_type,
-                speedup=speedup
+                speedup=speedup,
+                **tags
             ))
+            if stat_test or confidence:
+                pair = (samples(baseline_bench, metric), samples(current_bench, metric))
+                # Oriented so that the bootstrapped ratio is the speedup.
+                sample_pairs.append((
+                    comparisons[-1], pair[::-1] if higher_is_better else pair
+                ))
+    
+    if stat_test and sample_pairs:
+        results = run_tests([pair for _, pair in sample_pairs], stat_test)
+        for (c, _), result in zip(sample_pairs, results):
+            c.p_value = result.p_value
+            c.effect_size = result.effect_size
+        if correction:
+            apply_correction(comparisons, correction)
+        for c, _ in sample_pairs:
+            if not is_significant(c, alpha):
+                c.change_type = ChangeType.UNCHANGED
+    
+    if confidence and sample_pairs:
+        intervals = bootstrap_speedup_ci(
+            [pair for _, pair in sample_pairs], confidence, resamples,
+            workers=workers
+        )
+        for (c, _), interval in zip(sample_pairs, intervals):
+            if interval is None:
+                continue
+            low, high = interval
+            c.speedup_ci = interval
+            if c.higher_is_better:
+                c.change_ci = (low - 1.0, high - 1.0)
+            else:
+                # change_percent = 1 / speedup - 1, so the bounds swap.
+                c.change_ci = (1.0 / high - 1.0 if high > 0 else -1.0,
+                               1.0 / low - 1.0 if low > 0 else float("inf"))
     
     return comparisons
 
 
+def compare_benchmarks_external(
+    baseline_file: str,
+    current_file: str,
+    threshold: float = 0.1,
+    stat_test: Optional[str] = None,
+    alpha: float = 0.05,
+    confidence: Optional[float] = None,
+    resamples: int = 1000,
+    metrics: Optional[Sequence[Metric]] = None,
+    run_size: int = RUN_SIZE,
+    spill_dir: Optional[str] = None,
+    pattern: Optional[str] = None
+) -> Iterator[BenchmarkComparison]:
+    """
+    Compare two result files in bounded memory, yielding comparisons in name
+    order (the same order as compare_benchmarks).
+
+    The files are joined by an external sort-merge (see benchmark_external)
+    and each benchmark is classified by compare_benchmarks on its own, so
+    results match the in-memory path. Multiple-testing correction needs
+    every p-value at once and is not available here.
+    """
+    for name, baseline_run, current_run in iter_joined_runs(
+            baseline_file, current_file, run_size, spill_dir, pattern,
+            loaded_metrics(metrics)):
+        yield from compare_benchmarks(
+            {name: baseline_run} if baseline_run is not None else {},
+            {name: current_run} if current_run is not None else {},
+            threshold, stat_test, alpha, confidence, resamples,
+            workers=1, metrics=metrics,
+        )
+
+
+def compare_with_history(
+    history: Dict[str, HistoryBaseline],
+    current: Dict,
+    threshold: float = 0.1,
+    alpha: float = 0.05,
+    correction: Optional[str] = None
+) -> List[BenchmarkComparison]:
+    """
+    Compare a run against rolling baselines computed from stored history.
+
+    The baseline time of each benchmark is the median of its last K per-run
+    medians; the current run is then tested as an outlier of that
+    distribution (robust z-score, reported as effect_size). A change is only
+    classified as a regression/improvement when it exceeds ``threshold`` and
+    the outlier test is significant at ``alpha``. Benchmarks with fewer than
+    three historical runs keep the threshold-only classification.
+    """
+    comparisons = list(compare_benchmarks(history, current, threshold))
+    tested = [
+        c for c in comparisons
+        if c.change_type not in (ChangeType.NEW, ChangeType.REMOVED)
+    ]
+    for c in tested:
+        result = outlier_test(history[c.name].run_medians, c.current_time)
+        c.p_value = result.p_value
+        c.effect_size = result.effect_size
+    if correction:
+        apply_correction(comparisons, correction)
+    for c in tested:
+        if not is_significant(c, alpha):
+            c.change_type = ChangeType.UNCHANGED
+    return comparisons
+
+
+def apply_correction(comparisons: List[BenchmarkComparison], method: str):
+    """Set adjusted_p_value on every tested comparison of the set."""
+    adjusted = adjust_p_values([c.p_value for c in comparisons], method)
+    for c, q in zip(comparisons, adjusted):
+        c.adjusted_p_value = q
+
+
+def is_significant(c: BenchmarkComparison, alpha: float) -> bool:
+    """
+    Whether a comparison's change is statistically significant.
+
+    The adjusted p-value is used when present; untested comparisons count as
+    significant so they keep their threshold-only classification.
+    """
+    p = c.adjusted_p_value if c.adjusted_p_value is not None else c.p_value
+    return p is None or p < alpha
+
+
+def of_type(comparisons: Sequence[BenchmarkComparison],
+            change_type: ChangeType) -> List[BenchmarkComparison]:
+    """The comparisons of one ChangeType; a ComparisonTable creates only those."""
+    if isinstance(comparisons, ComparisonTable):
+        return list(comparisons.rows(change_type))
+    return [c for c in comparisons if c.change_type == change_type]
+
+
+def count_types(comparisons: Sequence[BenchmarkComparison]) -> Counter:
+    """Number of comparisons per ChangeType."""
+    if isinstance(comparisons, ComparisonTable):
+        return Counter(comparisons.counts())
+    return Counter(c.change_type for c in comparisons)
+
+
 def check_regression(
-    comparisons: List[BenchmarkComparison],
-    threshold: float = 0.1
+    comparisons: Sequence[BenchmarkComparison],
+    threshold: float = 0.1,
+    alpha: float = 0.05,
+    correction: Optional[str] = None
 ) -> Tuple[bool, List[BenchmarkComparison]]:
-    """Check if there are any performance regressions."""
-    regressions = [c for c in comparisons if c.change_type == ChangeType.REGRESSION]
+    """
+    Check if there are any performance regressions.
+
+    With ``correction`` ("bh" or "holm") the raw p-values of the whole
+    comparison set - which may span several result files - are adjusted
+    first, and only regressions still significant at ``alpha`` are returned.
+    """
+    if isinstance(comparisons, ComparisonTable):
+        # Threshold-only: nothing was tested, so nothing to correct.
+        regressions = of_type(comparisons, ChangeType.REGRESSION)
+        return len(regressions) > 0, regressions
+    if correction:
+        apply_correction(comparisons, correction)
+    regressions = [
+        c for c in of_type(comparisons, ChangeType.REGRESSION) if is_significant(c, alpha)
+    ]
     return len(regressions) > 0, regressions
 
 
+@dataclass
+class ModuleComparison:
+    """
+    Comparison of one module: a pair of result files in a directory-wide
+    run, or the results of one example module (BenchmarkRun.module).
+    """
+    module: str
+    baseline_file: Optional[str]
+    current_file: Optional[str]
+    comparisons: Sequence[BenchmarkComparison]     # a ComparisonTable if threshold-only
+    context: Dict = field(default_factory=dict)
+    baseline_context: Dict = field(default_factory=dict)
+    curves: Optional[List[CurveComparison]] = None
+    cache_levels: Optional[List[CacheLevelSummary]] = None
+
+
+def is_result_set(spec: str) -> bool:
+    """Whether a command-line path names a directory or a glob of results."""
+    return Path(spec).is_dir() or any(ch in spec for ch in "*?[")
+
+
+def collect_result_files(spec: str) -> Dict[str, str]:
+    """
+    Result files of a directory (its *.json, compressed or not) or glob, by
+    module name.
+
+    The module name is the file name up to its first dot, so
+    results/memory_bench.json pairs with baseline/memory_bench.json.gz.
+    """
+    path = Path(spec)
+    if path.is_dir():
+        paths = sorted(p for pattern in RESULT_PATTERNS for p in path.glob(pattern))
+    else:
+        paths = sorted(Path(p) for p in glob.glob(spec))
+    return {p.name.split(".", 1)[0]: str(p) for p in paths if p.is_file()}
+
+
+def load_results(
+    filepath: str,
+    context: Dict,
+    options: Dict,
+    cache_dir: Optional[str] = None,
+    pattern: Optional[str] = None
+) -> Union[Dict, ResultTable]:
+    """
+    Load a result file for compare_benchmarks(**options): a ResultTable of
+    its times for a threshold-only comparison, else BenchmarkRun objects
+    holding the metrics compared. Through a parse cache in ``cache_dir``.
+    """
+    if not (options.get("stat_test") or options.get("confidence") or options.get("metrics")):
+        return load_cached_table(filepath, context, cache_dir, pattern)
+    return load_cached(filepath, context, cache_dir, pattern,
+                       loaded_metrics(options.get("metrics")))
+
+
+def split_modules(runs: Union[Dict, ResultTable], default: str) -> Dict[str, Dict]:
+    """
+    Loaded runs (or the rows of a table) grouped by the module they belong
+    to; those without a "module" in the results are grouped under ``default``.
+    """
+    if isinstance(runs, ResultTable):
+        if not runs.modules:
+            return {default: runs} if len(runs) else {}
+        rows: Dict[str, List[int]] = {}
+        for row in range(len(runs)):
+            rows.setdefault(runs.modules.get(row, default), []).append(row)
+        return {module: runs.select(selected) for module, selected in rows.items()}
+    groups: Dict[str, Dict] = {}
+    for name, run in runs.items():
+        module = getattr(run, "module", None) or default
+        groups.setdefault(module, {})[name] = run
+    return groups
+
+
+def has_modules(*run_sets: Union[Dict, ResultTable]) -> bool:
+    """Whether any loaded run (or table row) names its module."""
+    return any(
+        runs.modules if isinstance(runs, ResultTable)
+        else any(getattr(run, "module", None) for run in runs.values())
+        for runs in run_sets
+    )
+
+
+def compare_modules(
+    module: str,
+    baseline: Union[Dict, ResultTable],
+    current: Union[Dict, ResultTable],
+    baseline_file: Optional[str],
+    current_file: Optional[str],
+    options: Dict,
+    context: Optional[Dict] = None,
+    baseline_context: Optional[Dict] = None,
+    module_pattern: Optional[str] = None
+) -> List[ModuleComparison]:
+    """
+    Compare loaded runs (or tables, see load_results) module by module (see
+    split_modules), keeping only modules whose name matches the glob
+    ``module_pattern``.
+    """
+    baseline_groups = split_modules(baseline, module)
+    current_groups = split_modules(current, module)
+    names = sorted(set(baseline_groups) | set(current_groups)) or [module]
+    if module_pattern:
+        names = [name for name in names if fnmatch.fnmatchcase(name, module_pattern)]
+    return [
+        ModuleComparison(
+            name, baseline_file, current_file,
+            compare_benchmarks(baseline_groups.get(name, {}),
+                               current_groups.get(name, {}), **options),
+            context if context is not None else {},
+            baseline_context if baseline_context is not None else {},
+        )
+        for name in names
+    ]
+
+
+def _compare_module(
+    module: str,
+    baseline_file: Optional[str],
+    current_file: Optional[str],
+    options: Dict,
+    cache_dir: Optional[str] = None,
+    pattern: Optional[str] = None,
+    module_pattern: Optional[str] = None
+) -> List[ModuleComparison]:
+    baseline_context, context = {}, {}
+    baseline = load_results(baseline_file, baseline_context, options, cache_dir, pattern) \
+        if baseline_file else {}
+    current = load_results(current_file, context, options, cache_dir, pattern) \
+        if current_file else {}
+    return compare_modules(module, baseline, current, baseline_file, current_file,
+                           options, context, baseline_context, module_pattern)
+
+
+def _merge_modules(results: Iterable[ModuleComparison]) -> List[ModuleComparison]:
+    """Combine comparisons of the same module found in several files, by module."""
+    merged: Dict[str, ModuleComparison] = {}
+    for result in results:
+        existing = merged.get(result.module)
+        if existing is None:
+            merged[result.module] = result
+            continue
+        existing.comparisons.extend(result.comparisons)     # list or ComparisonTable
+        for attr in ("baseline_file", "current_file"):
+            files = [f for f in (getattr(existing, attr), getattr(result, attr)) if f]
+            setattr(existing, attr, ", ".join(dict.fromkeys(files)) or None)
+    return [merged[module] for module in sorted(merged)]
+
+
+def correct_across_modules(modules: List[ModuleComparison], correction: str, alpha: float):
+    """Apply a multiple-testing correction across the comparisons of all modules."""
+    comparisons = [c for m in modules if not isinstance(m.comparisons, ComparisonTable)
+                   for c in m.comparisons]
+    apply_correction(comparisons, correction)
+    for c in comparisons:
+        if not is_significant(c, alpha):
+            c.change_type = ChangeType.UNCHANGED
+
+
+def compare_result_sets(
+    baseline_files: Dict[str, str],
+    current_files: Dict[str, str],
+    threshold: float = 0.1,
+    stat_test: Optional[str] = None,
+    alpha: float = 0.05,
+    confidence: Optional[float] = None,
+    resamples: int = 1000,
+    workers: Optional[int] = None,
+    correction: Optional[str] = None,
+    metrics: Optional[Sequence[Metric]] = None,
+    cache_dir: Optional[str] = None,
+    pattern: Optional[str] = None,
+    module_pattern: Optional[str] = None
+) -> List[ModuleComparison]:
+    """
+    Compare result files paired by module name, sorted by module.
+
+    Each pair is loaded and compared (see compare_benchmarks) in its own
+    worker process, up to ``workers`` at a time (default: CPU count; 1
+    compares serially). A file present on one side only compares against an
+    empty set, so its benchmarks are all NEW or REMOVED. ``correction`` is
+    applied across the comparisons of all modules together. With
+    ``cache_dir``, files are loaded through benchmark_parse_cache; with
+    ``pattern``, only benchmarks whose run name matches the glob are compared.
+
+    Results that name their module (BenchmarkSuite output) are compared per
+    module instead of per file, merging a module's results from all files;
+    ``module_pattern`` keeps only modules whose name matches the glob.
+    """
+    options = dict(threshold=threshold, stat_test=stat_test, alpha=alpha,
+                   confidence=confidence, resamples=resamples, metrics=metrics)
+    jobs = [
+        (module, baseline_files.get(module), current_files.get(module))
+        for module in sorted(set(baseline_files) | set(current_files))
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        # Only here may the bootstrap spread over its own pool.
+        results = [_compare_module(*job, dict(options, workers=workers), cache_dir,
+                                   pattern, module_pattern)
+                   for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [
+                pool.submit(_compare_module, *job, dict(options, workers=1),
+                            cache_dir, pattern, module_pattern)
+                for job in jobs
+            ]
+            results = [future.result() for future in futures]
+    results = _merge_modules(m for result in results for m in result)
+    
+    if correction:
+        correct_across_modules(results, correction, alpha)
+    return results
+
+
 def format_time(ns: float) -> str:
     """Format time in nanoseconds to human-readable string."""
     if ns < 1000:
@@ -145,126 +727,427 @@ def format_time(ns: float) -> str:
         return f"{ns/1000000000:.2f} s"
 
 
+def format_value(c: BenchmarkComparison, value: Optional[float]) -> str:
+    """Format a compared value: a time, or the value of c.metric in its unit."""
+    if value is None:
+        return "N/A"
+    if c.metric is None:
+        return format_time(value)
+    return format_metric(value, BUILTIN_METRICS.get(c.metric, Metric(c.metric)))
+
+
+def format_p_value(p: Optional[float]) -> str:
+    """Format a p-value for reports ("N/A" when no test was run)."""
+    if p is None:
+        return "N/A"
+    if p < 0.001:
+        return "<0.001"
+    return f"{p:.3f}"
+
+
+def format_speedup_ci(c: BenchmarkComparison) -> str:
+    """
+    Format the speedup and change confidence intervals of a comparison.
+
+    Intervals that cross 1.0x are inconclusive and marked 🟡; intervals
+    entirely above or below 1.0x are marked 🟢 (faster) or 🔴 (slower).
+    """
+    if c.speedup_ci is None:
+        return "N/A"
+    low, high = c.speedup_ci
+    if low <= 1.0 <= high:
+        marker = "🟡"
+    elif low > 1.0:
+        marker = "🟢"
+    else:
+        marker = "🔴"
+    text = f"{marker} {low:.2f}x – {high:.2f}x"
+    if c.change_ci is not None:
+        text += f" ({c.change_ci[0]*100:+.1f}% … {c.change_ci[1]*100:+.1f}%)"
+    return text
+
+
+def _stat_columns(comparisons: Sequence[BenchmarkComparison]) -> List[Tuple[str, object]]:
+    """Extra report columns for the statistics that were actually computed."""
+    columns = []
+    if isinstance(comparisons, ComparisonTable):
+        return columns                  # threshold-only: no statistics
+    if any(c.p_value is not None for c in comparisons):
+        columns.append(("p-value", lambda c: format_p_value(c.p_value)))
+    if any(c.adjusted_p_value is not None for c in comparisons):
+        columns.append(("Adj. p-value", lambda c: format_p_value(c.adjusted_p_value)))
+    if any(c.speedup_ci is not None for c in comparisons):
+        columns.append(("Speedup CI", format_speedup_ci))
+    return columns
+
+
+def _table_header(headers: List[str]) -> List[str]:
+    """Markdown table header and separator rows."""
+    return [
+        "| " + " | ".join(headers) + " |",
+        "|" + "|".join("-" * (len(h) + 2) for h in headers) + "|",
+    ]
+
+
+def format_curve(curve: CurveComparison) -> str:
+    """Per-point changes of a scaling curve, e.g. "1K +1% → 4K +2% → ..."."""
+    return " → ".join(
+        f"{format_size(size)} {change*100:+.0f}%" for size, change in curve.points
+    )
+
+
+def _curve_lines(curves: List[CurveComparison], heading: str = "##") -> List[str]:
+    """Markdown section for scaling-curve comparisons."""
+    diverged = [c for c in curves if c.diverged]
+    lines = [
+        f"{heading} 📈 Scaling Curves",
+        "",
+        f"{len(diverged)} of {len(curves)} curves diverged.",
+        "",
+    ]
+    lines.extend(_table_header(
+        ["Curve", "Diverged at", "Before", "After", "Max change", "Points"]
+    ))
+    for c in sorted(curves, key=lambda c: (not c.diverged, c.label)):
+        at = format_size(c.diverged_at) if c.diverged else "—"
+        lines.append(
+            f"| {c.label} | {at} | {c.change_before*100:+.1f}% | "
+            f"{c.change_after*100:+.1f}% | {c.max_change*100:+.1f}% | {format_curve(c)} |"
+        )
+    lines.append("")
+    return lines
+
+
+def _cache_level_lines(summaries: List[CacheLevelSummary], heading: str = "##") -> List[str]:
+    """Markdown section for per-cache-level aggregates."""
+    lines = [f"{heading} 🧱 Cache Levels", ""]
+    verdict = regression_locality(summaries)
+    if verdict:
+        lines.extend([f"**{verdict}.**", ""])
+    lines.extend(_table_header(
+        ["Level", "Size", "Benchmarks", "Regressions", "Improvements", "Mean change"]
+    ))
+    for s in summaries:
+        size = format_size(s.size) if s.size else "—"
+        lines.append(
+            f"| {s.level} | {size} | {s.benchmarks} | {s.regressions} | "
+            f"{s.improvements} | {s.mean_change*100:+.1f}% |"
+        )
+    lines.append("")
+    return lines
+
+
 def generate_markdown_report(
-    comparisons: List[BenchmarkComparison],
+    comparisons: Sequence[BenchmarkComparison],
     baseline_file: str,
-    current_file: str
+    current_file: str,
+    curves: Optional[List[CurveComparison]] = None,
+    cache_levels: Optional[List[CacheLevelSummary]] = None
 ) -> str:
-    """Generate a markdown report of benchmark comparisons."""
+    """
+    Generate a markdown report of benchmark comparisons.
+
+    If ``curves`` (from compare_scaling_curves) is given, a scaling-curve
+    section is added before the per-benchmark tables; likewise for
+    ``cache_levels`` (from summarize_cache_levels), which also adds a
+    "Level" column to the tables.
+    """
     lines = [
         "# Benchmark Comparison Report",
         "",
         f"- **Baseline**: `{baseline_file}`",
         f"- **Current**: `{current_file}`",
         "",
-        "## Summary",
-        "",
     ]
+    lines.extend(_report_sections(comparisons, curves, cache_levels))
+    return "\n".join(lines)
+
+
+def _report_sections(
+    comparisons: Sequence[BenchmarkComparison],
+    curves: Optional[List[CurveComparison]] = None,
+    cache_levels: Optional[List[CacheLevelSummary]] = None,
+    heading: str = "##"
+) -> List[str]:
+    """Summary, optional sections and result tables of one comparison set."""
+    lines = [f"{heading} Summary", ""]
     
-    improvements = [c for c in comparisons if c.change_type == ChangeType.IMPROVEMENT]
-    regressions = [c for c in comparisons if c.change_type == ChangeType.REGRESSION]
-    unchanged = [c for c in comparisons if c.change_type == ChangeType.UNCHANGED]
-    new_benchmarks = [c for c in comparisons if c.change_type == ChangeType.NEW]
-    removed = [c for c in comparisons if c.change_type == ChangeType.REMOVED]
+    counts = count_types(comparisons)
+    improvements = of_type(comparisons, ChangeType.IMPROVEMENT)
+    regressions = of_type(comparisons, ChangeType.REGRESSION)
     
     lines.extend([
-        f"- ✅ Improvements: {len(improvements)}",
-        f"- ❌ Regressions: {len(regressions)}",
-        f"- ➖ Unchanged: {len(unchanged)}",
-        f"- 🆕 New: {len(new_benchmarks)}",
-        f"- 🗑️ Removed: {len(removed)}",
+        f"- ✅ Improvements: {counts[ChangeType.IMPROVEMENT]}",
+        f"- ❌ Regressions: {counts[ChangeType.REGRESSION]}",
+        f"- ➖ Unchanged: {counts[ChangeType.UNCHANGED]}",
+        f"- 🆕 New: {counts[ChangeType.NEW]}",
+        f"- 🗑️ Removed: {counts[ChangeType.REMOVED]}",
         "",
     ])
     
+    if curves:
+        lines.extend(_curve_lines(curves, heading))
+    
+    if cache_levels:
+        lines.extend(_cache_level_lines(cache_levels, heading))
+    
+    stat_columns = _stat_columns(comparisons)
+    if cache_levels:
+        stat_columns.insert(0, ("Level", lambda c: c.cache_level or "—"))
+    stat_headers = [header for header, _ in stat_columns]
+    
+    def stat_cells(c: BenchmarkComparison) -> str:
+        return "".join(f" {fmt(c)} |" for _, fmt in stat_columns)
+    
     if regressions:
-        lines.extend([
-            "## ❌ Regressions",
-            "",
-            "| Benchmark | Baseline | Current | Change | Speedup |",
-            "|-----------|----------|---------|--------|---------|",
-        ])
+        lines.extend([f"{heading} ❌ Regressions", ""])
+        lines.extend(_table_header(
+            ["Benchmark", "Baseline", "Current", "Change", "Speedup"] + stat_headers
+        ))
         for c in regressions:
-            baseline_str = format_time(c.baseline_time) if c.baseline_time else "N/A"
-            current_str = format_time(c.current_time) if c.current_time else "N/A"
-            lines.append(
-                f"| {c.name} | {baseline_str} | {current_str} | "
-                f"+{c.change_percent*100:.1f}% | {c.speedup:.2f}x |"
-            )
+            lines.append(_change_row(c) + stat_cells(c))
         lines.append("")
     
     if improvements:
-        lines.extend([
-            "## ✅ Improvements",
-            "",
-            "| Benchmark | Baseline | Current | Change | Speedup |",
-            "|-----------|----------|---------|--------|---------|",
-        ])
+        lines.extend([f"{heading} ✅ Improvements", ""])
+        lines.extend(_table_header(
+            ["Benchmark", "Baseline", "Current", "Change", "Speedup"] + stat_headers
+        ))
         for c in improvements:
-            baseline_str = format_time(c.baseline_time) if c.baseline_time else "N/A"
-            current_str = format_time(c.current_time) if c.current_time else "N/A"
-            lines.append(
-                f"| {c.name} | {baseline_str} | {current_str} | "
-                f"{c.change_percent*100:.1f}% | {c.speedup:.2f}x |"
-            )
+            lines.append(_change_row(c) + stat_cells(c))
         lines.append("")
     
-    lines.extend([
-        "## All Results",
-        "",
-        "| Benchmark | Baseline | Current | Change | Status |",
-        "|-----------|----------|---------|--------|--------|",
-    ])
-    
-    status_emoji = {
-        ChangeType.IMPROVEMENT: "✅",
-        ChangeType.REGRESSION: "❌",
-        ChangeType.UNCHANGED: "➖",
-        ChangeType.NEW: "🆕",
-        ChangeType.REMOVED: "🗑️",
-    }
+    lines.extend([f"{heading} All Results", ""])
+    lines.extend(_table_header(
+        ["Benchmark", "Baseline", "Current", "Change", "Status"] + stat_headers
+    ))
     
     for c in comparisons:
-        baseline_str = format_time(c.baseline_time) if c.baseline_time else "N/A"
-        current_str = format_time(c.current_time) if c.current_time else "N/A"
-        
-        if c.change_type in (ChangeType.NEW, ChangeType.REMOVED):
-            change_str = "N/A"
-        else:
-            sign = "+" if c.change_percent > 0 else ""
-            change_str = f"{sign}{c.change_percent*100:.1f}%"
+        lines.append(_status_row(c) + stat_cells(c))
+    
+    return lines
+
+
+STATUS_EMOJI = {
+    ChangeType.IMPROVEMENT: "✅",
+    ChangeType.REGRESSION: "❌",
+    ChangeType.UNCHANGED: "➖",
+    ChangeType.NEW: "🆕",
+    ChangeType.REMOVED: "🗑️",
+}
+
+
+def _change_row(c: BenchmarkComparison) -> str:
+    """Regressions/Improvements table row, without the statistics cells."""
+    return (
+        f"| {c.label} | {format_value(c, c.baseline_time)} | "
+        f"{format_value(c, c.current_time)} | "
+        f"{c.change_percent*100:+.1f}% | {c.speedup:.2f}x |"
+    )
+
+
+def _status_row(c: BenchmarkComparison) -> str:
+    """All Results table row, without the statistics cells."""
+    if c.change_type in (ChangeType.NEW, ChangeType.REMOVED):
+        change_str = "N/A"
+    else:
+        sign = "+" if c.change_percent > 0 else ""
+        change_str = f"{sign}{c.change_percent*100:.1f}%"
+    return (
+        f"| {c.label} | {format_value(c, c.baseline_time)} | "
+        f"{format_value(c, c.current_time)} | "
+        f"{change_str} | {STATUS_EMOJI[c.change_type]} |"
+    )
+
+
+def write_markdown_report_stream(
+    comparisons: Iterable[BenchmarkComparison],
+    path: str,
+    baseline_file: str,
+    current_file: str,
+    stat_test: bool = False,
+    confidence: bool = False
+) -> Counter:
+    """
+    Write the markdown report of a comparison stream in bounded memory.
+
+    Rows are appended to temporary section files (regressions, improvements,
+    all results) as the comparisons arrive; the summary, which needs the
+    final counts, is written first once the stream is exhausted. Because the
+    statistics columns must be known up front, they are chosen from
+    ``stat_test``/``confidence`` rather than from the data. Returns the
+    number of comparisons per ChangeType.
+    """
+    stat_columns = []
+    if stat_test:
+        stat_columns.append(("p-value", lambda c: format_p_value(c.p_value)))
+    if confidence:
+        stat_columns.append(("Speedup CI", format_speedup_ci))
+    stat_headers = [header for header, _ in stat_columns]
+    
+    def stat_cells(c: BenchmarkComparison) -> str:
+        return "".join(f" {fmt(c)} |" for _, fmt in stat_columns)
+    
+    counts: Counter = Counter()
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as regressions, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as improvements, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as results:
+        for c in comparisons:
+            counts[c.change_type] += 1
+            if c.change_type == ChangeType.REGRESSION:
+                regressions.write(_change_row(c) + stat_cells(c) + "\n")
+            elif c.change_type == ChangeType.IMPROVEMENT:
+                improvements.write(_change_row(c) + stat_cells(c) + "\n")
+            results.write(_status_row(c) + stat_cells(c) + "\n")
         
-        lines.append(
-            f"| {c.name} | {baseline_str} | {current_str} | "
-            f"{change_str} | {status_emoji[c.change_type]} |"
-        )
+        with open(path, "w", encoding="utf-8") as out:
+            out.write("\n".join([
+                "# Benchmark Comparison Report",
+                "",
+                f"- **Baseline**: `{baseline_file}`",
+                f"- **Current**: `{current_file}`",
+                "",
+                "## Summary",
+                "",
+                f"- ✅ Improvements: {counts[ChangeType.IMPROVEMENT]}",
+                f"- ❌ Regressions: {counts[ChangeType.REGRESSION]}",
+                f"- ➖ Unchanged: {counts[ChangeType.UNCHANGED]}",
+                f"- 🆕 New: {counts[ChangeType.NEW]}",
+                f"- 🗑️ Removed: {counts[ChangeType.REMOVED]}",
+                "",
+                "",
+            ]))
+            for title, rows, count in (
+                ("## ❌ Regressions", regressions, counts[ChangeType.REGRESSION]),
+                ("## ✅ Improvements", improvements, counts[ChangeType.IMPROVEMENT]),
+            ):
+                if count:
+                    out.write("\n".join([title, ""] + _table_header(
+                        ["Benchmark", "Baseline", "Current", "Change", "Speedup"] + stat_headers
+                    )) + "\n")
+                    rows.seek(0)
+                    shutil.copyfileobj(rows, out)
+                    out.write("\n")
+            out.write("\n".join(["## All Results", ""] + _table_header(
+                ["Benchmark", "Baseline", "Current", "Change", "Status"] + stat_headers
+            )) + "\n")
+            results.seek(0)
+            shutil.copyfileobj(results, out)
+    return counts
+
+
+def generate_combined_report(
+    modules: List[ModuleComparison],
+    baseline_label: str,
+    current_label: str
+) -> str:
+    """
+    Generate one markdown report for a directory-wide comparison: a summary
+    table over all modules followed by a section per module.
+    """
+    lines = [
+        "# Benchmark Comparison Report",
+        "",
+        f"- **Baseline**: `{baseline_label}`",
+        f"- **Current**: `{current_label}`",
+        "",
+        "## Summary",
+        "",
+    ]
+    kinds = [ChangeType.IMPROVEMENT, ChangeType.REGRESSION, ChangeType.UNCHANGED,
+             ChangeType.NEW, ChangeType.REMOVED]
+    lines.extend(_table_header(
+        ["Module", "✅ Improvements", "❌ Regressions", "➖ Unchanged", "🆕 New", "🗑️ Removed"]
+    ))
+    totals = [0] * len(kinds)
+    for m in modules:
+        tally = count_types(m.comparisons)
+        counts = [tally[kind] for kind in kinds]
+        totals = [t + n for t, n in zip(totals, counts)]
+        lines.append(f"| {m.module} | " + " | ".join(map(str, counts)) + " |")
+    lines.append("| **Total** | " + " | ".join(f"**{n}**" for n in totals) + " |")
+    
+    for m in modules:
+        lines.extend([
+            "",
+            f"## {m.module}",
+            "",
+            f"- **Baseline**: `{m.baseline_file or '—'}`",
+            f"- **Current**: `{m.current_file or '—'}`",
+            "",
+        ])
+        lines.extend(_report_sections(m.comparisons, m.curves, m.cache_levels, "###"))
     
     return "\n".join(lines)
 
 
-def print_summary(comparisons: List[BenchmarkComparison]):
+def print_summary(
+    comparisons: Sequence[BenchmarkComparison],
+    title: str = "Benchmark Comparison Summary"
+):
     """Print a summary of benchmark comparisons to stdout."""
-    print("\n=== Benchmark Comparison Summary ===\n")
+    print(f"\n=== {title} ===\n")
     
     for c in comparisons:
-        if c.change_type == ChangeType.NEW:
-            print(f"  🆕 {c.name}: NEW ({format_time(c.current_time)})")
-        elif c.change_type == ChangeType.REMOVED:
-            print(f"  🗑️  {c.name}: REMOVED")
-        else:
-            sign = "+" if c.change_percent > 0 else ""
-            emoji = "❌" if c.change_type == ChangeType.REGRESSION else \
-                    "✅" if c.change_type == ChangeType.IMPROVEMENT else "➖"
-            print(f"  {emoji} {c.name}: {sign}{c.change_percent*100:.1f}% "
-                  f"({format_time(c.baseline_time)} → {format_time(c.current_time)})")
+        print(summary_line(c))
     
     print()
 
 
+def summary_line(c: BenchmarkComparison) -> str:
+    """One stdout line of print_summary."""
+    if c.change_type == ChangeType.NEW:
+        return f"  🆕 {c.label}: NEW ({format_value(c, c.current_time)})"
+    if c.change_type == ChangeType.REMOVED:
+        return f"  🗑️  {c.label}: REMOVED"
+    sign = "+" if c.change_percent > 0 else ""
+    emoji = "❌" if c.change_type == ChangeType.REGRESSION else \
+            "✅" if c.change_type == ChangeType.IMPROVEMENT else "➖"
+    stats = f", p={format_p_value(c.p_value)}" if c.p_value is not None else ""
+    if c.adjusted_p_value is not None:
+        stats += f", adj. p={format_p_value(c.adjusted_p_value)}"
+    if c.speedup_ci is not None:
+        stats += f", CI {format_speedup_ci(c)}"
+    return (f"  {emoji} {c.label}: {sign}{c.change_percent*100:.1f}% "
+            f"({format_value(c, c.baseline_time)} → {format_value(c, c.current_time)}"
+            f"{stats})")
+
+
+def print_curve_summary(curves: List[CurveComparison]):
+    """Print diverged scaling curves to stdout."""
+    diverged = [c for c in curves if c.diverged]
+    print(f"=== Scaling Curves: {len(diverged)} of {len(curves)} diverged ===\n")
+    for c in diverged:
+        worse = c.change_after < 0 if c.higher_is_better else c.change_after > 0
+        emoji = "❌" if worse else "✅"
+        print(f"  {emoji} {c.label}: from {format_size(c.diverged_at)} on "
+              f"{c.change_after*100:+.1f}% (before: {c.change_before*100:+.1f}%)")
+        print(f"      {format_curve(c)}")
+    print()
+
+
+def print_cache_level_summary(summaries: List[CacheLevelSummary]):
+    """Print per-cache-level aggregates to stdout."""
+    print("=== Cache Levels ===\n")
+    for s in summaries:
+        size = f" ({format_size(s.size)})" if s.size else ""
+        print(f"  {s.level}{size}: {s.benchmarks} benchmarks, "
+              f"{s.regressions} regressed, {s.improvements} improved, "
+              f"mean {s.mean_change*100:+.1f}%")
+    verdict = regression_locality(summaries)
+    if verdict:
+        print(f"\n  {verdict}")
+    print()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Compare benchmark results and detect performance regressions"
     )
-    parser.add_argument("baseline", help="Baseline benchmark JSON file")
+    parser.add_argument(
+        "baseline", nargs="?",
+        help="Baseline benchmark JSON file (omit with --baseline-history)"
+    )
     parser.add_argument("current", help="Current benchmark JSON file")
     parser.add_argument(
         "--threshold", "-t",
@@ -272,6 +1155,114 @@ def main():
         default=0.1,
         help="Regression threshold (default: 0.1 = 10%%)"
     )
+    parser.add_argument(
+        "--stat-test",
+        choices=STAT_TESTS,
+        help="Test repetition samples for significance; a change must be both "
+             "significant and above --threshold to count. wilcoxon is paired: "
+             "for interleaved A/B runs (benchmark_runner.py --ab)"
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Significance level for --stat-test (default: 0.05)"
+    )
+    parser.add_argument(
+        "--correction",
+        choices=CORRECTIONS,
+        help="Multiple-testing correction across all benchmarks for --stat-test "
+             "or --baseline-history: bh (Benjamini-Hochberg FDR) or holm "
+             "(family-wise error rate)"
+    )
+    parser.add_argument(
+        "--ci",
+        type=float,
+        metavar="LEVEL",
+        help="Bootstrap a confidence interval (e.g. 0.95) for every speedup"
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples per benchmark for --ci (default: 1000)"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        help="Worker processes for resampling large suites (default: CPU count)"
+    )
+    parser.add_argument(
+        "--curves",
+        action="store_true",
+        help="Compare whole scaling curves per benchmark family "
+             "(where a Range() sweep diverged and by how much)"
+    )
+    parser.add_argument(
+        "--metric",
+        action="append",
+        metavar="NAME[:higher|lower]",
+        help="Metric to compare; repeat for several, or 'all'. time, cpu_time, "
+             "real_time, bytes_per_second, items_per_second or a user counter "
+             "(default: time only)"
+    )
+    parser.add_argument(
+        "--cache-levels",
+        action="store_true",
+        help="Tag working-set sweeps with the cache level they fit in "
+             "(from context.caches) and aggregate regressions per level"
+    )
+    parser.add_argument(
+        "--external-sort",
+        action="store_true",
+        help="Compare in bounded memory by spilling both inputs to sorted "
+             "runs on disk and merge-joining them (for suites larger than RAM)"
+    )
+    parser.add_argument(
+        "--spill-dir",
+        help="Directory for --external-sort run files (default: system temp dir)"
+    )
+    parser.add_argument(
+        "--filter",
+        metavar="PATTERN",
+        help="Only compare benchmarks whose run name matches this glob "
+             "(indexed .jsonl results seek straight to them)"
+    )
+    parser.add_argument(
+        "--module",
+        metavar="PATTERN",
+        help="Only compare and gate modules whose name matches this glob "
+             "(the \"module\" of BenchmarkSuite results, else the file name)"
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=BACKEND_NAMES,
+        help="JSON parser for result files (default: fastest installed; "
+             "see benchmark_json.py)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Cache parsed result files here, keyed by content hash, and "
+             "reuse them while the files are unchanged"
+    )
+    parser.add_argument(
+        "--baseline-history",
+        metavar="DB",
+        help="Use the median of recent runs in a benchmark_history.py "
+             "database as the baseline instead of a baseline file"
+    )
+    parser.add_argument(
+        "--history-runs",
+        type=int,
+        default=10,
+        help="Number of recent runs of each benchmark forming the history "
+             "baseline (default: 10)"
+    )
+    parser.add_argument(
+        "--history-host",
+        help="Host fingerprint of the history baseline "
+             "(default: the current run's host)"
+    )
     parser.add_argument(
         "--report", "-r",
         help="Generate markdown report to file"
@@ -288,11 +1279,118 @@ def main():
     )
     
     args = parser.parse_args()
+    if not args.baseline and not args.baseline_history:
+        parser.error("a baseline file or --baseline-history is required")
+    if args.baseline_history and (is_result_set(args.current) or
+                                  (args.baseline and is_result_set(args.baseline))):
+        parser.error("--baseline-history compares a single result file")
+    if args.module and (args.baseline_history or args.external_sort):
+        parser.error("--module is not supported with --baseline-history "
+                     "or --external-sort")
+    if args.metric and args.baseline_history:
+        parser.error("--metric is not supported with --baseline-history "
+                     "(the history only stores times)")
+    if args.correction and not (args.stat_test or args.baseline_history):
+        parser.error("--correction requires --stat-test (or --baseline-history)")
+    try:
+        metrics = [resolve_metric(m) for m in args.metric] if args.metric else None
+        if args.json_backend:
+            get_backend(args.json_backend)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json_backend:
+        # Through the environment, so that worker processes parse alike.
+        os.environ[BACKEND_ENV] = args.json_backend
+    
+    result_sets = bool(args.baseline) and (
+        is_result_set(args.baseline) or is_result_set(args.current)
+    )
+    
+    # Compare whole result directories, one section per module
+    if result_sets:
+        baseline_files = collect_result_files(args.baseline)
+        current_files = collect_result_files(args.current)
+        if not baseline_files and not current_files:
+            print(f"Error: no result files in {args.baseline} or {args.current}",
+                  file=sys.stderr)
+            sys.exit(1)
+        try:
+            modules = compare_result_sets(
+                baseline_files, current_files, args.threshold, args.stat_test,
+                args.alpha, args.ci, args.bootstrap_resamples, args.jobs,
+                args.correction, metrics, args.cache_dir, args.filter, args.module
+            )
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON: {e}", file=sys.stderr)
+            sys.exit(1)
+        _report_modules(modules, args)
+    
+    # Stream comparisons through an external sort-merge join
+    if args.external_sort:
+        if result_sets or args.baseline_history:
+            parser.error("--external-sort compares two result files")
+        if args.correction or args.curves or args.cache_levels:
+            parser.error("--external-sort does not support --correction, "
+                         "--curves or --cache-levels (they need the whole set)")
+        counts: Counter = Counter()
+        
+        def tally(stream):
+            if not args.quiet:
+                print("\n=== Benchmark Comparison Summary ===\n")
+            for c in stream:
+                counts[c.change_type] += 1
+                if not args.quiet:
+                    print(summary_line(c))
+                yield c
+        
+        try:
+            stream = tally(compare_benchmarks_external(
+                args.baseline, args.current, args.threshold, args.stat_test,
+                args.alpha, args.ci, args.bootstrap_resamples, metrics,
+                spill_dir=args.spill_dir, pattern=args.filter
+            ))
+            if args.report:
+                write_markdown_report_stream(
+                    stream, args.report, args.baseline, args.current,
+                    bool(args.stat_test), bool(args.ci)
+                )
+            else:
+                for _ in stream:
+                    pass
+        except FileNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON: {e}", file=sys.stderr)
+            sys.exit(1)
+        
+        if args.report and not args.quiet:
+            print(f"\nReport saved to: {args.report}")
+        found = counts[ChangeType.REGRESSION]
+        if found:
+            if not args.quiet:
+                print(f"\n⚠️  {found} regression(s) detected!")
+            if args.fail_on_regression:
+                sys.exit(1)
+        elif not args.quiet:
+            print("\n✅ No regressions detected.")
+        sys.exit(0)
     
-    # Load benchmark files
+    # Load benchmark files (as tables for a threshold-only comparison)
+    options = dict(threshold=args.threshold, stat_test=args.stat_test,
+                   alpha=args.alpha, confidence=args.ci,
+                   resamples=args.bootstrap_resamples, workers=args.jobs,
+                   metrics=metrics)
+    context = {}
+    baseline_context = {}
     try:
-        baseline = load_benchmark_json(args.baseline)
-        current = load_benchmark_json(args.current)
+        if args.baseline_history:
+            current = load_cached(args.current, context, args.cache_dir, args.filter)
+        else:
+            current = load_results(args.current, context, options, args.cache_dir,
+                                   args.filter)
+            baseline = load_results(args.baseline, baseline_context, options,
+                                    args.cache_dir, args.filter)
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -300,27 +1398,150 @@ def main():
         print(f"Error parsing JSON: {e}", file=sys.stderr)
         sys.exit(1)
     
+    # Compare BenchmarkSuite results module by module
+    if not args.baseline_history and (args.module or has_modules(baseline, current)):
+        modules = compare_modules(
+            Path(args.current).name.split(".", 1)[0], baseline, current,
+            args.baseline, args.current, options, context, baseline_context,
+            args.module
+        )
+        if args.correction:
+            correct_across_modules(modules, args.correction, args.alpha)
+        _report_modules(modules, args)
+    
     # Compare benchmarks
-    comparisons = compare_benchmarks(baseline, current, args.threshold)
+    if args.baseline_history:
+        host = args.history_host or host_fingerprint(context)
+        conn = open_history(args.baseline_history)
+        try:
+            history = history_baseline(conn, host, args.history_runs, args.filter)
+        finally:
+            conn.close()
+        if not history:
+            print(f"Error: no history for host {host} in {args.baseline_history}",
+                  file=sys.stderr)
+            sys.exit(1)
+        args.baseline = (f"{args.baseline_history} "
+                         f"(median of last {args.history_runs} runs on host {host})")
+        comparisons = compare_with_history(
+            history, current, args.threshold, args.alpha, args.correction
+        )
+    else:
+        _check_pairing(context, baseline_context, args)
+        comparisons = compare_benchmarks(baseline, current, correction=args.correction,
+                                         **options)
+    
+    curves, cache_levels = _extra_analyses(comparisons, context, baseline_context, args)
     
     # Print summary
     if not args.quiet:
         print_summary(comparisons)
+        if curves:
+            print_curve_summary(curves)
+        if cache_levels:
+            print_cache_level_summary(cache_levels)
     
     # Generate report if requested
     if args.report:
-        report = generate_markdown_report(comparisons, args.baseline, args.current)
+        report = generate_markdown_report(
+            comparisons, args.baseline, args.current, curves, cache_levels
+        )
+        with open(args.report, 'w') as f:
+            f.write(report)
+        if not args.quiet:
+            print(f"Report saved to: {args.report}")
+    
+    _exit_on_regressions(comparisons, args)
+
+
+def _report_modules(modules: List[ModuleComparison], args: argparse.Namespace):
+    """Summaries, combined report and exit status of a per-module comparison."""
+    for m in modules:
+        _check_pairing(m.context, m.baseline_context, args, m.module)
+        m.curves, m.cache_levels = _extra_analyses(
+            m.comparisons, m.context, m.baseline_context, args
+        )
+    
+    if not args.quiet:
+        for m in modules:
+            print_summary(m.comparisons, m.module)
+            if m.curves:
+                print_curve_summary(m.curves)
+            if m.cache_levels:
+                print_cache_level_summary(m.cache_levels)
+    if args.report:
+        report = generate_combined_report(modules, args.baseline, args.current)
         with open(args.report, 'w') as f:
             f.write(report)
         if not args.quiet:
             print(f"Report saved to: {args.report}")
+    _exit_on_regressions(None, args, modules)
+
+
+def _check_pairing(context: Dict, baseline_context: Dict, args: argparse.Namespace,
+                   label: Optional[str] = None):
+    """Warn when the paired test is used on results of no common A/B session."""
+    if args.stat_test != "wilcoxon":
+        return
+    sessions = {(c.get("interleaved") or {}).get("session") for c in (context, baseline_context)}
+    if len(sessions) != 1 or None in sessions:
+        print(f"Warning: {label + ': ' if label else ''}--stat-test wilcoxon pairs "
+              "samples by position, but these results are not from one interleaved "
+              "A/B session (benchmark_runner.py --ab)", file=sys.stderr)
+
+
+def _extra_analyses(
+    comparisons: Sequence[BenchmarkComparison],
+    context: Dict,
+    baseline_context: Dict,
+    args: argparse.Namespace
+) -> Tuple[Optional[List[CurveComparison]], Optional[List[CacheLevelSummary]]]:
+    """Scaling curves (--curves) and cache-level summaries (--cache-levels)."""
+    curves = compare_scaling_curves(comparisons, args.threshold) if args.curves else None
     
+    cache_levels = None
+    if args.cache_levels:
+        hierarchy = cache_hierarchy(context) or cache_hierarchy(baseline_context)
+        annotate_cache_levels(comparisons, hierarchy)
+        if not hierarchy and any(c.working_set for c in comparisons):
+            print("Warning: no context.caches in the results; "
+                  "working sets are all reported as DRAM", file=sys.stderr)
+        cache_levels = summarize_cache_levels(comparisons, hierarchy)
+    return curves, cache_levels
+
+
+def _exit_on_regressions(
+    comparisons: Optional[Sequence[BenchmarkComparison]],
+    args: argparse.Namespace,
+    modules: Optional[List[ModuleComparison]] = None
+):
+    """
+    Report detected regressions and exit with the appropriate status.
+
+    With ``modules``, their comparisons are checked module by module (the
+    correction was already applied across all of them) and ``comparisons``
+    is ignored.
+    """
     # Check for regressions
-    has_regression, regressions = check_regression(comparisons, args.threshold)
+    names: List[str] = []
+    if modules is None:
+        has_regression, regressions = check_regression(
+            comparisons, args.threshold, args.alpha, args.correction
+        )
+    else:
+        regressions = []
+        for m in modules:
+            found = check_regression(m.comparisons, args.threshold, args.alpha)[1]
+            if found:
+                names.append(m.module)
+                regressions.extend(found)
+        has_regression = bool(regressions)
     
     if has_regression:
         if not args.quiet:
             print(f"\n⚠️  {len(regressions)} regression(s) detected!")
+            if names:
+                print(f"   in module(s): {', '.join(names)}")
         if args.fail_on_regression:
             sys.exit(1)
     else:
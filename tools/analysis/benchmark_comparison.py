@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+benchmark_comparison.py - Result types of a benchmark comparison
+
+Usage:
+    from benchmark_comparison import BenchmarkComparison, ChangeType
+
+    c = BenchmarkComparison("BM_Sort/1024", 120.0, 150.0, 0.25,
+                            ChangeType.REGRESSION, 0.8)
+    c.label                             # "BM_Sort/1024"
+
+Features:
+- ChangeType: how one benchmark changed between baseline and current
+- BenchmarkComparison: one compared benchmark (and metric) with the
+  statistics computed for it
+- Shared by benchmark_compare.py and benchmark_table.py, so the columnar
+  tables do not depend on the command-line comparator
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Tuple
+
+
+class ChangeType(Enum):
+    IMPROVEMENT = "improvement"
+    REGRESSION = "regression"
+    UNCHANGED = "unchanged"
+    NEW = "new"
+    REMOVED = "removed"
+
+
+@dataclass
+class BenchmarkComparison:
+    name: str
+    baseline_time: Optional[float]
+    current_time: Optional[float]
+    change_percent: float
+    change_type: ChangeType
+    speedup: float
+    p_value: Optional[float] = None
+    adjusted_p_value: Optional[float] = None
+    effect_size: Optional[float] = None
+    speedup_ci: Optional[Tuple[float, float]] = None
+    change_ci: Optional[Tuple[float, float]] = None
+    working_set: Optional[int] = None
+    cache_level: Optional[str] = None
+    metric: Optional[str] = None       # None: time (cpu_time, else real_time)
+    higher_is_better: bool = False
+
+    @property
+    def label(self) -> str:
+        """Benchmark name, plus the metric when one was selected."""
+        return f"{self.name} [{self.metric}]" if self.metric else self.name
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+benchmark_external.py - Bounded-memory comparison of suites larger than RAM
+
+Usage:
+    from benchmark_external import iter_joined_runs
+
+    for name, baseline_run, current_run in iter_joined_runs("base.json", "cur.json"):
+        ...   # either run is None when the benchmark exists on one side only
+
+    # or from the command line:
+    python benchmark_compare.py baseline.json current.json --external-sort \\
+        --report comparison.md
+
+Features:
+- Spills the entries of each input to sorted on-disk runs keyed by run_name
+  (RUN_SIZE entries per run), so sorting never holds more than one run
+- k-way merge of the runs, regrouping repetitions into one BenchmarkRun at a
+  time; very many runs are first merged in passes of MERGE_FAN_IN files
+- Merge-join of the two sorted streams as a generator; benchmark_compare
+  turns it into a stream of comparisons (compare_benchmarks_external) for
+  the streaming report writer (write_markdown_report_stream)
+"""
+
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from operator import itemgetter
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from benchmark_loader import BenchmarkRun, iter_benchmarks
+
+# Entries sorted in memory per spilled run.
+RUN_SIZE = 200_000
+
+# Maximum number of runs merged (and files open) at once.
+MERGE_FAN_IN = 128
+
+# Buffer size of spill files.
+IO_BUFFER = 1 << 20
+
+_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+
+def _write_run(records: List[Tuple[str, Dict]], directory: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8", buffering=IO_BUFFER) as f:
+        encode = _ENCODER.encode
+        f.writelines(encode(record) + "\n" for record in records)
+    return path
+
+
+def _read_run(path: str) -> Iterator[Tuple[str, Dict]]:
+    with open(path, "r", encoding="utf-8", buffering=IO_BUFFER) as f:
+        for line in f:
+            name, entry = json.loads(line)
+            yield name, entry
+
+
+def spill_sorted_runs(
+    entries: Iterable[Dict],
+    directory: str,
+    run_size: int = RUN_SIZE
+) -> List[str]:
+    """
+    Write entries to sorted run files of at most ``run_size`` entries.
+
+    Entries are keyed by run_name (so repetitions sort together); entries
+    that reported an error are dropped, as in benchmark_loader.group_runs.
+    The sort is stable, so repetitions keep their order within a run.
+    """
+    paths = []
+    buffer: List[Tuple[str, Dict]] = []
+    for entry in entries:
+        if entry.get("error_occurred"):
+            continue
+        buffer.append((entry.get("run_name", entry["name"]), entry))
+        if len(buffer) >= run_size:
+            buffer.sort(key=itemgetter(0))
+            paths.append(_write_run(buffer, directory))
+            buffer = []
+    if buffer:
+        buffer.sort(key=itemgetter(0))
+        paths.append(_write_run(buffer, directory))
+    return paths
+
+
+def merge_runs(
+    paths: Sequence[str],
+    directory: str,
+    fan_in: Optional[int] = None
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Merge sorted run files into one sorted stream of (run_name, entry).
+
+    With more than ``fan_in`` (default MERGE_FAN_IN) runs, groups of runs are
+    first merged into larger runs so that no more than ``fan_in`` files are
+    open at a time. Run files are deleted once consumed.
+    """
+    fan_in = fan_in or MERGE_FAN_IN
+    paths = list(paths)
+    while len(paths) > fan_in:
+        merged = []
+        for i in range(0, len(paths), fan_in):
+            group = paths[i:i + fan_in]
+            fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8", buffering=IO_BUFFER) as f:
+                stream = heapq.merge(*(_read_run(p) for p in group), key=itemgetter(0))
+                f.writelines(_ENCODER.encode(record) + "\n" for record in stream)
+            for p in group:
+                os.remove(p)
+            merged.append(path)
+        paths = merged
+    yield from heapq.merge(*(_read_run(p) for p in paths), key=itemgetter(0))
+    for p in paths:
+        os.remove(p)
+
+
+def group_sorted(records: Iterator[Tuple[str, Dict]]) -> Iterator[BenchmarkRun]:
+    """Fold a name-sorted (run_name, entry) stream into BenchmarkRun objects."""
+    for name, group in itertools.groupby(records, key=itemgetter(0)):
+        run = BenchmarkRun(name)
+        for _, entry in group:
+            run.add_entry(entry)
+        yield run
+
+
+def iter_sorted_runs(
+    filepath: str,
+    directory: str,
+    run_size: int = RUN_SIZE,
+    metrics: Optional[Collection[str]] = ()
+) -> Iterator[BenchmarkRun]:
+    """
+    BenchmarkRun objects of a result file, one at a time, sorted by name,
+    holding ``metrics`` besides the times (see benchmark_loader.slim_entry).
+    """
+    paths = spill_sorted_runs(iter_benchmarks(filepath, metrics=metrics), directory,
+                              run_size)
+    return group_sorted(merge_runs(paths, directory))
+
+
+def merge_join(
+    left: Iterator[BenchmarkRun],
+    right: Iterator[BenchmarkRun]
+) -> Iterator[Tuple[str, Optional[BenchmarkRun], Optional[BenchmarkRun]]]:
+    """Full outer join of two name-sorted run streams."""
+    a, b = next(left, None), next(right, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a.name < b.name):
+            yield a.name, a, None
+            a = next(left, None)
+        elif a is None or b.name < a.name:
+            yield b.name, None, b
+            b = next(right, None)
+        else:
+            yield a.name, a, b
+            a, b = next(left, None), next(right, None)
+
+
+def iter_joined_runs(
+    baseline_file: str,
+    current_file: str,
+    run_size: int = RUN_SIZE,
+    spill_dir: Optional[str] = None,
+    pattern: Optional[str] = None,
+    metrics: Optional[Collection[str]] = ()
+) -> Iterator[Tuple[str, Optional[BenchmarkRun], Optional[BenchmarkRun]]]:
+    """
+    Join the benchmarks of two result files in bounded memory, yielding
+    (name, baseline run or None, current run or None) in name order.
+
+    Both inputs are spilled to sorted runs under a temporary directory in
+    ``spill_dir`` (default: the system temp dir), removed when the generator
+    finishes or is closed. ``pattern`` restricts both sides to matching
+    run names (see benchmark_loader.iter_file); ``metrics`` selects what the
+    runs hold besides the times (see benchmark_loader.slim_entry).
+    """
+    with tempfile.TemporaryDirectory(prefix="bench-merge-", dir=spill_dir) as directory:
+        baseline_dir = os.path.join(directory, "baseline")
+        current_dir = os.path.join(directory, "current")
+        os.mkdir(baseline_dir)
+        os.mkdir(current_dir)
+        # Spill both sides before joining so only the merge heads stay in memory.
+        baseline_runs = spill_sorted_runs(iter_benchmarks(baseline_file, pattern, metrics),
+                                          baseline_dir, run_size)
+        current_runs = spill_sorted_runs(iter_benchmarks(current_file, pattern, metrics),
+                                         current_dir, run_size)
+        yield from merge_join(group_sorted(merge_runs(baseline_runs, baseline_dir)),
+                              group_sorted(merge_runs(current_runs, current_dir)))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+benchmark_families.py - Benchmark name parsing and scaling-curve comparison
+
+Usage:
+    from benchmark_families import parse_benchmark_name, compare_scaling_curves
+
+    parse_benchmark_name("BM_FalseSharing_Packed/4/real_time_mean")
+    # BenchmarkName(family='BM_FalseSharing_Packed', args=(4,), threads=1,
+    #               aggregate='mean', options=('real_time',), ...)
+
+    curves = compare_scaling_curves(comparisons, threshold=0.1)
+
+Features:
+- Parses Google Benchmark names into family, argument tuple, named
+  arguments, thread count, run options and aggregate suffix
+- Indexes results by family
+- Compares whole scaling curves (e.g. the RangeMultiplier(4)->Range(...)
+  sweeps of aos_soa_bench/prefetch_bench/ranges_bench): where the curve
+  diverged, at which argument, and by how much
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+Arg = Union[int, float, str]
+
+AGGREGATE_SUFFIXES = ("mean", "median", "stddev", "cv")
+
+# Components Google Benchmark appends for run options rather than arguments.
+_OPTION = re.compile(
+    r"^(?:(?:iterations|repeats|min_time|min_warmup_time):.+|"
+    r"real_time|manual_time|process_time)$"
+)
+_THREADS = re.compile(r"^threads:(\d+)$")
+_NAMED_ARG = re.compile(r"^([A-Za-z_][\w]*):(.+)$")
+_AGGREGATE = re.compile(r"_(%s)$" % "|".join(AGGREGATE_SUFFIXES))
+
+
+@dataclass(frozen=True)
+class BenchmarkName:
+    name: str
+    family: str
+    args: Tuple[Arg, ...] = ()
+    arg_names: Tuple[Optional[str], ...] = ()
+    threads: int = 1
+    options: Tuple[str, ...] = ()
+    aggregate: Optional[str] = None
+
+    @property
+    def variant(self) -> Tuple:
+        """Everything except the first argument: identifies one scaling curve."""
+        return (self.family, self.args[1:], self.threads, self.options, self.aggregate)
+
+    @property
+    def size(self) -> Optional[Union[int, float]]:
+        """The first argument if numeric (the swept size of a Range())."""
+        if self.args and isinstance(self.args[0], (int, float)):
+            return self.args[0]
+        return None
+
+
+def _parse_arg(text: str) -> Arg:
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse_benchmark_name(name: str) -> BenchmarkName:
+    """Split a Google Benchmark run name into its components."""
+    base = name
+    aggregate = None
+    match = _AGGREGATE.search(name)
+    if match:
+        aggregate = match.group(1)
+        base = name[:match.start()]
+
+    # Template arguments may contain '/', so only split outside <...>.
+    parts, depth, current = [], 0, []
+    for ch in base:
+        if ch == "<":
+            depth += 1
+        elif ch == ">":
+            depth -= 1
+        if ch == "/" and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+
+    args, arg_names, options = [], [], []
+    threads = 1
+    for part in parts[1:]:
+        threads_match = _THREADS.match(part)
+        if threads_match:
+            threads = int(threads_match.group(1))
+        elif _OPTION.match(part):
+            options.append(part)
+        else:
+            named = _NAMED_ARG.match(part)
+            if named:
+                arg_names.append(named.group(1))
+                args.append(_parse_arg(named.group(2)))
+            else:
+                arg_names.append(None)
+                args.append(_parse_arg(part))
+
+    return BenchmarkName(
+        name=name,
+        family=parts[0],
+        args=tuple(args),
+        arg_names=tuple(arg_names),
+        threads=threads,
+        options=tuple(options),
+        aggregate=aggregate,
+    )
+
+
+def index_families(names: Sequence[str]) -> Dict[str, List[BenchmarkName]]:
+    """Group parsed names by family, each sorted by argument tuple."""
+    families: Dict[str, List[BenchmarkName]] = {}
+    for name in names:
+        parsed = parse_benchmark_name(name)
+        families.setdefault(parsed.family, []).append(parsed)
+    for members in families.values():
+        members.sort(key=lambda p: tuple(
+            (1, a) if isinstance(a, str) else (0, a) for a in p.args
+        ) + (p.threads, p.aggregate or ""))
+    return families
+
+
+@dataclass
+class CurveComparison:
+    family: str
+    label: str                                  # family plus fixed arguments
+    points: List[Tuple[Union[int, float], float]] = field(default_factory=list)
+    diverged_at: Optional[Union[int, float]] = None
+    change_before: float = 0.0                  # mean change below diverged_at
+    change_after: float = 0.0                   # mean change from diverged_at on
+    max_change: float = 0.0                     # largest |change| on the curve
+    higher_is_better: bool = False              # direction of the metric
+
+    @property
+    def diverged(self) -> bool:
+        return self.diverged_at is not None
+
+
+def _mean(values: Sequence[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def locate_divergence(changes: Sequence[float], threshold: float) -> Tuple[Optional[int], float, float]:
+    """
+    Find where a curve of per-point changes departs from the baseline.
+
+    Fits a two-segment step (least squares) to the changes. If the step is
+    larger than ``threshold`` and the tail is beyond ``threshold``, the
+    curve diverged at the first point of the tail. If no step qualifies but
+    the whole curve moved beyond ``threshold``, it diverged at the first
+    point. Returns (index or None, mean change before, mean change after).
+    """
+    n = len(changes)
+    best_k, best_sse = None, None
+    for k in range(1, n):
+        before, after = changes[:k], changes[k:]
+        mb, ma = _mean(before), _mean(after)
+        sse = sum((c - mb) ** 2 for c in before) + sum((c - ma) ** 2 for c in after)
+        if best_sse is None or sse < best_sse:
+            best_k, best_sse = k, sse
+    if best_k is not None:
+        before, after = _mean(changes[:best_k]), _mean(changes[best_k:])
+        if abs(after - before) > threshold and abs(after) > threshold:
+            return best_k, before, after
+    overall = _mean(changes)
+    if abs(overall) > threshold:
+        return 0, 0.0, overall
+    return None, overall, overall
+
+
+def compare_scaling_curves(comparisons, threshold: float = 0.1) -> List[CurveComparison]:
+    """
+    Compare the scaling curves of every benchmark family.
+
+    ``comparisons`` are BenchmarkComparison objects; points whose first
+    argument is numeric and that exist in both runs are grouped into curves
+    (family plus all other arguments, threads and options) and sorted by
+    that argument. Comparisons of different metrics form separate curves.
+    Curves with fewer than two points are skipped.
+    """
+    curves: Dict[Tuple, CurveComparison] = {}
+    for c in comparisons:
+        if c.baseline_time is None or c.current_time is None:
+            continue
+        parsed = parse_benchmark_name(c.name)
+        if parsed.size is None:
+            continue
+        metric = getattr(c, "metric", None)
+        key = (parsed.variant, metric)
+        curve = curves.get(key)
+        if curve is None:
+            rest = [str(a) for a in parsed.args[1:]]
+            if parsed.threads != 1:
+                rest.append(f"threads:{parsed.threads}")
+            rest.extend(parsed.options)
+            label = "/".join([parsed.family, "*"] + rest)
+            if parsed.aggregate:
+                label += f"_{parsed.aggregate}"
+            if metric:
+                label += f" [{metric}]"
+            curve = curves[key] = CurveComparison(
+                parsed.family, label,
+                higher_is_better=getattr(c, "higher_is_better", False),
+            )
+        curve.points.append((parsed.size, c.change_percent))
+
+    results = []
+    for key in sorted(curves, key=lambda k: curves[k].label):
+        curve = curves[key]
+        if len(curve.points) < 2:
+            continue
+        curve.points.sort()
+        changes = [change for _, change in curve.points]
+        index, curve.change_before, curve.change_after = locate_divergence(changes, threshold)
+        if index is not None:
+            curve.diverged_at = curve.points[index][0]
+        curve.max_change = max(changes, key=abs)
+        results.append(curve)
+    return results
+
+
+def format_size(value: Union[int, float]) -> str:
+    """Format a power-of-two-ish argument compactly (4096 -> 4K)."""
+    if isinstance(value, int):
+        for unit, scale in (("G", 1 << 30), ("M", 1 << 20), ("K", 1 << 10)):
+            if value >= scale and value % scale == 0:
+                return f"{value // scale}{unit}"
+    return str(value)
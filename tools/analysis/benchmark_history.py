@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+benchmark_history.py - SQLite-backed history of benchmark runs
+
+Usage:
+    python benchmark_history.py ingest results/memory_bench.json [--git-sha SHA]
+    python benchmark_history.py ingest nightly/*.json --jobs 32
+    python benchmark_history.py runs [--host FINGERPRINT]
+    python benchmark_history.py trend BM_Random_WithPrefetch/4194304 [--last 50] [--window 5]
+    python benchmark_history.py stats [--filter 'BM_AOS_*'] [--last 20]
+    python benchmark_history.py changepoints [--last 200] [--min-shift 0.02]
+    python benchmark_history.py export 42 archive/run-42.json.zst
+
+Features:
+- Ingests Google Benchmark JSON together with its "context" (host, CPU
+  count, MHz, caches, build type) and the git SHA of the run
+- One bulk transaction per run; per-repetition samples are stored
+- Many files are parsed in parallel worker processes (ingest --jobs) and
+  handed back through shared memory (see benchmark_parallel.py)
+- Indexed by benchmark name, host fingerprint and timestamp
+- Trend queries with rolling medians, percentiles over the last N runs of
+  each benchmark
+- Rolling baselines (median and dispersion of the last K runs per
+  benchmark) for benchmark_compare.py --baseline-history
+- Change-point detection over the stored history to pinpoint the commits
+  where a benchmark's distribution shifted (see benchmark_changepoint.py)
+- Export of a stored run as Google Benchmark JSON or JSON-Lines (.jsonl,
+  see benchmark_jsonl.py), compressed by suffix (.gz/.xz/.zst, see
+  benchmark_io.py); ingest reads such archives directly
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from benchmark_changepoint import (
+    DEFAULT_MIN_SIZE,
+    DEFAULT_PENALTY,
+    METHODS,
+    detect_changepoints,
+)
+from benchmark_io import open_result
+from benchmark_jsonl import JsonlWriter, is_jsonl
+from benchmark_loader import load_runs
+from benchmark_parallel import SampleColumns, iter_parsed
+from benchmark_stats import median_mad
+
+DEFAULT_DB = "benchmark_history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    host_fingerprint TEXT NOT NULL,
+    host_name TEXT,
+    num_cpus INTEGER,
+    mhz_per_cpu REAL,
+    caches TEXT,
+    build_type TEXT,
+    git_sha TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    benchmark TEXT NOT NULL,
+    host_fingerprint TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    repetition INTEGER NOT NULL,
+    cpu_time REAL,
+    real_time REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_host_time
+    ON runs(host_fingerprint, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_bench_host_time
+    ON results(benchmark, host_fingerprint, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_run
+    ON results(run_id);
+"""
+
+
+def open_history(path: str = DEFAULT_DB) -> sqlite3.Connection:
+    """Open (and create if needed) a history database."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def host_fingerprint(context: Dict) -> str:
+    """
+    Identify the hardware a run was measured on.
+
+    Built from the CPU count, nominal frequency and cache layout only, so
+    ephemeral CI runners with different host names but identical hardware
+    share a fingerprint. The CPU model of BenchmarkSuite results (cpu_info)
+    is included when present.
+    """
+    caches = sorted(
+        (c.get("type", ""), c.get("level", 0), c.get("size", 0), c.get("num_sharing", 0))
+        for c in context.get("caches", [])
+    )
+    parts = [context.get("num_cpus"), context.get("mhz_per_cpu"), caches]
+    if context.get("cpu_info"):
+        parts.append(context["cpu_info"])
+    key = json.dumps(parts)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def parse_timestamp(context: Dict, filepath: str) -> float:
+    """Run timestamp from context.date, falling back to the file's mtime."""
+    date = context.get("date")
+    if date:
+        try:
+            return datetime.fromisoformat(date).timestamp()
+        except ValueError:
+            pass
+    return os.path.getmtime(filepath)
+
+
+def ingest_run(
+    conn: sqlite3.Connection,
+    filepath: str,
+    git_sha: Optional[str] = None,
+    build_type: Optional[str] = None
+) -> int:
+    """
+    Ingest one Google Benchmark JSON file as a new run.
+
+    The run row and all of its samples are written in a single transaction.
+    Returns the new run id; raises ValueError for a legacy name -> result file.
+    """
+    context: Dict = {}
+    runs = load_runs(filepath, context)
+
+    def samples() -> Iterator[Tuple]:
+        for name, run in runs.items():
+            cpu = run.samples.get("cpu_time", ())
+            real = run.samples.get("real_time", ())
+            for i in range(max(len(cpu), len(real))):
+                yield (
+                    name, i,
+                    cpu[i] if i < len(cpu) else None,
+                    real[i] if i < len(real) else None,
+                )
+
+    return _insert_run(conn, filepath, context, samples(), git_sha, build_type)
+
+
+def ingest_columns(
+    conn: sqlite3.Connection,
+    columns: SampleColumns,
+    git_sha: Optional[str] = None,
+    build_type: Optional[str] = None
+) -> int:
+    """ingest_run() for a file already parsed by benchmark_parallel.iter_parsed."""
+    return _insert_run(conn, columns.filepath, columns.context, columns.rows(),
+                       git_sha, build_type)
+
+
+def _insert_run(
+    conn: sqlite3.Connection,
+    filepath: str,
+    context: Dict,
+    samples: Iterator[Tuple],
+    git_sha: Optional[str],
+    build_type: Optional[str]
+) -> int:
+    """Write the run row and its (benchmark, repetition, cpu, real) samples."""
+    timestamp = parse_timestamp(context, filepath)
+    fingerprint = host_fingerprint(context)
+
+    def rows(run_id: int) -> Iterator[Tuple]:
+        for name, repetition, cpu, real in samples:
+            yield run_id, name, fingerprint, timestamp, repetition, cpu, real
+
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO runs (timestamp, host_fingerprint, host_name, num_cpus, "
+            "mhz_per_cpu, caches, build_type, git_sha, source) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                timestamp, fingerprint, context.get("host_name"),
+                context.get("num_cpus"), context.get("mhz_per_cpu"),
+                json.dumps(context.get("caches", [])),
+                build_type or context.get("library_build_type"),
+                git_sha or os.environ.get("GITHUB_SHA"),
+                str(filepath),
+            ),
+        )
+        run_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO results (run_id, benchmark, host_fingerprint, timestamp, "
+            "repetition, cpu_time, real_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows(run_id),
+        )
+    return run_id
+
+
+def latest_host(conn: sqlite3.Connection) -> Optional[str]:
+    """Host fingerprint of the most recently measured run."""
+    row = conn.execute(
+        "SELECT host_fingerprint FROM runs ORDER BY timestamp DESC LIMIT 1"
+    ).fetchone()
+    return row[0] if row else None
+
+
+def run_medians(
+    conn: sqlite3.Connection,
+    host: str,
+    last: int,
+    pattern: Optional[str] = None
+) -> Dict[str, List[Tuple[int, float]]]:
+    """
+    Per-run median time of every benchmark over its own last ``last`` runs
+    on ``host``. The window is per benchmark, not per host: a host ingests
+    several result files per night, each holding only some of the benchmarks.
+
+    Returns benchmark -> [(run_id, median), ...] ordered oldest first.
+    """
+    # DENSE_RANK numbers runs, not rows: a run stores one row per repetition.
+    rows = conn.execute(
+        "SELECT benchmark, run_id, value FROM ("
+        "  SELECT benchmark, run_id, timestamp, COALESCE(cpu_time, real_time) AS value,"
+        "    DENSE_RANK() OVER (PARTITION BY benchmark"
+        "                       ORDER BY timestamp DESC, run_id DESC) AS recency"
+        "  FROM results WHERE host_fingerprint = ?"
+        "    AND COALESCE(cpu_time, real_time) IS NOT NULL"
+        ") WHERE recency <= ? ORDER BY benchmark, timestamp, run_id",
+        (host, last),
+    )
+    samples: Dict[str, Dict[int, List[float]]] = {}
+    for name, run_id, value in rows:
+        if pattern and not fnmatch.fnmatchcase(name, pattern):
+            continue
+        samples.setdefault(name, {}).setdefault(run_id, []).append(value)
+    return {
+        name: [(run_id, statistics.median(values)) for run_id, values in per_run.items()]
+        for name, per_run in samples.items()
+    }
+
+
+@dataclass
+class HistoryBaseline:
+    """Reference distribution of one benchmark over recent runs."""
+    name: str
+    run_medians: List[float]
+
+    @property
+    def time(self) -> float:
+        """Median of the per-run medians."""
+        return median_mad(self.run_medians)[0]
+
+    @property
+    def dispersion(self) -> float:
+        """Scaled MAD of the per-run medians."""
+        return median_mad(self.run_medians)[1]
+
+
+def history_baseline(
+    conn: sqlite3.Connection,
+    host: str,
+    last: int = 10,
+    pattern: Optional[str] = None
+) -> Dict[str, HistoryBaseline]:
+    """
+    Rolling baseline of every benchmark (matching the glob ``pattern``, if
+    given) over its last ``last`` runs on ``host``.
+    """
+    return {
+        name: HistoryBaseline(name, [m for _, m in medians])
+        for name, medians in run_medians(conn, host, last, pattern).items()
+    }
+
+
+def benchmark_trend(
+    conn: sqlite3.Connection,
+    benchmark: str,
+    host: str,
+    last: int = 50
+) -> List[Tuple[float, Optional[str], float, int]]:
+    """
+    Trend of one benchmark: (timestamp, git_sha, median, repetitions) per run,
+    oldest first. Served by the (benchmark, host, timestamp) index.
+    """
+    rows = conn.execute(
+        "SELECT r.run_id, r.timestamp, runs.git_sha, COALESCE(r.cpu_time, r.real_time) "
+        "FROM results r JOIN runs ON runs.id = r.run_id "
+        "WHERE r.benchmark = ? AND r.host_fingerprint = ? "
+        "ORDER BY r.timestamp DESC, r.run_id DESC",
+        (benchmark, host),
+    )
+    per_run: Dict[int, Tuple[float, Optional[str], List[float]]] = {}
+    for run_id, timestamp, sha, value in rows:
+        if run_id not in per_run:
+            if len(per_run) == last:
+                break
+            per_run[run_id] = (timestamp, sha, [])
+        if value is not None:
+            per_run[run_id][2].append(value)
+    trend = [
+        (timestamp, sha, statistics.median(values), len(values))
+        for timestamp, sha, values in per_run.values() if values
+    ]
+    trend.reverse()
+    return trend
+
+
+def rolling_median(values: List[float], window: int) -> List[float]:
+    """Trailing rolling median (shorter windows at the start of the series)."""
+    return [
+        statistics.median(values[max(0, i - window + 1):i + 1])
+        for i in range(len(values))
+    ]
+
+
+def percentiles(values: List[float], points=(10, 50, 90)) -> List[float]:
+    """Linear-interpolated percentiles of ``values``."""
+    if len(values) == 1:
+        return [values[0]] * len(points)
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return [cuts[p - 1] for p in points]
+
+
+def export_run(
+    conn: sqlite3.Connection,
+    run_id: int,
+    filepath: str,
+    level: Optional[int] = None
+) -> int:
+    """
+    Write a stored run as a Google Benchmark JSON document (or JSON-Lines
+    for .jsonl outputs; appended if the file exists), streamed straight into
+    the (possibly compressed) output. Ingesting the export reproduces the
+    run's host fingerprint, timestamp and samples.
+
+    Returns the number of entries written.
+    """
+    row = conn.execute(
+        "SELECT timestamp, host_name, num_cpus, mhz_per_cpu, caches, build_type "
+        "FROM runs WHERE id = ?", (run_id,)
+    ).fetchone()
+    if row is None:
+        raise KeyError(f"no run {run_id}")
+    timestamp, host_name, num_cpus, mhz_per_cpu, caches, build_type = row
+    context = {
+        "date": datetime.fromtimestamp(timestamp).astimezone().isoformat(),
+        "host_name": host_name,
+        "num_cpus": num_cpus,
+        "mhz_per_cpu": mhz_per_cpu,
+        "caches": json.loads(caches) if caches else [],
+        "library_build_type": build_type,
+    }
+    rows = conn.execute(
+        "SELECT benchmark, repetition, cpu_time, real_time FROM results "
+        "WHERE run_id = ? ORDER BY benchmark, repetition", (run_id,)
+    )
+
+    def entries() -> Iterator[Dict]:
+        for name, repetition, cpu, real in rows:
+            entry = {"name": name, "run_name": name, "run_type": "iteration",
+                     "repetition_index": repetition}
+            if cpu is not None:
+                entry["cpu_time"] = cpu
+            if real is not None:
+                entry["real_time"] = real
+            entry["time_unit"] = "ns"
+            yield entry
+
+    if is_jsonl(filepath):
+        with JsonlWriter(filepath, context, level) as out:
+            for entry in entries():
+                out.write(entry)
+        return out.count
+    count = 0
+    with open_result(filepath, "wt", level) as f:
+        f.write('{"context": ' + json.dumps(context) + ', "benchmarks": [')
+        for entry in entries():
+            f.write((",\n" if count else "\n") + json.dumps(entry))
+            count += 1
+        f.write("\n]}\n")
+    return count
+
+
+def format_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def cmd_ingest(conn: sqlite3.Connection, args) -> int:
+    def report(filepath: str, run_id: int, start: float):
+        count = conn.execute(
+            "SELECT COUNT(*) FROM results WHERE run_id = ?", (run_id,)
+        ).fetchone()[0]
+        print(f"Ingested {filepath} as run {run_id}: {count} samples "
+              f"in {time.perf_counter() - start:.3f}s")
+
+    try:
+        if args.jobs == 1 or len(args.files) < 2:
+            for filepath in args.files:
+                start = time.perf_counter()
+                run_id = ingest_run(conn, filepath, args.git_sha, args.build_type)
+                report(filepath, run_id, start)
+            return 0
+
+        # Parse in worker processes; only the database writes stay serial.
+        begin = start = time.perf_counter()
+        for columns in iter_parsed(args.files, args.jobs):
+            run_id = ingest_columns(conn, columns, args.git_sha, args.build_type)
+            report(columns.filepath, run_id, start)
+            start = time.perf_counter()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Ingested {len(args.files)} files in {time.perf_counter() - begin:.3f}s")
+    return 0
+
+
+def cmd_export(conn: sqlite3.Connection, args) -> int:
+    try:
+        count = export_run(conn, args.run_id, args.output, args.level)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}", file=sys.stderr)
+        return 1
+    print(f"Exported run {args.run_id} to {args.output}: {count} samples")
+    return 0
+
+
+def cmd_runs(conn: sqlite3.Connection, args) -> int:
+    query = ("SELECT id, timestamp, host_fingerprint, host_name, num_cpus, "
+             "build_type, git_sha FROM runs")
+    params: Tuple = ()
+    if args.host:
+        query += " WHERE host_fingerprint = ?"
+        params = (args.host,)
+    query += " ORDER BY timestamp DESC LIMIT ?"
+    params += (args.last,)
+    print(f"{'ID':>5}  {'Timestamp':16}  {'Host':16}  {'Name':20} {'CPUs':>4}  "
+          f"{'Build':8} {'Git SHA':10}")
+    for run_id, ts, fp, name, cpus, build, sha in conn.execute(query, params):
+        print(f"{run_id:>5}  {format_timestamp(ts):16}  {fp:16}  {(name or '-')[:20]:20} "
+              f"{cpus or 0:>4}  {(build or '-'):8} {(sha or '-')[:10]:10}")
+    return 0
+
+
+def cmd_trend(conn: sqlite3.Connection, args) -> int:
+    host = args.host or latest_host(conn)
+    trend = benchmark_trend(conn, args.benchmark, host, args.last)
+    if not trend:
+        print(f"No history for {args.benchmark} on host {host}", file=sys.stderr)
+        return 1
+    rolling = rolling_median([t[2] for t in trend], args.window)
+    print(f"Trend of {args.benchmark} on host {host} "
+          f"(rolling median over {args.window} runs)\n")
+    print(f"{'Timestamp':16}  {'Git SHA':10}  {'Reps':>4}  {'Median':>12}  {'Rolling':>12}")
+    for (ts, sha, median, reps), roll in zip(trend, rolling):
+        print(f"{format_timestamp(ts):16}  {(sha or '-')[:10]:10}  {reps:>4}  "
+              f"{median:>12.2f}  {roll:>12.2f}")
+    return 0
+
+
+def cmd_stats(conn: sqlite3.Connection, args) -> int:
+    host = args.host or latest_host(conn)
+    medians = run_medians(conn, host, args.last, args.filter)
+    if not medians:
+        print(f"No history on host {host}", file=sys.stderr)
+        return 1
+    print(f"Per-run medians over the last {args.last} runs of each benchmark "
+          f"on host {host}\n")
+    print(f"{'Benchmark':48} {'Runs':>4}  {'p10':>12} {'p50':>12} {'p90':>12}")
+    for name in sorted(medians):
+        values = [m for _, m in medians[name]]
+        p10, p50, p90 = percentiles(values)
+        print(f"{name[:48]:48} {len(values):>4}  {p10:>12.2f} {p50:>12.2f} {p90:>12.2f}")
+    return 0
+
+
+def cmd_changepoints(conn: sqlite3.Connection, args) -> int:
+    host = args.host or latest_host(conn)
+    medians = run_medians(conn, host, args.last, args.filter)
+    if not medians:
+        print(f"No history on host {host}", file=sys.stderr)
+        return 1
+    runs = {
+        run_id: (timestamp, sha) for run_id, timestamp, sha in conn.execute(
+            "SELECT id, timestamp, git_sha FROM runs WHERE host_fingerprint = ?", (host,)
+        )
+    }
+    start = time.perf_counter()
+    points = detect_changepoints(
+        {name: [m for _, m in series] for name, series in medians.items()},
+        args.penalty, args.min_size, args.min_shift, args.jobs, args.method
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"Change points over the last {args.last} runs of each benchmark on host {host} "
+          f"({len(medians)} benchmarks, {elapsed:.2f}s)\n")
+    if not points:
+        print("No change points detected.")
+        return 0
+    print(f"{'Benchmark':40} {'Git SHA':10}  {'Timestamp':16}  {'Before':>10} "
+          f"{'After':>10} {'Shift':>8} {'Conf.':>6}")
+    for p in points:
+        run_id = medians[p.benchmark][p.index][0]
+        timestamp, sha = runs[run_id]
+        print(f"{p.benchmark[:40]:40} {(sha or '-')[:10]:10}  "
+              f"{format_timestamp(timestamp):16}  {p.before:>10.2f} {p.after:>10.2f} "
+              f"{p.shift*100:>+7.1f}% {p.confidence*100:>5.1f}%")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Store benchmark runs in SQLite and query their history"
+    )
+    parser.add_argument("--db", default=DEFAULT_DB,
+                        help=f"History database (default: {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Ingest benchmark JSON files as new runs")
+    ingest.add_argument("files", nargs="+",
+                        help="Result files (.json/.jsonl, optionally .gz/.xz/.zst)")
+    ingest.add_argument("--git-sha", help="Git SHA of the run (default: $GITHUB_SHA)")
+    ingest.add_argument("--build-type", help="Override context.library_build_type")
+    ingest.add_argument("--jobs", "-j", type=int,
+                        help="Parse files in this many worker processes "
+                             "(default: CPU count; 1 parses serially)")
+
+    export = sub.add_parser("export", help="Write a stored run as Google Benchmark JSON")
+    export.add_argument("run_id", type=int, help="Run id (see runs)")
+    export.add_argument("output", help="Output .json or .jsonl file; "
+                        ".gz/.xz/.zst suffixes compress")
+    export.add_argument("--level", type=int, help="Compression level")
+
+    runs = sub.add_parser("runs", help="List stored runs")
+    runs.add_argument("--host", help="Host fingerprint")
+    runs.add_argument("--last", type=int, default=20, help="Number of runs (default: 20)")
+
+    trend = sub.add_parser("trend", help="Per-run medians of one benchmark")
+    trend.add_argument("benchmark", help="Benchmark run name")
+    trend.add_argument("--host", help="Host fingerprint (default: latest run's host)")
+    trend.add_argument("--last", type=int, default=50, help="Number of runs (default: 50)")
+    trend.add_argument("--window", type=int, default=5,
+                       help="Rolling median window in runs (default: 5)")
+
+    stats = sub.add_parser("stats", help="Percentiles of per-run medians")
+    stats.add_argument("--host", help="Host fingerprint (default: latest run's host)")
+    stats.add_argument("--last", type=int, default=20,
+                       help="Number of runs of each benchmark (default: 20)")
+    stats.add_argument("--filter", help="Glob pattern on benchmark names")
+
+    changepoints = sub.add_parser(
+        "changepoints", help="Detect commits where benchmark distributions shifted"
+    )
+    changepoints.add_argument("--host", help="Host fingerprint (default: latest run's host)")
+    changepoints.add_argument("--last", type=int, default=200,
+                              help="Number of runs of each benchmark (default: 200)")
+    changepoints.add_argument("--filter", help="Glob pattern on benchmark names")
+    changepoints.add_argument("--method", choices=METHODS, default="binseg",
+                              help="Segmentation algorithm (default: binseg)")
+    changepoints.add_argument("--penalty", type=float, default=DEFAULT_PENALTY,
+                              help="Penalty per change point in units of log(runs) "
+                                   f"(default: {DEFAULT_PENALTY})")
+    changepoints.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE,
+                              help="Minimum runs between change points "
+                                   f"(default: {DEFAULT_MIN_SIZE})")
+    changepoints.add_argument("--min-shift", type=float, default=0.0,
+                              help="Only report shifts of at least this fraction")
+    changepoints.add_argument("--jobs", "-j", type=int,
+                              help="Worker processes (default: CPU count)")
+
+    args = parser.parse_args()
+
+    commands = {
+        "ingest": cmd_ingest,
+        "export": cmd_export,
+        "runs": cmd_runs,
+        "trend": cmd_trend,
+        "stats": cmd_stats,
+        "changepoints": cmd_changepoints,
+    }
+    conn = open_history(args.db)
+    try:
+        sys.exit(commands[args.command](conn, args))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+benchmark_io.py - Transparent (de)compression of benchmark result files
+
+Usage:
+    from benchmark_io import open_result
+
+    with open_result("archive/memory_bench.json.gz") as f:     # text, decompressed
+        ...
+    with open_result("results/memory_bench.json.zst", "wt") as f:
+        json.dump(document, f)
+
+Features:
+- Compression chosen by file suffix: .gz (gzip), .xz (lzma), .zst (zstd,
+  when compression.zstd or the zstandard module is available); anything
+  else is plain text
+- Streaming in both directions: reads decompress one chunk at a time as the
+  loader's parser asks for more input, so archives are never expanded on
+  disk or held whole in memory
+- Used by benchmark_loader for every input, and for compressed outputs of
+  benchmark_history.py export
+"""
+
+import gzip
+import io
+import lzma
+from pathlib import Path
+from typing import Optional, TextIO
+
+try:                                    # Python 3.14+
+    from compression import zstd as _zstd
+    _ZSTANDARD = False
+except ImportError:
+    try:
+        import zstandard as _zstd
+        _ZSTANDARD = True
+    except ImportError:
+        _zstd = None
+
+# Suffixes of compressed result files.
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".zst")
+
+# Glob patterns matching result files in a directory (Google Benchmark JSON
+# or JSON-Lines), compressed or not.
+RESULT_PATTERNS = tuple(
+    base + s for base in ("*.json", "*.jsonl") for s in ("",) + COMPRESSED_SUFFIXES
+)
+
+# Default compression levels for written files.
+DEFAULT_LEVELS = {".gz": 6, ".xz": 6, ".zst": 3}
+
+
+def compression_of(path: str) -> Optional[str]:
+    """The compression suffix of ``path`` (".gz", ".xz", ".zst"), or None."""
+    suffix = Path(path).suffix.lower()
+    return suffix if suffix in COMPRESSED_SUFFIXES else None
+
+
+def zstd_available() -> bool:
+    return _zstd is not None
+
+
+def _open_zstd(path: str, mode: str, level: int):
+    if _zstd is None:
+        raise ValueError(f"{path}: .zst files need Python 3.14 or the "
+                         "zstandard module (pip install zstandard)")
+    if mode == "rt":
+        return _zstd.open(path, "rb")
+    if _ZSTANDARD:
+        return _zstd.open(path, mode[0] + "b", cctx=_zstd.ZstdCompressor(level=level))
+    return _zstd.open(path, mode[0] + "b", level=level)
+
+
+def open_result(path: str, mode: str = "rt", level: Optional[int] = None) -> TextIO:
+    """
+    Open a result file as UTF-8 text, compressing or decompressing by suffix.
+
+    ``mode`` is "rt", "wt" or "at"; appending to a compressed file adds a
+    new gzip member / xz stream / zstd frame, which readers decompress as
+    one concatenated stream. ``level`` overrides the compression level of
+    written files (see DEFAULT_LEVELS).
+    """
+    if mode not in ("rt", "wt", "at"):
+        raise ValueError(f"unsupported mode: {mode!r}")
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, mode, encoding="utf-8")
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    if compression == ".gz":
+        if mode == "rt":
+            return gzip.open(path, mode, encoding="utf-8")
+        return gzip.open(path, mode, compresslevel=level, encoding="utf-8")
+    if compression == ".xz":
+        if mode == "rt":
+            return lzma.open(path, mode, encoding="utf-8")
+        return lzma.open(path, mode, preset=level, encoding="utf-8")
+    return io.TextIOWrapper(_open_zstd(path, mode, level), encoding="utf-8")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+benchmark_json.py - Pluggable JSON parser backends for the result loaders
+
+Usage:
+    from benchmark_json import get_backend
+
+    backend = get_backend()             # fastest installed, or $BENCHMARK_JSON_BACKEND
+    backend.loads('{"a": 1}')
+
+    # parse throughput of every installed backend on a file:
+    python benchmark_json.py bench results/memory_bench.json [--repeat 3]
+    python benchmark_json.py list
+
+Features:
+- orjson, simdjson (pysimdjson) and the stdlib json module behind one
+  loads() interface; the first installed in that order is used unless
+  BENCHMARK_JSON_BACKEND (or benchmark_compare.py --json-backend) names one
+- Backends are only used where their output is exactly what json would
+  produce; input a fast backend rejects (NaN, integers beyond 64 bits) is
+  re-parsed with json by the caller (see benchmark_loader.JsonEventStream)
+- Micro-benchmark reporting MB/s per backend, both for whole-document
+  parsing and for the streaming loader
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+# Environment variable naming the backend to use.
+BACKEND_ENV = "BENCHMARK_JSON_BACKEND"
+
+# Backends in order of preference.
+BACKEND_NAMES = ("orjson", "simdjson", "json")
+
+
+@dataclass(frozen=True)
+class JsonBackend:
+    """
+    A JSON parser: ``loads`` takes str, returns plain Python values and
+    raises ValueError on input it cannot parse.
+    """
+    name: str
+    loads: Callable[[str], object]
+
+    def decode(self, text: str):
+        """loads(), re-parsing with json whatever this backend rejects."""
+        try:
+            return self.loads(text)
+        except ValueError:
+            if self.loads is json.loads:
+                raise
+            return json.loads(text)
+
+
+def _load_backend(name: str) -> Optional[JsonBackend]:
+    if name == "json":
+        return JsonBackend("json", json.loads)
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return None
+        return JsonBackend("orjson", orjson.loads)
+    if name == "simdjson":
+        try:
+            import simdjson
+        except ImportError:
+            return None
+        return JsonBackend("simdjson", simdjson.loads)
+    raise ValueError(f"unknown JSON backend: {name} (choose from {', '.join(BACKEND_NAMES)})")
+
+
+_backends: Dict[str, Optional[JsonBackend]] = {}
+
+
+def available_backends() -> List[str]:
+    """Names of the installed backends, in order of preference."""
+    return [name for name in BACKEND_NAMES if _cached(name) is not None]
+
+
+def _cached(name: str) -> Optional[JsonBackend]:
+    if name not in _backends:
+        _backends[name] = _load_backend(name)
+    return _backends[name]
+
+
+def get_backend(name: Optional[str] = None) -> JsonBackend:
+    """
+    The backend called ``name``, else the one named by $BENCHMARK_JSON_BACKEND,
+    else the fastest installed one.
+    """
+    name = name or os.environ.get(BACKEND_ENV)
+    if name:
+        backend = _cached(name)
+        if backend is None:
+            raise ValueError(f"JSON backend {name} is not installed")
+        return backend
+    return _cached(available_backends()[0])
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON parser backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List installed backends")
+    bench = sub.add_parser("bench", help="Parse throughput per backend on a file")
+    bench.add_argument("file", help="Google Benchmark JSON document")
+    bench.add_argument("--repeat", type=int, default=3,
+                       help="Best of this many runs (default: 3)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        default = get_backend().name
+        for name in BACKEND_NAMES:
+            state = "installed" if _cached(name) else "not installed"
+            print(f"{name:10} {state}{'  (default)' if name == default else ''}")
+        return
+
+    # Imported here: benchmark_loader parses through this module.
+    from benchmark_loader import load_benchmarks
+
+    with open(args.file, encoding="utf-8") as f:
+        text = f.read()
+    size = len(text.encode("utf-8")) / 1e6
+    reference = None
+    print(f"{args.file}: {size:.1f} MB")
+    print(f"{'backend':10} | {'document MB/s':>13} | {'loader MB/s':>11} | match")
+    print("-" * 50)
+    for name in available_backends():
+        backend = get_backend(name)
+        document_s = _time(lambda: backend.loads(text), args.repeat)
+        os.environ[BACKEND_ENV] = name
+        runs = load_benchmarks(args.file)
+        loader_s = _time(lambda: load_benchmarks(args.file), args.repeat)
+        samples = {n: (dict(r.samples), r.aggregates) for n, r in runs.items()}
+        reference = reference or samples
+        print(f"{name:10} | {size / document_s:>13.1f} | {size / loader_s:>11.1f} | "
+              f"{'yes' if samples == reference else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
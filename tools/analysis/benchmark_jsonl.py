@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+benchmark_jsonl.py - Appendable JSON-Lines result files with a byte-offset index
+
+Usage:
+    from benchmark_jsonl import JsonlWriter, iter_jsonl
+
+    with JsonlWriter("results/memory_bench.jsonl", context) as out:
+        for entry in entries:           # Google Benchmark entries
+            out.write(entry)
+
+    for kind, value in iter_jsonl("results/memory_bench.jsonl", "BM_Random_*"):
+        ...                             # ("context", {...}) / ("benchmark", {...})
+
+    # or from the command line:
+    python benchmark_jsonl.py convert results/memory_bench.json memory_bench.jsonl
+    python benchmark_jsonl.py convert --append results/rerun.json memory_bench.jsonl
+    python benchmark_jsonl.py concat all.jsonl shard0.jsonl shard1.jsonl
+    python benchmark_jsonl.py index all.jsonl
+    python benchmark_compare.py baseline.jsonl current.jsonl --filter 'BM_Random_*'
+
+Format:
+- One JSON object per line: a {"context": {...}} header, then one Google
+  Benchmark entry per line. Appending a run (or concatenating the files of
+  sharded runs) is appending lines; the first header's context applies to
+  the whole file
+- A sidecar index (<file>.idx) lists offset, length and run_name of every
+  line. Filtered reads seek straight to the matching entries. Lines appended
+  by other tools (e.g. cat) are indexed incrementally the next time the
+  file is read; an index whose first line no longer matches the file (the
+  file was rewritten) is rebuilt
+- Compressed files (.jsonl.gz/.xz/.zst) are appendable too but are never
+  indexed; they are streamed and filtered line by line
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from benchmark_io import compression_of, open_result
+from benchmark_json import get_backend
+
+INDEX_SUFFIX = ".idx"
+# Followed by the digest of the first indexed line of the data file.
+INDEX_HEADER = "# benchmark-jsonl-index 2 "
+
+# Index entries of context header lines have no name.
+HEADER = ""
+
+# Buffer size for scanning and copying result files.
+IO_BUFFER = 1 << 20
+
+_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+IndexEntry = Tuple[int, int, str]
+
+
+def is_jsonl(path: str) -> bool:
+    """Whether ``path`` names a JSON-Lines result file (possibly compressed)."""
+    name = str(path)
+    compression = compression_of(name)
+    if compression:
+        name = name[:-len(compression)]
+    return name.lower().endswith(".jsonl")
+
+
+def index_path(path: str) -> str:
+    return str(path) + INDEX_SUFFIX
+
+
+def _run_name(obj: Dict) -> Optional[str]:
+    """Indexed name of a decoded line: run_name, HEADER, or None to skip."""
+    if "name" in obj:
+        return obj.get("run_name", obj["name"])
+    if "context" in obj:
+        return HEADER
+    return None
+
+
+def _escape(name: str) -> str:
+    return name.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _unescape(name: str) -> str:
+    if "\\" not in name:
+        return name
+    return re.sub(r"\\(.)", lambda m: {"t": "\t", "n": "\n"}.get(m[1], m[1]), name)
+
+
+def _scan(path: str, start: int) -> Iterator[IndexEntry]:
+    """Index entries of the complete lines of ``path`` from byte ``start``."""
+    decode = get_backend().decode
+    with open(path, "rb", buffering=IO_BUFFER) as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break                   # partial line still being written
+            stripped = line.strip()
+            if stripped:
+                name = _run_name(decode(stripped.decode("utf-8")))
+                if name is not None:
+                    yield offset, len(line), name
+            offset += len(line)
+
+
+def _first_line_digest(path: str, entries: List[IndexEntry]) -> str:
+    """Digest of the first indexed line of ``path``; "" for an empty index."""
+    if not entries:
+        return ""
+    offset, length, _ = entries[0]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return hashlib.blake2b(f.read(length), digest_size=16).hexdigest()
+
+
+def _read_index(path: str) -> Optional[Tuple[str, List[IndexEntry]]]:
+    """The digest recorded in the index header and the index entries."""
+    try:
+        f = open(index_path(path), "r", encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    with f:
+        header = f.readline()
+        if not header.startswith(INDEX_HEADER) or not header.endswith("\n"):
+            return None
+        digest = header[len(INDEX_HEADER):-1]
+        entries = []
+        try:
+            for line in f:
+                offset, length, name = line.rstrip("\n").split("\t", 2)
+                entries.append((int(offset), int(length), _unescape(name)))
+        except ValueError:
+            return None
+    return digest, entries
+
+
+def _append_index(path: str, entries: Iterable[IndexEntry], create: bool = False):
+    """Append ``entries``; ``create`` starts a new index with them."""
+    if create:
+        entries = list(entries)
+        digest = _first_line_digest(path, entries)
+    with open(index_path(path), "w" if create else "a", encoding="utf-8") as f:
+        if create:
+            f.write(f"{INDEX_HEADER}{digest}\n")
+        f.writelines(f"{o}\t{n}\t{_escape(name)}\n" for o, n, name in entries)
+
+
+def _index_matches(path: str, size: int, digest: str, entries: List[IndexEntry]) -> bool:
+    """
+    Whether ``entries`` still describe the start of ``path``: its first line
+    hashes to ``digest`` and the last indexed line ends on a line boundary.
+    """
+    if not entries:
+        return False                    # nothing to keep; rebuilt with a digest
+    covered = entries[-1][0] + entries[-1][1]
+    if covered > size or _first_line_digest(path, entries) != digest:
+        return False
+    with open(path, "rb") as f:
+        f.seek(covered - 1)
+        return f.read(1) == b"\n"
+
+
+def load_index(path: str) -> List[IndexEntry]:
+    """
+    The (offset, length, run_name) index of a plain JSONL file, brought up
+    to date with any lines appended since it was written.
+
+    The index is rebuilt when it is missing, was written for other file
+    contents (see _index_matches) or is empty; it is updated on disk when
+    the directory is writable.
+    """
+    size = os.path.getsize(path)
+    index = _read_index(path)
+    valid = index is not None and _index_matches(path, size, *index)
+    entries = index[1] if valid else []
+    covered = entries[-1][0] + entries[-1][1] if entries else 0
+    if covered == size and valid:
+        return entries
+    new = list(_scan(path, covered))
+    entries.extend(new)
+    try:
+        _append_index(path, new, create=not valid)
+    except OSError:
+        pass                            # read-only archive: keep it in memory
+    return entries
+
+
+def _matcher(pattern: Optional[str]):
+    if not pattern:
+        return None
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+def iter_jsonl(path: str, pattern: Optional[str] = None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield ("context", context) for the first header and ("benchmark", entry)
+    for every entry whose run_name matches the glob ``pattern`` (all if None).
+
+    Filtered reads of plain files go through the index, seeking only to the
+    matching lines; everything else is streamed.
+    """
+    match = _matcher(pattern)
+    if match is None or compression_of(path):
+        yield from _stream_jsonl(path, match)
+        return
+
+    entries = load_index(path)
+    headers = [e for e in entries if e[2] == HEADER][:1]
+    selected = [e for e in entries if e[2] != HEADER and match(e[2])]
+    decode = get_backend().decode
+    with open(path, "rb", buffering=0) as f:
+        for offset, length, name in headers + selected:
+            f.seek(offset)
+            obj = decode(f.read(length).decode("utf-8"))
+            if name == HEADER:
+                yield "context", obj["context"]
+            else:
+                yield "benchmark", obj
+
+
+def _stream_jsonl(path: str, match) -> Iterator[Tuple[str, Dict]]:
+    seen_context = False
+    decode = get_backend().decode
+    with open_result(path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break                   # partial line still being written
+            if not line.strip():
+                continue
+            obj = decode(line)
+            name = _run_name(obj)
+            if name == HEADER:
+                if not seen_context:
+                    seen_context = True
+                    yield "context", obj["context"]
+            elif name is not None and (match is None or match(name)):
+                yield "benchmark", obj
+
+
+class JsonlWriter:
+    """
+    Append entries to a JSONL result file, keeping its index current.
+
+    A header line is written when ``context`` is given. Readers ignore a
+    trailing partial line, so a file being written can be read at any time.
+    """
+
+    def __init__(self, path: str, context: Optional[Dict] = None,
+                 level: Optional[int] = None):
+        self.path = str(path)
+        self.count = 0
+        self._indexed = not compression_of(self.path)
+        self._index = None
+        if self._indexed:
+            # Catch up first; an empty index is started with the first line.
+            if os.path.exists(self.path) and load_index(self.path):
+                self._index = open(index_path(self.path), "a", encoding="utf-8")
+            self._file = open(self.path, "ab")
+            self._offset = self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open_result(self.path, "at", level)
+        if context is not None:
+            self._write_line({"context": context}, HEADER)
+
+    def _write_line(self, obj: Dict, name: str):
+        line = _ENCODER.encode(obj) + "\n"
+        if not self._indexed:
+            self._file.write(line)
+            return
+        data = line.encode("utf-8")
+        self._file.write(data)
+        if self._index is None:
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            self._index = open(index_path(self.path), "w", encoding="utf-8")
+            self._index.write(f"{INDEX_HEADER}{digest}\n")
+        self._index.write(f"{self._offset}\t{len(data)}\t{_escape(name)}\n")
+        self._offset += len(data)
+
+    def write(self, entry: Dict):
+        self._write_line(entry, entry.get("run_name", entry["name"]))
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+        if self._index is not None:
+            self._index.flush()
+
+    def close(self):
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def concat_jsonl(output: str, shards: Iterable[str]) -> int:
+    """
+    Append plain JSONL shards to ``output`` byte for byte, extending its
+    index with the shards' own index entries shifted by their new offset.
+    Returns the number of benchmark entries appended.
+    """
+    if compression_of(output):
+        raise ValueError(f"{output}: concatenate into a plain .jsonl file")
+    if not os.path.exists(output):
+        open(output, "wb").close()
+    indexed = bool(load_index(output))
+    count = 0
+    with open(output, "ab") as out:
+        for shard in shards:
+            base = out.seek(0, os.SEEK_END)
+            entries = load_index(shard)
+            covered = entries[-1][0] + entries[-1][1] if entries else 0
+            with open(shard, "rb") as src:
+                remaining = covered         # only complete, indexed lines
+                while remaining:
+                    chunk = src.read(min(IO_BUFFER, remaining))
+                    out.write(chunk)
+                    remaining -= len(chunk)
+            out.flush()
+            _append_index(output, ((base + o, n, name) for o, n, name in entries),
+                          create=not indexed)
+            indexed = indexed or bool(entries)
+            count += sum(1 for e in entries if e[2] != HEADER)
+    return count
+
+
+def convert_document(source: str, output: str, level: Optional[int] = None,
+                     append: bool = False) -> int:
+    """
+    Convert a Google Benchmark (or BenchmarkSuite) JSON document to JSONL;
+    returns the entry count. Suite metadata preceding the entries is kept in
+    the header's context. ``output`` is replaced unless ``append`` is set.
+    """
+    # Imported here: benchmark_loader itself reads JSONL through this module.
+    from benchmark_loader import SUITE_FIELDS, JsonEventStream
+
+    if not append:
+        for stale in (output, index_path(output)):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+    with open_result(source) as f:
+        events = JsonEventStream(f)
+        context: Dict = {}
+        writer = None
+        try:
+            for key in events.members():
+                if key == "benchmarks" and events.peek() == "[":
+                    writer = writer or JsonlWriter(output, context, level)
+                    for entry in events.elements():
+                        if isinstance(entry, dict) and "name" in entry:
+                            writer.write(entry)
+                else:
+                    value = events.value()
+                    if key == "context" and isinstance(value, dict):
+                        context.update(value)
+                    elif key in SUITE_FIELDS:
+                        context[key] = value
+            writer = writer or JsonlWriter(output, context, level)
+        finally:
+            if writer is not None:
+                writer.close()
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert, concatenate and index JSON-Lines benchmark results"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="Convert a Google Benchmark JSON document")
+    convert.add_argument("source")
+    convert.add_argument("output", help="Output .jsonl (or .jsonl.gz/.xz/.zst)")
+    convert.add_argument("--append", action="store_true",
+                         help="Append to an existing output instead of replacing it")
+    concat = sub.add_parser("concat", help="Append shards to a JSONL file")
+    concat.add_argument("output")
+    concat.add_argument("shards", nargs="+")
+    index = sub.add_parser("index", help="Build or update the index of a JSONL file")
+    index.add_argument("file")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "convert":
+            count = convert_document(args.source, args.output, append=args.append)
+            print(f"{'Appended' if args.append else 'Wrote'} {count} entries "
+                  f"to {args.output}")
+        elif args.command == "concat":
+            count = concat_jsonl(args.output, args.shards)
+            print(f"Appended {count} entries from {len(args.shards)} shard(s) "
+                  f"to {args.output}")
+        else:
+            entries = load_index(args.file)
+            names = {name for _, _, name in entries if name != HEADER}
+            print(f"{index_path(args.file)}: {len(entries)} lines, "
+                  f"{len(names)} benchmarks")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+benchmark_loader.py - Incremental loader for Google Benchmark JSON output
+
+Usage:
+    from benchmark_loader import iter_benchmarks, load_benchmarks
+
+    for entry in iter_benchmarks("results/memory_bench.json"):
+        print(entry["name"], entry["cpu_time"])
+
+    runs = load_benchmarks("results/memory_bench.json")
+    runs["BM_AOS_Update/1024"].samples["cpu_time"]   # array('d', [...])
+
+    runs = load_benchmarks("results/memory_bench.json", metrics=["bytes_per_second"])
+    runs = load_benchmarks("results/memory_bench.json", metrics=None)   # every metric
+
+Features:
+- Walks the top-level "benchmarks" array one entry at a time
+- Keeps only the fields the comparator needs
+- Never holds the whole document in memory (bounded by one entry + one chunk)
+- Groups --benchmark_repetitions output by run_name: raw per-repetition
+  samples as compact arrays, _mean/_median/_stddev/_cv rows as aggregates
+- Normalizes times to nanoseconds (time_unit); throughput
+  (bytes_per_second/items_per_second) and user counters are kept as
+  metrics only when selected (``metrics``), so plain time comparisons do
+  not hold a column per counter
+- Reads .json.gz/.json.xz/.json.zst archives directly, decompressing as the
+  parser consumes them (see benchmark_io.py)
+- Reads JSON-Lines results (.jsonl, see benchmark_jsonl.py); filtered loads
+  of indexed files seek straight to the matching entries
+- Reads our BenchmarkSuite format (benchmark_utils.hpp): the per-result
+  "module" is kept on each run, the suite's version/compiler/cpu_info are
+  merged into the context
+"""
+
+import fnmatch
+import json
+import re
+import statistics
+from array import array
+from dataclasses import dataclass, field
+from typing import (
+    Callable, Collection, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+)
+
+from benchmark_io import open_result
+from benchmark_json import JsonBackend, get_backend
+from benchmark_jsonl import is_jsonl, iter_jsonl
+
+# Version of the parsed representation produced here; bump it whenever the
+# fields kept or their normalization change, so that cached parses
+# (benchmark_parse_cache.py) are invalidated.
+PARSER_VERSION = 4
+
+# Fields retained from each benchmark entry; everything else is dropped as
+# soon as the entry has been decoded.
+KEPT_FIELDS = (
+    "name",
+    "module",
+    "run_name",
+    "run_type",
+    "aggregate_name",
+    "aggregate_unit",
+    "error_occurred",
+    "cpu_time",
+    "real_time",
+    "bytes_per_second",
+    "items_per_second",
+    "counters",
+)
+
+# Top-level members of a BenchmarkSuite document (benchmark_utils.hpp)
+# describing the build and machine; they are merged into the context.
+SUITE_FIELDS = ("version", "compiler", "cpu_info")
+
+# Time fields, in order of preference for the compared time.
+TIME_FIELDS = ("cpu_time", "real_time")
+
+# Throughput fields; like user counters, only kept when selected.
+THROUGHPUT_FIELDS = ("bytes_per_second", "items_per_second")
+
+# Numeric fields collected per repetition / per aggregate; user counters are
+# collected under their own names as well.
+SAMPLE_FIELDS = TIME_FIELDS + THROUGHPUT_FIELDS
+
+# Numeric fields Google Benchmark writes that are not user counters.
+ENTRY_FIELDS = frozenset(KEPT_FIELDS) | {
+    "family_index",
+    "per_family_instance_index",
+    "repetitions",
+    "repetition_index",
+    "threads",
+    "iterations",
+    "cpu_coefficient",
+    "real_coefficient",
+    "rms",
+}
+
+# Nanoseconds per Google Benchmark time_unit.
+TIME_UNITS = {"ns": 1.0, "us": 1e3, "ms": 1e6, "s": 1e9}
+
+# Size of each read from the underlying file (characters).
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonEventStream:
+    """
+    Minimal pull parser over a text stream.
+
+    Only the structural tokens of the top-level object and the "benchmarks"
+    array are tokenized here; every other top-level value is handed to
+    ``json.JSONDecoder.raw_decode`` as soon as it is fully buffered. Array
+    elements are decoded in batches: everything buffered up to the last
+    "}," goes through the JSON backend's loads() at once (see
+    benchmark_json.py), falling back to raw_decode one element at a time
+    when the batch does not parse. The buffer is compacted on each read so
+    its size is bounded by the largest single value plus one chunk.
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int = CHUNK_SIZE,
+                 backend: Optional[JsonBackend] = None):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._loads = (backend or get_backend()).loads
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._batch_failed = False
+
+    def _fill(self) -> bool:
+        """Read one more chunk into the buffer. Returns False at EOF."""
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += chunk
+        self._batch_failed = False
+        return True
+
+    def _skip_ws(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        self._skip_ws()
+        if self._pos >= len(self._buf):
+            raise json.JSONDecodeError("Unexpected end of data", self._buf, self._pos)
+        return self._buf[self._pos]
+
+    def expect(self, char: str):
+        """Consume the next non-whitespace character, which must be ``char``."""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buf, self._pos)
+        self._pos += 1
+
+    def value(self):
+        """Decode and consume one complete JSON value."""
+        self._skip_ws()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # The value may simply be cut off at the end of the buffer.
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may be truncated.
+            if end == len(self._buf) and not isinstance(obj, (dict, list, str)) \
+                    and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+    def members(self) -> Iterator[str]:
+        """Iterate the keys of an object; the caller must consume each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError("Expecting property name", self._buf, self._pos)
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def _batch(self) -> Optional[list]:
+        """Decode the buffered objects up to the last "}," at once, if any."""
+        if self._batch_failed:
+            return None
+        end = self._buf.rfind("},", self._pos)
+        if end < 0:
+            return None
+        # A cut inside a string or nested value cannot parse as an array, so
+        # a successful parse means "}," really ended an element.
+        try:
+            batch = self._loads("[" + self._buf[self._pos:end + 1] + "]")
+        except ValueError:
+            # NaN, huge integers, or a "}," inside a string: decode this
+            # buffer one element at a time instead.
+            self._batch_failed = True
+            return None
+        self._pos = end + 2
+        return batch
+
+    def elements(self) -> Iterator:
+        """Iterate and decode the elements of an array."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            batch = self._batch()
+            if batch:
+                yield from batch
+                continue
+            yield self.value()
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+@dataclass
+class BenchmarkRun:
+    """
+    All entries Google Benchmark emitted for one run_name.
+
+    ``samples`` holds one value per repetition for each field in
+    SAMPLE_FIELDS and each user counter; ``aggregates`` maps an aggregate
+    name ("mean", "median", "stddev", "cv", ...) to its values for the same
+    fields. ``module`` is the example module the run belongs to, when the
+    results say so.
+    """
+    name: str
+    samples: Dict[str, array] = field(default_factory=dict)
+    aggregates: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    module: Optional[str] = None
+
+    @property
+    def time_field(self) -> str:
+        """The time field compared for this run (cpu_time, else real_time)."""
+        for key in TIME_FIELDS:
+            if self.samples.get(key) or any(key in a for a in self.aggregates.values()):
+                return key
+        raise ValueError(f"No time field found in benchmark: {self.name}")
+
+    @property
+    def time_samples(self) -> array:
+        """Per-repetition values of the compared time field."""
+        return self.samples.get(self.time_field, array("d"))
+
+    @property
+    def repetitions(self) -> int:
+        return len(self.time_samples)
+
+    @property
+    def time(self) -> float:
+        """
+        Representative time: the median of the repetition samples, or the
+        reported median/mean aggregate when only aggregates were written
+        (--benchmark_report_aggregates_only).
+        """
+        return self.value(self.time_field)
+
+    @property
+    def metrics(self) -> List[str]:
+        """Every metric (time, throughput, user counter) this run reported."""
+        names = set(self.samples)
+        for values in self.aggregates.values():
+            names.update(values)
+        return sorted(names)
+
+    def value(self, metric: str) -> float:
+        """Representative value of any metric, chosen like ``time``."""
+        samples = self.samples.get(metric)
+        if samples:
+            return statistics.median(samples)
+        for aggregate in ("median", "mean"):
+            if metric in self.aggregates.get(aggregate, {}):
+                return self.aggregates[aggregate][metric]
+        raise ValueError(f"No {metric} samples or aggregates in benchmark: {self.name}")
+
+    def add_entry(self, entry: Dict):
+        """Fold one slimmed benchmark entry into this run."""
+        if self.module is None and entry.get("module"):
+            self.module = entry["module"]
+        if entry.get("run_type") == "aggregate":
+            aggregate = entry.get("aggregate_name") or entry["name"][len(self.name) + 1:]
+            values = self.aggregates.setdefault(aggregate, {})
+            for key, value in entry_metrics(entry):
+                values[key] = value
+        else:
+            for key, value in entry_metrics(entry):
+                self.samples.setdefault(key, array("d")).append(value)
+
+
+def entry_metrics(entry: Dict) -> List[Tuple[str, float]]:
+    """(metric, value) of every time, throughput field and counter a slimmed entry holds."""
+    metrics = [(key, float(entry[key])) for key in SAMPLE_FIELDS if key in entry]
+    counters = entry.get("counters")
+    if counters:
+        metrics.extend((key, float(value)) for key, value in counters.items())
+    return metrics
+
+
+def group_runs(entries: Iterable[Dict]) -> Dict[str, BenchmarkRun]:
+    """
+    Group benchmark entries by run_name.
+
+    Entries written by old Google Benchmark versions without run_name are
+    grouped under their own name; entries that reported an error carry no
+    timings and are skipped.
+    """
+    runs: Dict[str, BenchmarkRun] = {}
+    for entry in entries:
+        if entry.get("error_occurred"):
+            continue
+        run_name = entry.get("run_name", entry["name"])
+        run = runs.get(run_name)
+        if run is None:
+            run = runs[run_name] = BenchmarkRun(run_name)
+        run.add_entry(entry)
+    return runs
+
+
+# Types of JSON numbers; bool is deliberately not among them.
+_NUMBER_TYPES = frozenset((int, float))
+
+
+def _is_number(value) -> bool:
+    return type(value) in _NUMBER_TYPES
+
+
+def slim_entry(entry: Dict, metrics: Optional[Collection[str]] = ()) -> Dict:
+    """
+    Drop every field of a benchmark entry the comparator does not use.
+
+    Times are converted to nanoseconds according to ``time_unit``. Of the
+    throughput fields and user counters - extra top-level numbers in Google
+    Benchmark output, a "counters" object in ours (benchmark_utils.hpp) -
+    only those named in ``metrics`` are kept (all of them if None); the
+    counters end up in "counters".
+    """
+    slim = {k: entry[k] for k in KEPT_FIELDS
+            if k in entry and k != "counters" and k not in THROUGHPUT_FIELDS}
+    scale = TIME_UNITS.get(entry.get("time_unit", "ns"), 1.0)
+    # The _cv aggregate is a ratio, not a time.
+    if scale != 1.0 and entry.get("aggregate_unit") != "percentage":
+        for key in TIME_FIELDS:
+            if _is_number(slim.get(key)):
+                slim[key] *= scale
+    nested = entry.get("counters")
+    if not isinstance(nested, dict):
+        nested = {}
+    if metrics is None:
+        slim.update((k, entry[k]) for k in THROUGHPUT_FIELDS if k in entry)
+        counters = {
+            k: v for k, v in entry.items()
+            if k not in ENTRY_FIELDS and type(v) in _NUMBER_TYPES
+        }
+        counters.update((k, v) for k, v in nested.items() if _is_number(v))
+    else:
+        counters = {}
+        for k in metrics:
+            if k in THROUGHPUT_FIELDS:
+                if k in entry:
+                    slim[k] = entry[k]
+            elif _is_number(nested.get(k)):
+                counters[k] = nested[k]
+            elif k not in ENTRY_FIELDS and _is_number(entry.get(k)):
+                counters[k] = entry[k]
+    if counters:
+        slim["counters"] = counters
+    return slim
+
+
+def iter_document(
+    stream: TextIO,
+    metrics: Optional[Collection[str]] = ()
+) -> Iterator[Tuple[str, object]]:
+    """
+    Walk a benchmark JSON document as a sequence of events.
+
+    Yields ``("benchmark", entry)`` for each slimmed entry of the "benchmarks"
+    array (keeping ``metrics``, see slim_entry), ``("benchmarks", None)``
+    once the array is exhausted, and ``(key, value)`` for every other
+    top-level member.
+    """
+    events = JsonEventStream(stream)
+    for key in events.members():
+        if key == "benchmarks" and events.peek() == "[":
+            for entry in events.elements():
+                if isinstance(entry, dict) and "name" in entry:
+                    yield "benchmark", slim_entry(entry, metrics)
+            yield "benchmarks", None
+        else:
+            yield key, events.value()
+
+
+def iter_file(
+    filepath: str,
+    pattern: Optional[str] = None,
+    metrics: Optional[Collection[str]] = ()
+) -> Iterator[Tuple[str, object]]:
+    """
+    iter_document() over a result file: a Google Benchmark document or a
+    JSON-Lines file (benchmark_jsonl.py), plain or compressed.
+
+    With ``pattern``, only entries whose run_name matches the glob are
+    yielded; indexed JSONL files seek straight to them.
+    """
+    if is_jsonl(filepath):
+        for key, value in iter_jsonl(filepath, pattern):
+            yield key, slim_entry(value, metrics) if key == "benchmark" else value
+        yield "benchmarks", None
+        return
+    match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+    with open_result(filepath) as f:
+        for key, value in iter_document(f, metrics):
+            if match and key == "benchmark" and \
+                    not match(value.get("run_name", value["name"])):
+                continue
+            yield key, value
+
+
+def iter_benchmarks(
+    filepath: str,
+    pattern: Optional[str] = None,
+    metrics: Optional[Collection[str]] = ()
+) -> Iterator[Dict]:
+    """Yield slimmed benchmark entries from a file in constant memory."""
+    for key, value in iter_file(filepath, pattern, metrics):
+        if key == "benchmark":
+            yield value
+
+
+def load_benchmarks(
+    filepath: str,
+    context: Optional[Dict] = None,
+    pattern: Optional[str] = None,
+    metrics: Optional[Collection[str]] = ()
+) -> Dict:
+    """
+    Load benchmark results as BenchmarkRun objects indexed by run_name.
+
+    Google Benchmark documents are streamed entry by entry. Documents without
+    a "benchmarks" array (our legacy name -> result format) are returned as-is.
+    If ``context`` is given, it is updated with the document's "context"
+    member and any SUITE_FIELDS.
+    ``pattern`` keeps only runs whose name matches the glob (see iter_file).
+    Besides the times, runs hold the throughput fields and user counters
+    named in ``metrics`` (all of them if None, see slim_entry).
+    """
+    return load_entries(filepath, group_runs, context, pattern, metrics)
+
+
+def load_entries(
+    filepath: str,
+    collect: Callable[[Iterable[Dict]], object],
+    context: Optional[Dict] = None,
+    pattern: Optional[str] = None,
+    metrics: Optional[Collection[str]] = ()
+):
+    """
+    load_benchmarks() with another representation of the runs: the slimmed
+    entries are streamed to ``collect`` (group_runs there,
+    benchmark_table.ResultColumns.from_entries for columns) and what it
+    returns is returned. Legacy documents are returned as-is.
+    """
+    others = {}
+    has_benchmarks = False
+
+    def entries():
+        nonlocal has_benchmarks
+        for key, value in iter_file(filepath, pattern, metrics):
+            if key == "benchmark":
+                yield value
+            elif key == "benchmarks":
+                has_benchmarks = True
+            else:
+                others[key] = value
+
+    loaded = collect(entries())
+    if context is not None:
+        if isinstance(others.get("context"), dict):
+            context.update(others["context"])
+        context.update((key, others[key]) for key in SUITE_FIELDS if key in others)
+    return loaded if has_benchmarks else others
+
+
+def load_runs(filepath: str, context: Optional[Dict] = None) -> Dict[str, BenchmarkRun]:
+    """
+    load_benchmarks() for callers that need BenchmarkRun objects: raises
+    ValueError naming ``filepath`` for a document without a "benchmarks" array.
+    """
+    runs = load_benchmarks(filepath, context)
+    if any(not isinstance(run, BenchmarkRun) for run in runs.values()):
+        raise ValueError(f"{filepath}: not a Google Benchmark result "
+                         "(no \"benchmarks\" array)")
+    return runs
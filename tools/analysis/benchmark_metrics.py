@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+benchmark_metrics.py - Metric definitions for the benchmark comparator
+
+Usage:
+    from benchmark_metrics import resolve_metric, metric_value
+
+    metric = resolve_metric("bytes_per_second")    # higher is better
+    metric = resolve_metric("Particles:higher")    # user counter, explicit
+    metric_value(run, metric.name)                 # median over repetitions
+    load_benchmarks(path, metrics=loaded_metrics([metric]))
+
+Features:
+- Built-in metrics: time (cpu_time, else real_time), cpu_time, real_time,
+  bytes_per_second and items_per_second, each with its direction
+- User counters by name; direction given as NAME:higher / NAME:lower or
+  guessed from the name (rates and throughputs are higher-is-better)
+- Value and sample extraction from BenchmarkRun objects and plain result dicts
+- The loader's selection of throughput fields and counters to keep for a
+  set of metrics (loaded_metrics)
+- Unit-aware formatting (times in ns, throughput in B/s or items/s)
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from benchmark_loader import TIME_FIELDS, BenchmarkRun
+
+# The default metric: cpu_time, falling back to real_time.
+TIME = "time"
+
+# Selects every metric both runs reported.
+ALL = "all"
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    higher_is_better: bool = False
+    unit: str = ""                 # "ns", "B/s", "items/s" or "" for counters
+
+
+BUILTIN_METRICS = {
+    TIME: Metric(TIME, False, "ns"),
+    "cpu_time": Metric("cpu_time", False, "ns"),
+    "real_time": Metric("real_time", False, "ns"),
+    "bytes_per_second": Metric("bytes_per_second", True, "B/s"),
+    "items_per_second": Metric("items_per_second", True, "items/s"),
+}
+
+# Counter names containing one of these are assumed to be rates.
+_RATE_HINTS = ("per_second", "rate", "throughput", "bandwidth", "/s")
+
+
+def resolve_metric(spec: str) -> Metric:
+    """
+    Metric for a command-line spec: a name, optionally suffixed with
+    ":higher" or ":lower" to set (or override) its direction.
+    """
+    name, _, direction = spec.partition(":")
+    if direction and direction not in ("higher", "lower"):
+        raise ValueError(f"Unknown metric direction in {spec!r} (use higher or lower)")
+    metric = BUILTIN_METRICS.get(name)
+    if metric is None:
+        lowered = name.lower()
+        metric = Metric(name, any(hint in lowered for hint in _RATE_HINTS))
+    if direction:
+        metric = Metric(metric.name, direction == "higher", metric.unit)
+    return metric
+
+
+def loaded_metrics(metrics: Optional[Sequence[Metric]]) -> Optional[Tuple[str, ...]]:
+    """
+    The ``metrics`` argument of benchmark_loader.load_benchmarks for the
+    metrics to compare: the non-time names, none for time-only comparisons,
+    or None (every metric) when ALL is among them.
+    """
+    if not metrics:
+        return ()
+    if any(metric.name == ALL for metric in metrics):
+        return None
+    return tuple(metric.name for metric in metrics
+                 if metric.name != TIME and metric.name not in TIME_FIELDS)
+
+
+def available_metrics(benchmark) -> List[str]:
+    """Metric names a benchmark result reported (besides TIME)."""
+    if isinstance(benchmark, BenchmarkRun):
+        return benchmark.metrics
+    if isinstance(benchmark, dict):
+        names = [k for k in BUILTIN_METRICS if k != TIME and k in benchmark]
+        counters = benchmark.get("counters")
+        if isinstance(counters, dict):
+            names.extend(counters)
+        return sorted(names)
+    return []
+
+
+def metric_value(benchmark, name: str) -> Optional[float]:
+    """
+    Representative value of a metric, or None if the result lacks it.
+
+    TIME is the comparator's usual time (see benchmark_compare.get_time).
+    """
+    if name == TIME:
+        if hasattr(benchmark, "time"):
+            return benchmark.time
+        for key in ("cpu_time", "real_time"):
+            if key in benchmark:
+                return float(benchmark[key])
+        return None
+    if isinstance(benchmark, BenchmarkRun):
+        return benchmark.value(name) if name in benchmark.metrics else None
+    if isinstance(benchmark, dict):
+        value = benchmark.get(name)
+        if value is None and isinstance(benchmark.get("counters"), dict):
+            value = benchmark["counters"].get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return None
+
+
+def metric_samples(benchmark, name: str) -> List[float]:
+    """
+    Per-repetition samples of a metric; a single sample (the representative
+    value) when the result has no repetitions of it.
+    """
+    if isinstance(benchmark, BenchmarkRun):
+        key = benchmark.time_field if name == TIME else name
+        if benchmark.samples.get(key):
+            return list(benchmark.samples[key])
+    value = metric_value(benchmark, name)
+    return [] if value is None else [value]
+
+
+def format_metric(value: float, metric: Metric) -> str:
+    """Format a metric value with its unit (times are in nanoseconds)."""
+    if metric.unit == "ns":
+        for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+            if value >= scale:
+                return f"{value/scale:.2f} {unit}"
+        return f"{value:.2f} ns"
+    if metric.unit == "B/s":
+        for unit in ("B/s", "KiB/s", "MiB/s", "GiB/s"):
+            if value < 1024:
+                return f"{value:.2f} {unit}"
+            value /= 1024
+        return f"{value:.2f} TiB/s"
+    if metric.unit == "items/s":
+        for unit, scale in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+            if value >= scale:
+                return f"{value/scale:.2f} {unit}items/s"
+        return f"{value:.2f} items/s"
+    return f"{value:.4g}"
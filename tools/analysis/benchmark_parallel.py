@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+benchmark_parallel.py - Parse many result files in parallel into shared memory
+
+Usage:
+    from benchmark_parallel import iter_parsed
+
+    for columns in iter_parsed(["linux/memory_bench.json", "mac/memory_bench.json"]):
+        columns.names[columns.name_ids[i]], columns.cpu_time[i]   # sample i
+        ...                     # valid until the next file is requested
+
+    # or from the command line:
+    python benchmark_history.py ingest nightly/*.json --jobs 32
+
+Features:
+- One worker process per file (up to the worker count): each parses its
+  file with benchmark_loader and lays the samples out as columns (name id,
+  repetition, cpu_time, real_time) plus the interned names in one
+  multiprocessing.shared_memory segment
+- Only the segment name, sizes and the run context travel back through
+  the pool; the parent maps the columns as memoryviews over the segment
+  without copying or unpickling them
+- Files are handed over in input order while later ones are still being
+  parsed, so consuming one file (e.g. inserting it into the history
+  database) overlaps parsing of the next
+"""
+
+import os
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from benchmark_loader import load_runs
+
+NAN = float("nan")
+
+# Column layout of a segment: 8-byte columns first, then 4-byte ones, then
+# the UTF-8 bytes of the names, so every column is naturally aligned.
+_COLUMNS = (
+    ("cpu_time", "d"),
+    ("real_time", "d"),
+    ("name_offsets", "q"),
+    ("name_ids", "i"),
+    ("repetitions", "i"),
+)
+
+# (shared memory name, samples, names, name bytes, context) sent by a worker.
+_Handle = Tuple[str, int, int, int, Dict]
+
+
+def _layout(samples: int, names: int, name_bytes: int) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """Byte range of each column (and "names") in a segment, and its size."""
+    lengths = {"cpu_time": samples, "real_time": samples, "name_offsets": names + 1,
+               "name_ids": samples, "repetitions": samples}
+    ranges = {}
+    position = 0
+    for column, typecode in _COLUMNS:
+        size = lengths[column] * array(typecode).itemsize
+        ranges[column] = (position, position + size)
+        position += size
+    ranges["names"] = (position, position + name_bytes)
+    return ranges, position + name_bytes
+
+
+def _parse_to_shared_memory(filepath: str) -> _Handle:
+    """Worker: parse ``filepath`` and leave its sample columns in a new segment."""
+    context: Dict = {}
+    runs = load_runs(filepath, context)
+    columns = {column: array(typecode) for column, typecode in _COLUMNS}
+    columns["name_offsets"].append(0)
+    encoded = []
+    for name, run in runs.items():
+        cpu = run.samples.get("cpu_time", ())
+        real = run.samples.get("real_time", ())
+        count = max(len(cpu), len(real))
+        if not count:
+            continue
+        name_id = len(encoded)
+        encoded.append(name.encode("utf-8"))
+        columns["name_offsets"].append(columns["name_offsets"][-1] + len(encoded[-1]))
+        columns["name_ids"].extend([name_id] * count)
+        columns["repetitions"].extend(range(count))
+        columns["cpu_time"].extend(cpu)
+        columns["cpu_time"].extend([NAN] * (count - len(cpu)))
+        columns["real_time"].extend(real)
+        columns["real_time"].extend([NAN] * (count - len(real)))
+
+    name_bytes = b"".join(encoded)
+    samples = len(columns["name_ids"])
+    ranges, size = _layout(samples, len(encoded), len(name_bytes))
+    shm = SharedMemory(create=True, size=max(size, 1))
+    try:
+        for column, values in columns.items():
+            start, end = ranges[column]
+            shm.buf[start:end] = memoryview(values).cast("B")
+        start, end = ranges["names"]
+        shm.buf[start:end] = name_bytes
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, samples, len(encoded), len(name_bytes), context
+
+
+@dataclass
+class SampleColumns:
+    """
+    The samples of one result file as columns over a shared memory segment.
+
+    Sample i is benchmark ``names[name_ids[i]]``, repetition
+    ``repetitions[i]``, with ``cpu_time[i]``/``real_time[i]`` in nanoseconds
+    (NaN where the file had no such time). The columns are memoryviews into
+    the segment; they are released by close().
+    """
+    filepath: str
+    context: Dict
+    names: List[str]
+    name_ids: memoryview
+    repetitions: memoryview
+    cpu_time: memoryview
+    real_time: memoryview
+    _shm: SharedMemory
+
+    def __len__(self) -> int:
+        return len(self.name_ids)
+
+    def rows(self) -> Iterator[Tuple[str, int, Optional[float], Optional[float]]]:
+        """(benchmark, repetition, cpu_time or None, real_time or None) per sample."""
+        names = self.names
+        for name_id, repetition, cpu, real in zip(self.name_ids, self.repetitions,
+                                                  self.cpu_time, self.real_time):
+            yield (names[name_id], repetition,
+                   cpu if cpu == cpu else None, real if real == real else None)
+
+    def close(self):
+        """Release the columns and free the segment."""
+        for view in (self.name_ids, self.repetitions, self.cpu_time, self.real_time):
+            view.release()
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _attach(filepath: str, handle: _Handle) -> SampleColumns:
+    shm_name, samples, names, name_bytes, context = handle
+    shm = SharedMemory(name=shm_name)
+    ranges, _ = _layout(samples, names, name_bytes)
+    views = {}
+    for column, typecode in _COLUMNS:
+        start, end = ranges[column]
+        views[column] = shm.buf[start:end].cast(typecode)
+    offsets = views.pop("name_offsets")
+    start, end = ranges["names"]
+    blob = bytes(shm.buf[start:end])
+    decoded = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(names)]
+    offsets.release()
+    return SampleColumns(filepath, context, decoded, views["name_ids"],
+                         views["repetitions"], views["cpu_time"], views["real_time"], shm)
+
+
+def _discard(future: Future):
+    """Free the segment of a parse whose result will never be consumed."""
+    if future.cancel():
+        return
+    try:
+        shm_name = future.result()[0]
+    except Exception:
+        return
+    shm = SharedMemory(name=shm_name)
+    shm.close()
+    shm.unlink()
+
+
+def iter_parsed(
+    filepaths: Sequence[str],
+    workers: Optional[int] = None
+) -> Iterator[SampleColumns]:
+    """
+    Parse ``filepaths`` in a pool of ``workers`` processes (default: CPU
+    count) and yield their SampleColumns in input order.
+
+    Each SampleColumns is closed when the next one is requested (or the
+    iteration ends), so consumers must finish with it - or copy what they
+    keep - before advancing.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(filepaths)) or 1
+    # Workers must register their segments with this process's resource
+    # tracker; one of their own would unlink the segments when they exit.
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_parse_to_shared_memory, path) for path in filepaths]
+        done = 0
+        try:
+            for path, future in zip(filepaths, futures):
+                columns = _attach(path, future.result())
+                done += 1
+                try:
+                    yield columns
+                finally:
+                    columns.close()
+        finally:
+            for future in futures[done:]:
+                _discard(future)
+
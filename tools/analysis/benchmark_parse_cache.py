@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+benchmark_parse_cache.py - On-disk cache of parsed benchmark result files
+
+Usage:
+    from benchmark_parse_cache import ParseCache
+
+    cache = ParseCache(".benchmark-cache", max_bytes=512 << 20)
+    runs = cache.load("baseline/memory_bench.json", context)   # like load_benchmarks
+    table = cache.load_table("baseline/memory_bench.json")     # like load_table
+    cache.hits, cache.misses
+
+    # or from the command line:
+    python benchmark_compare.py baseline.json current.json --cache-dir .benchmark-cache
+    python benchmark_parse_cache.py stats --cache-dir .benchmark-cache
+    python benchmark_parse_cache.py clear --cache-dir .benchmark-cache
+
+Features:
+- Binary sidecar per parsed file, keyed by a BLAKE2 hash of the file's
+  content and the metrics kept (see load_benchmarks) plus the loader's
+  PARSER_VERSION (and the marshal format and byte order it was written with)
+- The sidecar holds the file's ResultColumns (benchmark_table): names and
+  (row, value) columns, written straight from the parsed entries. A warm
+  load is a hash, an mmap, a header check, one marshal.loads of the index
+  and array copies of the columns - no JSON parsing - and yields either
+  BenchmarkRun objects or, for threshold-only comparisons, a ResultTable
+  without an object per benchmark
+- LRU eviction by total size: entries are touched on every hit and the least
+  recently used are removed once the cache exceeds its budget
+- Hit/miss/eviction counters, per process and accumulated in stats.json
+"""
+
+import argparse
+import fnmatch
+import gc
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Collection, Dict, Optional, Union
+
+from benchmark_loader import PARSER_VERSION, load_benchmarks, load_entries
+from benchmark_table import ResultColumns, ResultTable, load_table, table_of
+
+# Default cache budget.
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Read size while hashing input files.
+HASH_CHUNK = 1 << 20
+
+MAGIC = b"BMPARSE2"
+
+# magic, parser version, marshal version, byte order, index offset/length,
+# data offset, number of 8-byte (int64 row / float64 value) words.
+_HEADER = struct.Struct("<8sIIBxxxQQQQ")
+
+SUFFIX = ".bmc"
+STATS_FILE = "stats.json"
+
+
+def content_key(filepath: str, metrics: Optional[Collection[str]] = ()) -> str:
+    """
+    Cache key of a result file: hash of its bytes and of the metrics kept
+    (see benchmark_loader.load_benchmarks), and the parser version.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    selection = "\0*" if metrics is None else "".join(f"\0{m}" for m in sorted(set(metrics)))
+    digest.update(selection.encode())
+    return (f"{digest.hexdigest()}-p{PARSER_VERSION}-m{marshal.version}"
+            f"-{sys.byteorder[0]}")
+
+
+def write_sidecar(path: str, parsed: ResultColumns, context: Dict):
+    """
+    Serialize parsed results; written to a temporary file, then renamed.
+
+    The data section holds the repetition counts, then the rows (int64) and
+    values (float64) of each column; the index locates them.
+    """
+    index_columns = []
+    position = len(parsed)
+    for (aggregate, key), (rows, values) in parsed.columns.items():
+        index_columns.append((aggregate, key, position, len(rows)))
+        position += 2 * len(rows)
+    index = marshal.dumps({"context": context, "names": parsed.names,
+                           "modules": parsed.modules, "columns": index_columns})
+
+    index_offset = _HEADER.size
+    data_offset = index_offset + len(index)
+    data_offset += -data_offset % 8         # keep the words aligned
+    header = _HEADER.pack(MAGIC, PARSER_VERSION, marshal.version,
+                          sys.byteorder == "little", index_offset, len(index),
+                          data_offset, position)
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(index)
+            f.write(b"\0" * (data_offset - index_offset - len(index)))
+            parsed.repetitions.tofile(f)
+            for rows, values in parsed.columns.values():
+                rows.tofile(f)
+                values.tofile(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_sidecar(path: str, context: Optional[Dict] = None) -> Optional[ResultColumns]:
+    """Load parsed results from a sidecar; None if it is missing or stale."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, parser, marshal_version, little, index_offset, index_length, \
+                data_offset, count = _HEADER.unpack_from(mm, 0)
+            if (magic != MAGIC or parser != PARSER_VERSION
+                    or marshal_version != marshal.version
+                    or bool(little) != (sys.byteorder == "little")
+                    or data_offset + 8 * count > len(mm)):
+                return None
+
+            def words(typecode: str, start: int, length: int) -> array:
+                if start + length > count:
+                    raise ValueError("column beyond the data section")
+                column = array(typecode)
+                begin = data_offset + 8 * start
+                column.frombytes(mm[begin:begin + 8 * length])
+                return column
+
+            # Hundreds of thousands of names are created below; collection
+            # passes over them would cost more than the load.
+            enabled = gc.isenabled()
+            gc.disable()
+            try:
+                index = marshal.loads(mm[index_offset:index_offset + index_length])
+                parsed = ResultColumns()
+                parsed.names = index["names"]
+                parsed.ids = {name: row for row, name in enumerate(parsed.names)}
+                parsed.modules = index["modules"]
+                parsed.repetitions = words("q", 0, len(parsed.names))
+                for aggregate, key, start, length in index["columns"]:
+                    parsed.columns[(aggregate, key)] = (
+                        words("q", start, length), words("d", start + length, length)
+                    )
+            except (EOFError, ValueError, TypeError, KeyError):
+                return None
+            finally:
+                if enabled:
+                    gc.enable()
+    if context is not None:
+        context.update(index["context"])
+    return parsed
+
+
+class CacheDirectory:
+    """
+    A directory of cache entries named <key><suffix>, with LRU size-based
+    eviction and hit/miss/eviction counters.
+    """
+    suffix = SUFFIX
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / (key + self.suffix)
+
+    def touch(self, path: Path):
+        """Mark an entry as most recently used."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """(path, size, last use) of every entry, least recently used first."""
+        entries = []
+        for path in self.directory.glob("*" + self.suffix):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def evict(self) -> int:
+        """Remove least recently used entries until within max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            self.evictions += removed
+            self._record(evictions=removed)
+        return removed
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            path.unlink()
+        (self.directory / STATS_FILE).unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters accumulated over every process using this directory."""
+        try:
+            with open(self.directory / STATS_FILE) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _record(self, **deltas: int):
+        # Last writer wins on concurrent updates; the counters are advisory.
+        stats = self.stats()
+        for name, delta in deltas.items():
+            stats[name] = stats.get(name, 0) + delta
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(stats, f)
+        os.replace(tmp, self.directory / STATS_FILE)
+
+
+class ParseCache(CacheDirectory):
+    """A directory of parsed-result sidecars with LRU size-based eviction."""
+
+    def load(self, filepath: str, context: Optional[Dict] = None,
+             metrics: Optional[Collection[str]] = ()) -> Dict:
+        """
+        load_benchmarks() through the cache.
+
+        Legacy documents without a "benchmarks" array are not cached.
+        """
+        loaded = self.load_columns(filepath, context, metrics)
+        return loaded.runs() if isinstance(loaded, ResultColumns) else loaded
+
+    def load_table(self, filepath: str, context: Optional[Dict] = None) -> ResultTable:
+        """benchmark_table.load_table() through the cache."""
+        return table_of(self.load_columns(filepath, context))
+
+    def load_columns(self, filepath: str, context: Optional[Dict] = None,
+                     metrics: Optional[Collection[str]] = ()) -> Union[ResultColumns, Dict]:
+        """The ResultColumns of a file, or the members of a legacy document."""
+        key = content_key(filepath, metrics)
+        path = self.path_for(key)
+        parsed = read_sidecar(str(path), context)
+        if parsed is not None:
+            self.hits += 1
+            self.touch(path)
+            self._record(hits=1)
+            return parsed
+
+        self.misses += 1
+        parsed_context: Dict = {}
+        loaded = load_entries(filepath, ResultColumns.from_entries, parsed_context,
+                              metrics=metrics)
+        if context is not None:
+            context.update(parsed_context)
+        if isinstance(loaded, ResultColumns):
+            write_sidecar(str(path), loaded, parsed_context)
+            self.evict()
+        self._record(misses=1)
+        return loaded
+
+
+def load_cached(filepath: str, context: Optional[Dict] = None,
+                cache_dir: Optional[str] = None,
+                pattern: Optional[str] = None,
+                metrics: Optional[Collection[str]] = ()) -> Dict:
+    """
+    load_benchmarks(), through a ParseCache when ``cache_dir`` is given.
+
+    The cache holds whole files, so ``pattern`` filters a cached load after
+    the fact rather than being part of the key.
+    """
+    if cache_dir is None:
+        return load_benchmarks(filepath, context, pattern, metrics)
+    runs = ParseCache(cache_dir).load(filepath, context, metrics)
+    if pattern:
+        runs = {name: run for name, run in runs.items()
+                if fnmatch.fnmatchcase(name, pattern)}
+    return runs
+
+
+def load_cached_table(filepath: str, context: Optional[Dict] = None,
+                      cache_dir: Optional[str] = None,
+                      pattern: Optional[str] = None) -> ResultTable:
+    """load_table(), through a ParseCache when ``cache_dir`` is given."""
+    if cache_dir is None:
+        return load_table(filepath, context, pattern)
+    table = ParseCache(cache_dir).load_table(filepath, context)
+    if pattern:
+        table = table.select([row for row, name in enumerate(table.names)
+                              if fnmatch.fnmatchcase(name, pattern)])
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or clear the parsed benchmark result cache"
+    )
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("--cache-dir", default=".benchmark-cache",
+                        help="Cache directory (default: .benchmark-cache)")
+    args = parser.parse_args()
+
+    cache = ParseCache(args.cache_dir)
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared {args.cache_dir}")
+        return
+    entries = cache.entries()
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    rate = f" ({stats['hits'] / lookups:.0%} hit rate)" if lookups else ""
+    print(f"{len(entries)} entries, {sum(e[1] for e in entries) / 1e6:.1f} MB "
+          f"in {args.cache_dir}")
+    print(f"hits {stats['hits']}, misses {stats['misses']}{rate}, "
+          f"evictions {stats['evictions']}")
+
+
+if __name__ == "__main__":
+    main()
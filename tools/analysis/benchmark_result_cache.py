@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+benchmark_result_cache.py - Reuse the results of benchmark executables that did not change
+
+Usage:
+    from benchmark_result_cache import ResultCache
+
+    cache = ResultCache(".benchmark-results", max_bytes=256 << 20)
+    key = cache.key_for("build/examples/01-cpu/branch_bench", ["--benchmark_min_time=1"])
+    if not cache.restore(key, "results/branch_bench.json"):
+        ...                             # run it, then
+        cache.store(key, "results/branch_bench.json")
+
+    # or from the command line:
+    python benchmark_runner.py build -o results --cache-dir .benchmark-results
+    python benchmark_result_cache.py stats --cache-dir .benchmark-results
+    python benchmark_result_cache.py clear --cache-dir .benchmark-results
+
+Features:
+- Keyed by a BLAKE2 hash of everything a result depends on: the bytes of
+  the executable and of every shared library it resolves to (ldd), the
+  benchmark arguments, the environment variables that change how it runs
+  (RELEVANT_ENV) and the host fingerprint of benchmark_history
+- A hit copies the stored result to the output path (compressing it like a
+  fresh run); the runner marks such results as cached in its report and log
+- LRU eviction by total size, with hit/miss/eviction counters, as in
+  benchmark_parse_cache
+- Where ldd is unavailable (macOS) only the executable itself is hashed
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+from benchmark_history import host_fingerprint
+from benchmark_io import compression_of, open_result
+from benchmark_parse_cache import DEFAULT_MAX_BYTES, HASH_CHUNK, CacheDirectory
+from benchmark_topology import SYSFS_CPU, parse_cache_size, parse_cpu_list
+
+# Bumped whenever the composition of the key changes.
+KEY_VERSION = 1
+
+# Environment variables that change what a benchmark measures: OpenMP
+# threading and placement, glibc malloc/string tuning, preloaded libraries.
+RELEVANT_ENV = (
+    "OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_PLACES", "OMP_SCHEDULE",
+    "OMP_WAIT_POLICY", "GOMP_CPU_AFFINITY", "KMP_AFFINITY",
+    "GLIBC_TUNABLES", "MALLOC_ARENA_MAX", "LD_PRELOAD", "LD_LIBRARY_PATH",
+    "LD_BIND_NOW",
+)
+
+# Seconds ldd may take to resolve an executable's libraries.
+LDD_TIMEOUT = 30
+
+# "libm.so.6 => /lib/x86_64-linux-gnu/libm.so.6 (0x...)" or
+# "/lib64/ld-linux-x86-64.so.2 (0x...)"; linux-vdso has no file.
+_LDD_LINE = re.compile(r"^\s*(?:(\S+)\s+=>\s+)?(\S+?)(?:\s+\(0x[0-9a-f]+\))?\s*$")
+
+SUFFIX = ".result"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shared_libraries(executable: str) -> Dict[str, str]:
+    """
+    The shared libraries ``executable`` resolves to, by soname: their path,
+    or "not found". Empty where ldd is unavailable or the file is not a
+    dynamic executable.
+    """
+    try:
+        completed = subprocess.run(["ldd", executable], capture_output=True,
+                                   text=True, timeout=LDD_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    if completed.returncode:
+        return {}
+    libraries = {}
+    for line in completed.stdout.splitlines():
+        if "not found" in line:
+            libraries[line.split("=>")[0].strip()] = "not found"
+            continue
+        match = _LDD_LINE.match(line)
+        if match and match[2].startswith("/"):
+            libraries[match[1] or os.path.basename(match[2])] = match[2]
+    return libraries
+
+
+def host_context(sysfs: str = SYSFS_CPU, cpuinfo: str = "/proc/cpuinfo") -> Dict:
+    """
+    The fields of a Google Benchmark context that host_fingerprint uses
+    (num_cpus, caches, cpu_info), read from this machine.
+    """
+    context: Dict = {"num_cpus": os.cpu_count()}
+    caches = []
+    for index in sorted(Path(sysfs, "cpu0", "cache").glob("index*")):
+        try:
+            caches.append({
+                "type": (index / "type").read_text().strip(),
+                "level": int((index / "level").read_text()),
+                "size": parse_cache_size((index / "size").read_text()),
+                "num_sharing": len(parse_cpu_list((index / "shared_cpu_list").read_text())),
+            })
+        except (OSError, ValueError):
+            continue
+    context["caches"] = caches
+    try:
+        with open(cpuinfo, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    context["cpu_info"] = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return context
+
+
+class ResultCache(CacheDirectory):
+    """Stored result files of benchmark executables, by key_for()."""
+    suffix = SUFFIX
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 env: Optional[Mapping[str, str]] = None, host: Optional[str] = None):
+        super().__init__(directory, max_bytes)
+        self.env = os.environ if env is None else env
+        self.host = host if host is not None else host_fingerprint(host_context())
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+
+    def _digest(self, path: str) -> str:
+        """file_digest(), once per file version and cache instance."""
+        st = os.stat(path)
+        version = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+        if version not in self._digests:
+            self._digests[version] = file_digest(path)
+        return self._digests[version]
+
+    def key_parts(self, executable: str, benchmark_args: Sequence[str] = ()) -> Dict:
+        """Everything the result of ``executable`` is keyed on."""
+        libraries = {}
+        for soname, path in sorted(shared_libraries(executable).items()):
+            try:
+                libraries[soname] = self._digest(path) if path != "not found" else path
+            except OSError:
+                libraries[soname] = "unreadable"
+        return {
+            "version": KEY_VERSION,
+            "executable": self._digest(executable),
+            "libraries": libraries,
+            "args": list(benchmark_args),
+            "env": {name: self.env[name] for name in RELEVANT_ENV if name in self.env},
+            "host": self.host,
+        }
+
+    def key_for(self, executable: str, benchmark_args: Sequence[str] = ()) -> str:
+        parts = json.dumps(self.key_parts(executable, benchmark_args), sort_keys=True)
+        return hashlib.blake2b(parts.encode(), digest_size=20).hexdigest()
+
+    def restore(self, key: str, destination: str) -> bool:
+        """Write the stored result of ``key`` to ``destination``; False on a miss."""
+        path = self.path_for(key)
+        directory = os.path.dirname(destination) or "."
+        # The temporary file carries the compression suffix of the destination.
+        fd, tmp = tempfile.mkstemp(suffix=".tmp" + (compression_of(destination) or ""),
+                                   dir=directory)
+        os.close(fd)
+        try:
+            with open(path, encoding="utf-8") as src, open_result(tmp, "wt") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, destination)
+        except FileNotFoundError:
+            os.unlink(tmp)
+            self.misses += 1
+            self._record(misses=1)
+            return False
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.hits += 1
+        self.touch(path)
+        self._record(hits=1)
+        return True
+
+    def store(self, key: str, source: str):
+        """Keep the (possibly compressed) result file ``source`` under ``key``."""
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with open_result(source) as src, os.fdopen(fd, "w", encoding="utf-8") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, self.path_for(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or clear the benchmark result cache"
+    )
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("--cache-dir", default=".benchmark-results",
+                        help="Cache directory (default: .benchmark-results)")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir, host="")
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared {args.cache_dir}")
+        return
+    entries = cache.entries()
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    rate = f" ({stats['hits'] / lookups:.0%} hit rate)" if lookups else ""
+    print(f"{len(entries)} results, {sum(e[1] for e in entries) / 1e6:.1f} MB "
+          f"in {args.cache_dir}")
+    print(f"hits {stats['hits']}, misses {stats['misses']}{rate}, "
+          f"evictions {stats['evictions']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1034 @@
+#!/usr/bin/env python3
+"""
+benchmark_runner.py - Discover and run the benchmark executables of a build
+
+Usage:
+    python benchmark_runner.py build --output-dir results
+    python benchmark_runner.py build -o results --only 'aos_*' --benchmark_repetitions=5
+    python benchmark_runner.py build -o results --compress zst --timeout 1800
+    python benchmark_runner.py build --list
+    python benchmark_runner.py build -o results --jobs 31 --bandwidth-bound 'BM_AOS_*'
+    python benchmark_runner.py build --ab baseline-build -o ab --rounds 20 --order random
+    python benchmark_compare.py ab/baseline ab/candidate --stat-test wilcoxon
+    python benchmark_runner.py build -o results --cache-dir .benchmark-results
+    python benchmark_runner.py build -o results --adaptive --target-ci 0.005 --time-budget 30
+
+Features:
+- Finds every executable named *_bench under the build directory (skipping
+  CMakeFiles); its module is the examples/<module> directory it was built in
+- Runs each with --benchmark_format=json; any other --benchmark_* option is
+  passed through to every executable
+- Captures exit status, stderr and wall time per executable; the JSON of a
+  successful run is written to <output-dir>/<executable>.json (compressed
+  with --compress), ready for benchmark_compare.py results/ ...
+- A failed run publishes no result file, so the comparator never sees
+  truncated JSON; its stderr is kept in <executable>.stderr
+- Every run is recorded as one JSON line in <output-dir>/benchmark_runs.log
+  (deliberately not *.json, so result-set globs skip it)
+- Exits non-zero when any executable failed, after running all of them
+- Runs benchmark families concurrently on Linux (--jobs, default: one per
+  physical core but one): each family is its own process, pinned with
+  sched_setaffinity to a physical core none of whose SMT siblings is in use
+  (see benchmark_topology.py); families that start threads of their own run
+  alone, and no two bandwidth-bound families share a last-level cache:
+  BM_Sequential_*, BM_Random_*, --bandwidth-bound, and any family whose
+  working set (benchmark_caches.py) exceeds the LLC. The families of an
+  executable are merged back into its result file
+- Interleaved A/B runs of a baseline and a candidate build (--ab): every
+  benchmark the two have in common is run on its own, alternating sides in
+  ABBA or random order over --rounds rounds, so machine drift hits both
+  alike; sample i of both sides is a pair for the comparator's paired
+  test (benchmark_compare.py --stat-test wilcoxon)
+- Adaptive repetitions (--adaptive): each benchmark is repeated in batches
+  until the confidence interval of its mean time is within --target-ci of
+  the mean, or it runs out of --max-repetitions or --time-budget; stable
+  benchmarks stop early and noisy ones get the samples they need. Why each
+  one stopped is printed, logged and kept in the result's context
+- Result cache (--cache-dir): executables whose binary, shared libraries,
+  arguments, relevant environment and host match a stored run are not run
+  again; their stored result is published and reported as cached (see
+  benchmark_result_cache.py)
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from benchmark_caches import working_set_bytes
+from benchmark_families import parse_benchmark_name
+from benchmark_io import COMPRESSED_SUFFIXES, open_result
+from benchmark_parse_cache import DEFAULT_MAX_BYTES
+from benchmark_result_cache import ResultCache
+from benchmark_stats import relative_ci_half_width
+from benchmark_topology import Core, CpuTopology, read_topology
+
+# Suffix of the executables run by default (hpc_add_example's <name>_bench).
+BENCH_SUFFIX = "_bench"
+
+# Log of the runs of one invocation, one JSON object per line.
+RUN_LOG = "benchmark_runs.log"
+
+# Build tree directories that never contain benchmark executables.
+SKIPPED_DIRS = frozenset({"CMakeFiles", "_deps", "Testing"})
+
+# Families that start threads of their own (examples/02-memory-cache
+# false sharing, examples/05-concurrency); they run alone on the machine.
+EXCLUSIVE_FAMILIES = ("BM_FalseSharing_*", "BM_Atomic_*", "BM_OpenMP_*")
+
+# Families bound by memory bandwidth, whatever their working set; two of
+# them sharing a last-level cache would measure each other. Families whose
+# working set benchmark_caches knows are bandwidth-bound when it exceeds the
+# LLC (BM_AOS_Update, BM_Scalar, ... at their largest sizes).
+BANDWIDTH_FAMILIES = ("BM_Sequential_*", "BM_Random_*")
+
+# Last-level cache size assumed where the topology does not report one.
+DEFAULT_LLC_BYTES = 32 << 20
+
+# Orders of the two sides within a round of an interleaved A/B run.
+AB_ORDERS = ("abba", "random")
+
+# Output subdirectories of the two sides of an interleaved A/B run.
+AB_SIDES = ("baseline", "candidate")
+
+# Why an adaptive benchmark stopped repeating.
+STOP_PRECISION = "precision"            # CI half-width below the target
+STOP_TIME_BUDGET = "time_budget"
+STOP_MAX_REPETITIONS = "max_repetitions"
+STOP_FAILED = "failed"
+
+# Trailing stderr kept in the run log; the whole of it goes to <name>.stderr.
+STDERR_TAIL = 4000
+
+
+@dataclass
+class BenchmarkBinary:
+    """A benchmark executable found in the build tree."""
+    name: str
+    module: str
+    path: str
+
+
+@dataclass
+class RunResult:
+    """Outcome of running one benchmark executable."""
+    name: str
+    module: str
+    path: str
+    command: List[str]
+    returncode: Optional[int]
+    wall_time: float
+    output: Optional[str] = None
+    stderr: str = ""
+    error: Optional[str] = None
+    cpus: List[int] = field(default_factory=list)   # pinned to, if any
+    adaptive: Dict[str, Dict] = field(default_factory=dict)  # per benchmark, --adaptive
+    cached: bool = False                # result reused from a ResultCache
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and self.error is None
+
+
+def _module_of(path: Path, build_dir: Path) -> str:
+    parts = path.relative_to(build_dir).parts
+    if "examples" in parts[:-1]:
+        return parts[parts.index("examples") + 1]
+    return path.parent.name
+
+
+def discover_benchmarks(build_dir: str, pattern: Optional[str] = None) -> List[BenchmarkBinary]:
+    """
+    Benchmark executables under ``build_dir``, sorted by module and name.
+
+    ``pattern`` is a glob on the executable name (default: ``*_bench``).
+    """
+    root = Path(build_dir)
+    if not root.is_dir():
+        raise FileNotFoundError(f"build directory not found: {build_dir}")
+    pattern = pattern or f"*{BENCH_SUFFIX}"
+    binaries = []
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = sorted(d for d in subdirs if d not in SKIPPED_DIRS)
+        for name in files:
+            if not fnmatch.fnmatchcase(name, pattern):
+                continue
+            path = Path(directory) / name
+            if os.access(path, os.X_OK):
+                binaries.append(BenchmarkBinary(name, _module_of(path, root), str(path)))
+    return sorted(binaries, key=lambda b: (b.module, b.name))
+
+
+def result_path(output_dir: str, binary: BenchmarkBinary, compress: Optional[str] = None) -> str:
+    """Where the JSON of ``binary`` is written."""
+    suffix = f".json.{compress}" if compress else ".json"
+    return str(Path(output_dir) / (binary.name + suffix))
+
+
+def list_benchmarks(
+    binary: BenchmarkBinary,
+    benchmark_args: Sequence[str] = (),
+    timeout: Optional[float] = None
+) -> List[str]:
+    """Names of the benchmarks ``binary`` would run (--benchmark_list_tests)."""
+    completed = subprocess.run(
+        [binary.path, "--benchmark_list_tests=true", *benchmark_args],
+        capture_output=True, text=True, timeout=timeout, check=True,
+    )
+    return [line.strip() for line in completed.stdout.splitlines() if line.strip()]
+
+
+_ERE_SPECIAL = frozenset(".[]()*+?{}|^$\\")
+
+
+def _ere_escape(name: str) -> str:
+    """Escape a benchmark name for Google Benchmark's POSIX extended regex."""
+    return "".join("\\" + ch if ch in _ERE_SPECIAL else ch for ch in name)
+
+
+@dataclass
+class Job:
+    """
+    One process of a run: a whole executable, or the benchmarks of one
+    family of it (``names``) selected with --benchmark_filter.
+    """
+    binary: BenchmarkBinary
+    names: List[str] = field(default_factory=list)
+    family: Optional[str] = None
+    index: int = 0                      # position of the family in the executable
+    exclusive: bool = False             # runs alone on the machine
+    bandwidth: bool = False             # at most one such job per LLC
+
+    def command(self, benchmark_args: Sequence[str]) -> List[str]:
+        command = [self.binary.path, "--benchmark_format=json"]
+        if not self.names:
+            return command + list(benchmark_args)
+        command += [a for a in benchmark_args if not a.startswith("--benchmark_filter")]
+        alternatives = "|".join(_ere_escape(name) for name in self.names)
+        return command + [f"--benchmark_filter=^({alternatives})$"]
+
+
+def _matches(name: str, patterns: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def _beyond_llc(names: Sequence[str], llc_bytes: int) -> bool:
+    """Whether any of ``names`` has a known working set larger than the LLC."""
+    return any((working_set_bytes(name) or 0) > llc_bytes for name in names)
+
+
+def plan_jobs(
+    binaries: Sequence[BenchmarkBinary],
+    benchmark_args: Sequence[str] = (),
+    exclusive: Sequence[str] = EXCLUSIVE_FAMILIES,
+    bandwidth: Sequence[str] = BANDWIDTH_FAMILIES,
+    timeout: Optional[float] = None,
+    llc_bytes: Optional[int] = None
+) -> List[Job]:
+    """
+    Split executables into one job per benchmark family, for running
+    concurrently.
+
+    Families matching ``exclusive`` or registered with ->Threads(n > 1) are
+    exclusive; families matching ``bandwidth``, or with a benchmark whose
+    working set (benchmark_caches.working_set_bytes) exceeds ``llc_bytes``
+    (default: DEFAULT_LLC_BYTES), are bandwidth-bound. An
+    executable whose benchmarks cannot be listed becomes one exclusive job,
+    so it runs (and fails) as it would serially. Exclusive jobs come last.
+    """
+    jobs = []
+    for binary in binaries:
+        try:
+            names = list_benchmarks(binary, benchmark_args, timeout)
+        except (OSError, subprocess.SubprocessError):
+            names = []
+        families: Dict[str, List[str]] = {}
+        threaded = set()
+        for name in names:
+            parsed = parse_benchmark_name(name)
+            families.setdefault(parsed.family, []).append(name)
+            if parsed.threads > 1:
+                threaded.add(parsed.family)
+        if not families:
+            jobs.append(Job(binary, exclusive=True))
+        for index, (family, members) in enumerate(families.items()):
+            jobs.append(Job(
+                binary, members, family, index,
+                exclusive=family in threaded or _matches(family, exclusive),
+                bandwidth=(_matches(family, bandwidth)
+                           or _beyond_llc(members, llc_bytes or DEFAULT_LLC_BYTES)),
+            ))
+    return sorted(jobs, key=lambda job: job.exclusive)
+
+
+@dataclass
+class _Process:
+    """A job being run: its process, temporary stdout file and stderr."""
+    job: Job
+    core: Optional[Core]
+    stdout: str
+    stderr: IO[bytes]
+    popen: Optional[subprocess.Popen] = None
+    start: float = 0.0
+    wall_time: float = 0.0
+    error: Optional[str] = None
+
+
+def _launch(job: Job, benchmark_args: Sequence[str], output_dir: str,
+            core: Optional[Core]) -> _Process:
+    fd, tmp = tempfile.mkstemp(prefix=f".{job.binary.name}.", suffix=".tmp", dir=output_dir)
+    process = _Process(job, core, tmp, tempfile.TemporaryFile())
+    process.start = time.perf_counter()
+    try:
+        with os.fdopen(fd, "wb") as stdout:
+            process.popen = subprocess.Popen(job.command(benchmark_args), stdout=stdout,
+                                             stderr=process.stderr)
+    except (OSError, subprocess.SubprocessError) as e:
+        process.error = str(e)
+        return process
+    # Pinned after the spawn: a preexec_fn is unsafe while the scheduler's
+    # threads run. Pinned families are single-threaded (EXCLUSIVE_FAMILIES
+    # run unpinned), so no thread of the benchmark keeps the old affinity.
+    if core:
+        try:
+            os.sched_setaffinity(process.popen.pid, {core.cpu})
+        except OSError:
+            pass                    # already exited, or the CPU went offline: run unpinned
+    return process
+
+
+def _place(job: Job, free: List[Optional[Core]], running: Iterable[_Process]) -> int:
+    """Index in ``free`` of the slot to run ``job`` on, or -1 if none fits."""
+    if not job.bandwidth:
+        return 0 if free else -1
+    busy = {p.core.llc for p in running if p.job.bandwidth and p.core is not None}
+    for i, core in enumerate(free):
+        if core is None or core.llc not in busy:
+            return i
+    return -1
+
+
+def _schedule(
+    jobs: Sequence[Job],
+    benchmark_args: Sequence[str],
+    output_dir: str,
+    timeout: Optional[float],
+    slots: List[Optional[Core]],
+    on_done
+):
+    """
+    Run ``jobs`` on ``slots`` (a pinned Core, or None for an unpinned slot),
+    one job per slot, calling ``on_done`` with each finished _Process.
+
+    An exclusive job starts only once nothing else runs, and nothing else
+    starts until it has finished; it is not pinned.
+    """
+    pending = list(jobs)
+    free = list(slots)
+    running: Dict[Future, _Process] = {}
+
+    def finish(future: Future):
+        process = running.pop(future)
+        process.wall_time = time.perf_counter() - process.start
+        if not process.job.exclusive:
+            free.append(process.core)
+            free.sort(key=lambda core: -1 if core is None else core.cpu)
+        on_done(process)
+
+    with ThreadPoolExecutor(max_workers=max(len(slots), 1)) as waiters:
+        while pending or running:
+            for job in list(pending):
+                if any(p.job.exclusive for p in running.values()):
+                    break
+                if job.exclusive:
+                    if running:
+                        break
+                    process = _launch(job, benchmark_args, output_dir, None)
+                else:
+                    slot = _place(job, free, running.values())
+                    if slot < 0:
+                        continue
+                    process = _launch(job, benchmark_args, output_dir, free.pop(slot))
+                pending.remove(job)
+                future: Future = Future()
+                if process.popen is None:
+                    future.set_result(None)
+                else:
+                    future = waiters.submit(process.popen.wait)
+                running[future] = process
+
+            deadline = None
+            if timeout:
+                deadline = min(p.start for p in running.values()) + timeout
+            if deadline is None:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            else:
+                done, _ = wait(list(running), max(deadline - time.perf_counter(), 0),
+                               FIRST_COMPLETED)
+            now = time.perf_counter()
+            for future, process in list(running.items()):
+                if future not in done and timeout and now - process.start > timeout:
+                    process.popen.kill()
+                    process.error = f"timed out after {timeout:g} s"
+                    future.result()
+                    done.add(future)
+            for future in done:
+                finish(future)
+
+
+def _publish(processes: List[_Process], destination: str, compress: Optional[str]):
+    """Write the output of a binary's processes to ``destination``."""
+    if len(processes) == 1 and not compress:
+        os.replace(processes[0].stdout, destination)
+        return
+    if len(processes) == 1:
+        with open(processes[0].stdout, encoding="utf-8") as src, \
+                open_result(destination, "wt") as dst:
+            shutil.copyfileobj(src, dst)
+        return
+    document = None
+    for process in processes:
+        with open(process.stdout, encoding="utf-8") as f:
+            part = json.load(f)
+        if document is None:
+            document = part
+        else:
+            document.setdefault("benchmarks", []).extend(part.get("benchmarks", []))
+    with open_result(destination, "wt") as f:
+        json.dump(document, f, indent=2)
+
+
+def _collect(
+    binary: BenchmarkBinary,
+    processes: List[_Process],
+    benchmark_args: Sequence[str],
+    output_dir: str,
+    compress: Optional[str]
+) -> RunResult:
+    """RunResult of a binary whose processes have all finished; publishes its JSON."""
+    processes = sorted(processes, key=lambda p: p.job.index)
+    command = processes[0].job.command(benchmark_args) if len(processes) == 1 \
+        else [binary.path, "--benchmark_format=json", *benchmark_args]
+    result = RunResult(binary.name, binary.module, binary.path, command, 0,
+                       sum(p.wall_time for p in processes))
+    result.cpus = sorted({p.core.cpu for p in processes if p.core is not None})
+    captured = []
+    for process in processes:
+        if process.popen is not None:
+            returncode = process.popen.returncode
+            if returncode and not result.returncode:
+                result.returncode = returncode
+        else:
+            result.returncode = None
+        result.error = result.error or process.error
+        process.stderr.seek(0)
+        captured.append(process.stderr.read().decode("utf-8", "replace"))
+        process.stderr.close()
+    captured_text = "".join(captured)
+    result.stderr = captured_text[-STDERR_TAIL:]
+
+    stderr_path = Path(output_dir) / (binary.name + ".stderr")
+    if captured_text:
+        stderr_path.write_text(captured_text, encoding="utf-8")
+    elif stderr_path.exists():
+        stderr_path.unlink()                    # stale log of an earlier run
+    destination = result_path(output_dir, binary, compress)
+    try:
+        if result.ok:
+            try:
+                _publish(processes, destination, compress)
+                result.output = destination
+            except ValueError as e:             # an output that is not JSON
+                result.error = f"invalid JSON output: {e}"
+        if not result.ok and os.path.exists(destination):
+            os.unlink(destination)              # never leave an older result behind
+    finally:
+        for process in processes:
+            if os.path.exists(process.stdout):
+                os.unlink(process.stdout)
+    return result
+
+
+def run_benchmark(
+    binary: BenchmarkBinary,
+    output_dir: str,
+    benchmark_args: Sequence[str] = (),
+    timeout: Optional[float] = None,
+    compress: Optional[str] = None
+) -> RunResult:
+    """
+    Run one executable, writing its JSON to result_path() if it succeeds.
+
+    The output is written to a temporary file first and only moved into
+    place (or compressed into place) after a zero exit status.
+    """
+    processes: List[_Process] = []
+    _schedule([Job(binary)], benchmark_args, output_dir, timeout, [None], processes.append)
+    return _collect(binary, processes, benchmark_args, output_dir, compress)
+
+
+def default_jobs(topology: Optional[CpuTopology]) -> int:
+    """Concurrent jobs: one per physical core, leaving one to the runner and OS."""
+    if topology is None:
+        return 1
+    return max(len(topology.cores) - 1, 1)
+
+
+def run_all(
+    binaries: Sequence[BenchmarkBinary],
+    output_dir: str,
+    benchmark_args: Sequence[str] = (),
+    timeout: Optional[float] = None,
+    compress: Optional[str] = None,
+    progress=None,
+    jobs: int = 1,
+    topology: Optional[CpuTopology] = None,
+    exclusive: Sequence[str] = EXCLUSIVE_FAMILIES,
+    bandwidth: Sequence[str] = BANDWIDTH_FAMILIES,
+    cache: Optional[ResultCache] = None
+) -> List[RunResult]:
+    """
+    Run ``binaries`` and log them to <output_dir>/RUN_LOG; returns their
+    RunResults in the order of ``binaries``.
+
+    With ``jobs`` > 1 and a ``topology``, every benchmark family is run as
+    its own process pinned to a physical core of its own (see plan_jobs and
+    _schedule), up to ``jobs`` at a time, and the families of an executable
+    are merged back into its result file; wall_time is then the sum of the
+    family runs. Otherwise the executables run whole, one after another.
+    ``timeout`` applies to every process. ``progress`` is called with each
+    RunResult as soon as it is available.
+
+    With a ``cache``, executables whose key (see ResultCache.key_for) has a
+    stored result are not run: the result is restored and its RunResult
+    marked ``cached``. Successful runs are stored for next time.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results: Dict[str, RunResult] = {}
+    keys: Dict[str, str] = {}
+    for binary in binaries if cache is not None else ():
+        key = cache.key_for(binary.path, benchmark_args)
+        destination = result_path(output_dir, binary, compress)
+        if cache.restore(key, destination):
+            results[binary.path] = RunResult(
+                binary.name, binary.module, binary.path,
+                [binary.path, "--benchmark_format=json", *benchmark_args],
+                0, 0.0, output=destination, cached=True)
+        else:
+            keys[binary.path] = key
+    to_run = [binary for binary in binaries if binary.path not in results]
+
+    if jobs > 1 and topology is not None and hasattr(os, "sched_setaffinity"):
+        planned = plan_jobs(to_run, benchmark_args, exclusive, bandwidth, timeout,
+                            topology.llc_bytes)
+        slots: List[Optional[Core]] = list(topology.cores[:jobs])
+    else:
+        planned = [Job(binary) for binary in to_run]
+        slots = [None]
+    remaining = Counter(job.binary.path for job in planned)
+    finished: Dict[str, List[_Process]] = {}
+
+    with open(Path(output_dir) / RUN_LOG, "w", encoding="utf-8") as log:
+        for result in list(results.values()):
+            log.write(json.dumps(asdict(result)) + "\n")
+            if progress:
+                progress(result)
+        log.flush()
+
+        def on_done(process: _Process):
+            binary = process.job.binary
+            finished.setdefault(binary.path, []).append(process)
+            remaining[binary.path] -= 1
+            if remaining[binary.path]:
+                return
+            result = _collect(binary, finished.pop(binary.path), benchmark_args,
+                              output_dir, compress)
+            results[binary.path] = result
+            if result.ok and binary.path in keys:
+                cache.store(keys[binary.path], result.output)
+            log.write(json.dumps(asdict(result)) + "\n")
+            log.flush()
+            if progress:
+                progress(result)
+
+        _schedule(planned, benchmark_args, output_dir, timeout, slots, on_done)
+    return [results[binary.path] for binary in binaries]
+
+
+def pair_binaries(
+    baseline: Sequence[BenchmarkBinary],
+    candidate: Sequence[BenchmarkBinary]
+) -> List[Tuple[BenchmarkBinary, BenchmarkBinary]]:
+    """Executables present in both builds, matched by module and name."""
+    index = {(b.module, b.name): b for b in baseline}
+    return [(index[(c.module, c.name)], c) for c in candidate if (c.module, c.name) in index]
+
+
+def ab_schedule(
+    benchmarks: Sequence,
+    rounds: int,
+    order: str = "abba",
+    seed: Optional[int] = None
+) -> List[Tuple[int, object, int]]:
+    """
+    The (round, benchmark, side) invocations of an interleaved A/B run;
+    side 0 is the baseline.
+
+    Every round runs each benchmark once per side, the benchmarks in a fresh
+    random order, the two sides of a benchmark back to back. "abba"
+    alternates which side goes first from round to round (AB BA AB ...);
+    "random" picks it at random every time.
+    """
+    if order not in AB_ORDERS:
+        raise ValueError(f"unknown A/B order: {order} (choose from {', '.join(AB_ORDERS)})")
+    rng = random.Random(seed)
+    schedule = []
+    for round_ in range(rounds):
+        shuffled = list(benchmarks)
+        rng.shuffle(shuffled)
+        for benchmark in shuffled:
+            first = round_ % 2 if order == "abba" else rng.randrange(2)
+            schedule += [(round_, benchmark, first), (round_, benchmark, 1 - first)]
+    return schedule
+
+
+def _run_one(binary: BenchmarkBinary, name: str, benchmark_args: Sequence[str],
+             timeout: Optional[float]) -> Tuple[Optional[Dict], RunResult]:
+    """Run a single benchmark of ``binary``: its JSON document and RunResult."""
+    command = [binary.path, "--benchmark_format=json",
+               *[a for a in benchmark_args if not a.startswith("--benchmark_filter")],
+               f"--benchmark_filter=^{_ere_escape(name)}$"]
+    result = RunResult(binary.name, binary.module, binary.path, command, None, 0.0)
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=timeout)
+        result.returncode = completed.returncode
+        result.stderr = completed.stderr.decode("utf-8", "replace")[-STDERR_TAIL:]
+    except subprocess.TimeoutExpired:
+        result.error = f"{name}: timed out after {timeout:g} s"
+    except OSError as e:
+        result.error = str(e)
+    result.wall_time = time.perf_counter() - start
+    if not result.ok:
+        return None, result
+    try:
+        return json.loads(completed.stdout), result
+    except ValueError as e:
+        result.error = f"{name}: invalid JSON output: {e}"
+        return None, result
+
+
+def run_interleaved(
+    pairs: Sequence[Tuple[BenchmarkBinary, BenchmarkBinary]],
+    output_dir: str,
+    rounds: int = 10,
+    order: str = "abba",
+    seed: Optional[int] = None,
+    benchmark_args: Sequence[str] = (),
+    timeout: Optional[float] = None,
+    compress: Optional[str] = None,
+    progress=None
+) -> List[RunResult]:
+    """
+    Interleaved A/B run of (baseline, candidate) executable pairs.
+
+    Every benchmark both executables of a pair have is run on its own
+    (--benchmark_filter) in ab_schedule() order, one process per sample, so
+    slow drift of the machine hits both sides alike. The samples are written
+    per side to <output_dir>/baseline and <output_dir>/candidate in round
+    order - repetition i of a benchmark on one side was measured next to
+    repetition i on the other - for benchmark_compare.py --stat-test
+    wilcoxon. The contexts record the session under "interleaved".
+
+    Returns a RunResult per side and pair (baseline first). As with run_all,
+    nothing is published for a pair unless all runs of both sides succeeded.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    session = f"{seed:08x}-{os.getpid():x}-{int(time.time()):x}"
+    for side in AB_SIDES:
+        os.makedirs(Path(output_dir) / side, exist_ok=True)
+
+    benchmarks = []
+    results = [[RunResult(b.name, b.module, b.path, [b.path, "--benchmark_format=json",
+                                                     *benchmark_args], 0, 0.0)
+                for b in pair] for pair in pairs]
+    for i, pair in enumerate(pairs):
+        try:
+            listed = [list_benchmarks(binary, benchmark_args, timeout) for binary in pair]
+        except (OSError, subprocess.SubprocessError) as e:
+            for result in results[i]:
+                result.error = f"cannot list benchmarks: {e}"
+            continue
+        baseline_names = set(listed[0])
+        benchmarks += [(i, name) for name in listed[1] if name in baseline_names]
+
+    documents: Dict[Tuple[int, int], Dict] = {}
+    samples: Dict[Tuple[int, int, str], Dict[int, List[Dict]]] = {}
+    for round_, (i, name), side in ab_schedule(benchmarks, rounds, order, seed):
+        document, result = _run_one(pairs[i][side], name, benchmark_args, timeout)
+        total = results[i][side]
+        total.wall_time += result.wall_time
+        if not result.ok:
+            if total.ok:
+                total.returncode, total.error = result.returncode, result.error
+            total.stderr = result.stderr
+            continue
+        if not total.stderr:
+            total.stderr = result.stderr
+        documents.setdefault((i, side), document)
+        samples.setdefault((i, side, name), {})[round_] = [
+            e for e in document.get("benchmarks", [])
+            if e.get("run_type", "iteration") == "iteration"
+        ]
+
+    with open(Path(output_dir) / RUN_LOG, "w", encoding="utf-8") as log:
+        for i, pair in enumerate(pairs):
+            for side, binary in enumerate(pair):
+                result, other = results[i][side], results[i][1 - side]
+                if result.ok and not other.ok:
+                    result.error = f"not published: the {AB_SIDES[1 - side]} side failed"
+                destination = result_path(str(Path(output_dir) / AB_SIDES[side]),
+                                          binary, compress)
+                if not result.ok and os.path.exists(destination):
+                    os.unlink(destination)      # never leave an older result behind
+                if result.ok:
+                    context = dict(documents.get((i, side), {}).get("context", {}))
+                    context["interleaved"] = {
+                        "session": session, "side": AB_SIDES[side], "rounds": rounds,
+                        "order": order, "seed": seed, "other": pair[1 - side].path,
+                    }
+                    entries = []
+                    for name in [n for j, n in benchmarks if j == i]:
+                        runs = samples.get((i, side, name), {})
+                        for round_ in sorted(runs):
+                            for entry in runs[round_]:
+                                entries.append(dict(entry, repetition_index=round_))
+                    with open_result(destination, "wt") as f:
+                        json.dump({"context": context, "benchmarks": entries}, f, indent=2)
+                    result.output = destination
+                log.write(json.dumps(dict(asdict(result), side=AB_SIDES[side])) + "\n")
+                if progress:
+                    progress(result)
+    return [result for pair_results in results for result in pair_results]
+
+
+@dataclass
+class AdaptivePolicy:
+    """When adaptive repetition of a benchmark stops (run_adaptive)."""
+    target: float = 0.01                # relative CI half-width of the mean
+    confidence: float = 0.95
+    batch: int = 3                      # repetitions per process
+    min_repetitions: int = 5
+    max_repetitions: int = 100
+    time_budget: float = 60.0           # wall seconds per benchmark
+
+
+def _time_of(entry: Dict) -> Optional[float]:
+    for key in ("cpu_time", "real_time"):
+        if isinstance(entry.get(key), (int, float)):
+            return float(entry[key])
+    return None
+
+
+def repeat_adaptively(
+    binary: BenchmarkBinary,
+    name: str,
+    policy: AdaptivePolicy,
+    benchmark_args: Sequence[str] = (),
+    timeout: Optional[float] = None
+) -> Tuple[List[Dict], Optional[Dict], Dict, RunResult]:
+    """
+    Repeat one benchmark in batches until ``policy`` says stop.
+
+    Returns its iteration entries, the context of the first batch, the
+    stopping record ({"repetitions", "stopped", "relative_ci", "wall_time"})
+    and the RunResult of the last batch.
+    """
+    args = [a for a in benchmark_args
+            if not a.startswith(("--benchmark_repetitions", "--benchmark_report_aggregates_only"))]
+    entries: List[Dict] = []
+    samples: List[float] = []
+    context = None
+    spent = 0.0
+    relative = float("inf")
+    while True:
+        wanted = policy.batch if samples else max(policy.batch, policy.min_repetitions)
+        wanted = min(wanted, policy.max_repetitions - len(samples))
+        document, run = _run_one(binary, name, [*args, f"--benchmark_repetitions={wanted}"],
+                                 timeout)
+        spent += run.wall_time
+        batch = [e for e in (document or {}).get("benchmarks", [])
+                 if e.get("run_type", "iteration") == "iteration" and _time_of(e) is not None]
+        if not run.ok or not batch:
+            run.error = run.error or (None if run.returncode else f"{name}: no samples")
+            stopped = STOP_FAILED
+            break
+        if context is None:
+            context = document.get("context", {})
+        entries += batch
+        samples += [_time_of(e) for e in batch]
+        if len(samples) >= max(policy.min_repetitions, 2):
+            relative = relative_ci_half_width(samples, policy.confidence)
+            if relative <= policy.target:
+                stopped = STOP_PRECISION
+                break
+        if len(samples) >= policy.max_repetitions:
+            stopped = STOP_MAX_REPETITIONS
+            break
+        if spent >= policy.time_budget:
+            stopped = STOP_TIME_BUDGET
+            break
+    for index, entry in enumerate(entries):
+        entry.update(repetitions=len(entries), repetition_index=index)
+    record = {"repetitions": len(entries), "stopped": stopped,
+              "relative_ci": relative if relative != float("inf") else None,
+              "wall_time": spent}
+    return entries, context, record, run
+
+
+def run_adaptive(
+    binaries: Sequence[BenchmarkBinary],
+    output_dir: str,
+    policy: Optional[AdaptivePolicy] = None,
+    benchmark_args: Sequence[str] = (),
+    timeout: Optional[float] = None,
+    compress: Optional[str] = None,
+    progress=None
+) -> List[RunResult]:
+    """
+    Run every benchmark of ``binaries`` with adaptive repetitions.
+
+    Each benchmark is run on its own in batches of ``policy.batch``
+    repetitions (after a first batch of at least ``min_repetitions``); after
+    every batch the confidence interval of its mean time is recomputed and
+    repetition stops once its half-width relative to the mean is at most
+    ``policy.target``, or the benchmark has used up ``time_budget`` or
+    ``max_repetitions``. Why each benchmark stopped is recorded in
+    RunResult.adaptive, the run log and the result file's context
+    ("adaptive"). Results and failures are published as by run_all.
+    """
+    policy = policy or AdaptivePolicy()
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    with open(Path(output_dir) / RUN_LOG, "w", encoding="utf-8") as log:
+        for binary in binaries:
+            result = RunResult(binary.name, binary.module, binary.path,
+                               [binary.path, "--benchmark_format=json", *benchmark_args],
+                               0, 0.0)
+            try:
+                names = list_benchmarks(binary, benchmark_args, timeout)
+            except (OSError, subprocess.SubprocessError) as e:
+                names = []
+                result.error = f"cannot list benchmarks: {e}"
+            context: Optional[Dict] = None
+            entries: List[Dict] = []
+            for name in names:
+                found, first_context, record, run = repeat_adaptively(
+                    binary, name, policy, benchmark_args, timeout)
+                result.adaptive[name] = record
+                result.wall_time += record["wall_time"]
+                if run.stderr:
+                    result.stderr = run.stderr
+                if record["stopped"] == STOP_FAILED:
+                    result.returncode, result.error = run.returncode, run.error
+                    break
+                context = context if context is not None else first_context
+                entries += found
+
+            destination = result_path(output_dir, binary, compress)
+            if result.ok:
+                document_context = dict(context or {})
+                document_context["adaptive"] = {
+                    "target": policy.target, "confidence": policy.confidence,
+                    "benchmarks": result.adaptive,
+                }
+                with open_result(destination, "wt") as f:
+                    json.dump({"context": document_context, "benchmarks": entries}, f,
+                              indent=2)
+                result.output = destination
+            elif os.path.exists(destination):
+                os.unlink(destination)          # never leave an older result behind
+            results.append(result)
+            log.write(json.dumps(asdict(result)) + "\n")
+            log.flush()
+            if progress:
+                progress(result)
+    return results
+
+
+def read_run_log(output_dir: str) -> List[Dict]:
+    """The records of the last run_all() into ``output_dir``."""
+    with open(Path(output_dir) / RUN_LOG, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _print_result(result: RunResult):
+    status = "ok" if result.ok else (result.error or f"exit {result.returncode}")
+    if result.cached:
+        status += " (cached)"
+    print(f"{result.module:28} {result.name:32} {result.wall_time:8.1f} s  {status}")
+    if not result.ok and result.stderr:
+        for line in result.stderr.rstrip().splitlines()[-5:]:
+            print(f"    {line}")
+    for name, record in result.adaptive.items():
+        relative = record["relative_ci"]
+        precision = f"+/-{relative:.2%}" if relative is not None else "n/a"
+        print(f"    {name:56} {record['repetitions']:4} reps  {precision:>10}  "
+              f"{record['stopped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Discover and run benchmark executables, writing JSON results",
+        epilog="Any --benchmark_* option is passed through to every executable."
+    )
+    parser.add_argument("build_dir", help="CMake build directory (the candidate with --ab)")
+    parser.add_argument("--output-dir", "-o", default="results",
+                        help="Directory for the result files (default: results)")
+    parser.add_argument("--only", metavar="PATTERN",
+                        help=f"Glob on executable names (default: *{BENCH_SUFFIX})")
+    parser.add_argument("--timeout", type=float,
+                        help="Seconds before an executable is killed and counted as failed")
+    parser.add_argument("--compress", choices=[s[1:] for s in COMPRESSED_SUFFIXES],
+                        help="Compress result files (.json.gz/.xz/.zst)")
+    parser.add_argument("--jobs", "-j", type=int,
+                        help="Benchmark families run concurrently, each pinned to a "
+                             "physical core (default: physical cores - 1; 1 runs "
+                             "whole executables one after another)")
+    parser.add_argument("--exclusive", action="append", default=[], metavar="PATTERN",
+                        help="Also run families matching this glob alone "
+                             f"(always: {', '.join(EXCLUSIVE_FAMILIES)})")
+    parser.add_argument("--bandwidth-bound", action="append", default=[], metavar="PATTERN",
+                        help="Also keep families matching this glob apart per LLC "
+                             f"(always: {', '.join(BANDWIDTH_FAMILIES)} and families "
+                             "whose known working set exceeds the LLC)")
+    parser.add_argument("--ab", metavar="BASELINE_BUILD",
+                        help="Interleaved A/B run against this baseline build tree: "
+                             "paired samples in <output-dir>/baseline and /candidate")
+    parser.add_argument("--rounds", type=int, default=10,
+                        help="Paired samples per benchmark with --ab (default: 10)")
+    parser.add_argument("--order", choices=AB_ORDERS, default="abba",
+                        help="Side order within a round with --ab (default: abba)")
+    parser.add_argument("--seed", type=int,
+                        help="Seed of the --ab order (default: random, recorded in the context)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Repeat each benchmark until its mean is precise enough "
+                             "(replaces --benchmark_repetitions)")
+    parser.add_argument("--target-ci", type=float, default=AdaptivePolicy.target,
+                        help="Relative CI half-width to stop at with --adaptive "
+                             "(default: %(default)g)")
+    parser.add_argument("--confidence", type=float, default=AdaptivePolicy.confidence,
+                        help="Confidence level of that interval (default: %(default)g)")
+    parser.add_argument("--batch", type=int, default=AdaptivePolicy.batch,
+                        help="Repetitions between precision checks (default: %(default)d)")
+    parser.add_argument("--min-repetitions", type=int, default=AdaptivePolicy.min_repetitions,
+                        help="Repetitions before the first check (default: %(default)d)")
+    parser.add_argument("--max-repetitions", type=int, default=AdaptivePolicy.max_repetitions,
+                        help="Repetitions per benchmark at most (default: %(default)d)")
+    parser.add_argument("--time-budget", type=float, default=AdaptivePolicy.time_budget,
+                        help="Wall seconds per benchmark at most (default: %(default)g)")
+    parser.add_argument("--cache-dir", metavar="DIR",
+                        help="Reuse results of executables that did not change "
+                             "(same binary, libraries, arguments, environment and host)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        metavar="MB", help="Size the result cache is evicted down to "
+                                           "(default: %(default)d)")
+    parser.add_argument("--list", action="store_true",
+                        help="List the executables that would run, then exit")
+    args, extra = parser.parse_known_args()
+    unknown = [a for a in extra if not a.startswith("--benchmark_")]
+    if unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    if any(a.startswith("--benchmark_format") for a in extra):
+        parser.error("--benchmark_format is always json")
+    if args.ab and args.jobs and args.jobs > 1:
+        parser.error("--ab runs one benchmark at a time")
+    if args.adaptive:
+        if args.ab:
+            parser.error("--adaptive cannot be combined with --ab")
+        if args.jobs and args.jobs > 1:
+            parser.error("--adaptive runs one benchmark at a time")
+        if not 0 < args.confidence < 1 or args.target_ci <= 0:
+            parser.error("--confidence must be in (0, 1) and --target-ci positive")
+        if min(args.batch, args.min_repetitions, args.max_repetitions) < 1:
+            parser.error("--batch, --min-repetitions and --max-repetitions must be positive")
+    if args.cache_dir and (args.ab or args.adaptive):
+        parser.error("--cache-dir applies to plain runs only")
+
+    try:
+        binaries = discover_benchmarks(args.build_dir, args.only)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.list:
+        for binary in binaries:
+            print(f"{binary.module:28} {binary.path}")
+        return
+    if not binaries:
+        print(f"Error: no benchmark executables in {args.build_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.ab:
+        try:
+            pairs = pair_binaries(discover_benchmarks(args.ab, args.only), binaries)
+        except FileNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not pairs:
+            print(f"Error: no executables common to {args.ab} and {args.build_dir}",
+                  file=sys.stderr)
+            sys.exit(1)
+        start = time.perf_counter()
+        results = run_interleaved(pairs, args.output_dir, args.rounds, args.order, args.seed,
+                                  extra, args.timeout, args.compress, progress=_print_result)
+        _exit_with_summary(results, args.output_dir, start)
+
+    if args.adaptive:
+        policy = AdaptivePolicy(args.target_ci, args.confidence, args.batch,
+                                args.min_repetitions, args.max_repetitions, args.time_budget)
+        start = time.perf_counter()
+        results = run_adaptive(binaries, args.output_dir, policy, extra, args.timeout,
+                               args.compress, progress=_print_result)
+        _exit_with_summary(results, args.output_dir, start)
+
+    topology = read_topology()
+    jobs = args.jobs or default_jobs(topology)
+    if jobs > 1 and topology is None:
+        print("Warning: CPU topology not available; running one executable at a time",
+              file=sys.stderr)
+    cache = ResultCache(args.cache_dir, args.cache_size << 20) if args.cache_dir else None
+    start = time.perf_counter()
+    results = run_all(binaries, args.output_dir, extra, args.timeout, args.compress,
+                      progress=_print_result, jobs=jobs, topology=topology,
+                      exclusive=EXCLUSIVE_FAMILIES + tuple(args.exclusive),
+                      bandwidth=BANDWIDTH_FAMILIES + tuple(args.bandwidth_bound),
+                      cache=cache)
+    _exit_with_summary(results, args.output_dir, start)
+
+
+def _exit_with_summary(results: List[RunResult], output_dir: str, start: float):
+    failed = [r for r in results if not r.ok]
+    cached = sum(r.cached for r in results)
+    reused = f" ({cached} cached)" if cached else ""
+    print(f"\n{len(results) - len(failed)}/{len(results)} succeeded{reused} in "
+          f"{time.perf_counter() - start:.1f} s; results in {output_dir}")
+    if failed:
+        print(f"Failed: {', '.join(r.name for r in failed)}", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+benchmark_stats.py - Significance tests for benchmark repetition samples
+
+Usage:
+    from benchmark_stats import run_tests
+
+    results = run_tests([(baseline_samples, current_samples), ...], "mannwhitney")
+    results[0].p_value, results[0].effect_size
+
+Features:
+- Two-sided Mann-Whitney U test (exact for small tie-free samples, normal
+  approximation with tie correction otherwise)
+- Welch's unequal-variance t-test
+- Wilcoxon signed-rank test of paired samples (exact for small tie-free
+  samples), for interleaved A/B runs where sample i of both sides was
+  measured back to back (benchmark_runner.py --ab)
+- Batch evaluation: all benchmarks are tested in one call and the exact U
+  distributions are computed once per (n1, n2) shape for the whole batch
+- Bootstrap percentile confidence intervals for the speedup of every
+  benchmark, spread over a process pool for large suites
+- Multiple-testing correction across a comparison set (Benjamini-Hochberg
+  false discovery rate, Holm family-wise error rate)
+- Robust outlier test of one new measurement against a history of runs
+- Relative confidence-interval half-width of a mean, the stopping rule of
+  adaptive repetitions (benchmark_runner.py --adaptive)
+
+Effect sizes are signed so that positive means "current is slower":
+rank-biserial correlation for Mann-Whitney, Cohen's d for Welch, the
+matched-pairs rank-biserial correlation for Wilcoxon.
+
+Only the standard library is used so the tool keeps running on a bare
+python3 in CI.
+"""
+
+import math
+import os
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+STAT_TESTS = ("mannwhitney", "welch", "wilcoxon")
+CORRECTIONS = ("bh", "holm")
+
+# Largest n1 * n2 for which the exact Mann-Whitney distribution is used.
+EXACT_MWU_MAX_PRODUCT = 400
+
+# Largest number of pairs for which the exact signed-rank distribution is used.
+EXACT_WILCOXON_MAX_N = 30
+
+# Number of benchmarks from which bootstrap resampling uses a process pool.
+BOOTSTRAP_PARALLEL_MIN = 256
+
+
+@dataclass
+class TestResult:
+    statistic: Optional[float]
+    p_value: Optional[float]
+    effect_size: Optional[float]
+
+
+# ---------------------------------------------------------------------------
+# Special functions
+# ---------------------------------------------------------------------------
+
+def normal_sf(z: float) -> float:
+    """Survival function of the standard normal distribution."""
+    return 0.5 * math.erfc(z / math.sqrt(2.0))
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """Continued fraction for the incomplete beta function (Lentz)."""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-14:
+            break
+    return h
+
+
+def betainc(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                 + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(log_front) * _betacf(a, b, x) / a
+    return 1.0 - math.exp(log_front) * _betacf(b, a, 1.0 - x) / b
+
+
+def t_sf_two_sided(t: float, df: float) -> float:
+    """Two-sided p-value of Student's t distribution."""
+    if math.isinf(t):
+        return 0.0
+    return betainc(df / 2.0, 0.5, df / (df + t * t))
+
+
+def t_quantile(confidence: float, df: float) -> float:
+    """The t with P(|T| <= t) = ``confidence`` for Student's t (by bisection)."""
+    if not 0.0 < confidence < 1.0:
+        raise ValueError(f"confidence must be in (0, 1): {confidence}")
+    if df <= 0:
+        raise ValueError(f"degrees of freedom must be positive: {df}")
+    alpha = 1.0 - confidence
+    low, high = 0.0, 1.0
+    while t_sf_two_sided(high, df) > alpha:
+        high *= 2.0
+    for _ in range(100):
+        mid = (low + high) / 2.0
+        if t_sf_two_sided(mid, df) > alpha:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+def relative_ci_half_width(samples: Sequence[float], confidence: float = 0.95) -> float:
+    """
+    Half-width of the t confidence interval of the mean of ``samples``,
+    relative to the mean; inf with fewer than two samples or a zero mean.
+    """
+    if len(samples) < 2:
+        return math.inf
+    mean, var = _mean_var(samples)
+    if mean == 0:
+        return math.inf
+    half = t_quantile(confidence, len(samples) - 1) * math.sqrt(var / len(samples))
+    return half / abs(mean)
+
+
+# ---------------------------------------------------------------------------
+# Mann-Whitney U
+# ---------------------------------------------------------------------------
+
+def _exact_u_cdf(n1: int, n2: int) -> List[float]:
+    """
+    Cumulative distribution of U for tie-free samples of sizes n1 and n2.
+
+    Built with the classic recurrence over the number of arrangements, one
+    row of n2 at a time.
+    """
+    max_u = n1 * n2
+    # counts[j][u]: arrangements of i x-values and j y-values with statistic u
+    counts = [[1] + [0] * max_u for _ in range(n2 + 1)]
+    for _ in range(1, n1 + 1):
+        new = [[0] * (max_u + 1) for _ in range(n2 + 1)]
+        new[0][0] = 1
+        for j in range(1, n2 + 1):
+            prev_x, prev_y = counts[j], new[j - 1]
+            row = new[j]
+            for u in range(max_u + 1):
+                value = prev_y[u]
+                if u >= j:
+                    value += prev_x[u - j]
+                row[u] = value
+        counts = new
+    freq = counts[n2]
+    total = float(sum(freq))
+    cdf, acc = [], 0
+    for f in freq:
+        acc += f
+        cdf.append(acc / total)
+    return cdf
+
+
+def _rank(values: Sequence[float]) -> Tuple[List[float], float]:
+    """Average ranks (1-based) and the tie correction term sum(t^3 - t)."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    tie_term = 0.0
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        avg = (i + j) / 2.0 + 1.0
+        for k in range(i, j + 1):
+            ranks[order[k]] = avg
+        t = j - i + 1
+        tie_term += t * t * t - t
+        i = j + 1
+    return ranks, tie_term
+
+
+def mann_whitney_u(
+    baseline: Sequence[float],
+    current: Sequence[float],
+    exact_cache: Optional[Dict[Tuple[int, int], List[float]]] = None
+) -> TestResult:
+    """Two-sided Mann-Whitney U test of current against baseline."""
+    n1, n2 = len(current), len(baseline)
+    if n1 == 0 or n2 == 0:
+        return TestResult(None, None, None)
+
+    ranks, tie_term = _rank(list(current) + list(baseline))
+    u = sum(ranks[:n1]) - n1 * (n1 + 1) / 2.0
+    effect = 2.0 * u / (n1 * n2) - 1.0
+    mean_u = n1 * n2 / 2.0
+
+    if tie_term == 0 and n1 * n2 <= EXACT_MWU_MAX_PRODUCT:
+        key = (min(n1, n2), max(n1, n2))
+        cache = exact_cache if exact_cache is not None else {}
+        cdf = cache.get(key)
+        if cdf is None:
+            cdf = cache[key] = _exact_u_cdf(*key)
+        u_low = int(round(min(u, n1 * n2 - u)))
+        return TestResult(u, min(1.0, 2.0 * cdf[u_low]), effect)
+
+    n = n1 + n2
+    var_u = n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1)))
+    if var_u <= 0:
+        return TestResult(u, 1.0, effect)
+    z = (abs(u - mean_u) - 0.5) / math.sqrt(var_u)
+    return TestResult(u, min(1.0, 2.0 * normal_sf(max(z, 0.0))), effect)
+
+
+# ---------------------------------------------------------------------------
+# Welch's t-test
+# ---------------------------------------------------------------------------
+
+def _mean_var(values: Sequence[float]) -> Tuple[float, float]:
+    n = len(values)
+    mean = math.fsum(values) / n
+    var = math.fsum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, var
+
+
+def welch_t_test(baseline: Sequence[float], current: Sequence[float]) -> TestResult:
+    """Welch's unequal-variance t-test of current against baseline."""
+    n1, n2 = len(current), len(baseline)
+    if n1 < 2 or n2 < 2:
+        return TestResult(None, None, None)
+
+    m1, v1 = _mean_var(current)
+    m2, v2 = _mean_var(baseline)
+    pooled = math.sqrt(((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2))
+    se2_1, se2_2 = v1 / n1, v2 / n2
+    se = math.sqrt(se2_1 + se2_2)
+
+    if se == 0:
+        if m1 == m2:
+            return TestResult(0.0, 1.0, 0.0)
+        return TestResult(math.copysign(math.inf, m1 - m2), 0.0,
+                          math.copysign(math.inf, m1 - m2))
+
+    t = (m1 - m2) / se
+    df = (se2_1 + se2_2) ** 2 / (
+        (se2_1 ** 2) / (n1 - 1) + (se2_2 ** 2) / (n2 - 1)
+    )
+    effect = (m1 - m2) / pooled if pooled > 0 else math.copysign(math.inf, m1 - m2)
+    return TestResult(t, t_sf_two_sided(t, df), effect)
+
+
+# ---------------------------------------------------------------------------
+# Wilcoxon signed-rank test
+# ---------------------------------------------------------------------------
+
+def _exact_signed_rank_cdf(n: int) -> List[float]:
+    """P(W+ <= w) for w = 0 .. n(n+1)/2 with n tie-free pairs under H0."""
+    counts = [1] + [0] * (n * (n + 1) // 2)
+    top = 0
+    for k in range(1, n + 1):
+        top += k
+        for w in range(top, k - 1, -1):
+            counts[w] += counts[w - k]
+    total = float(2 ** n)
+    cdf, acc = [], 0
+    for count in counts:
+        acc += count
+        cdf.append(acc / total)
+    return cdf
+
+
+def wilcoxon_signed_rank(
+    baseline: Sequence[float],
+    current: Sequence[float],
+    exact_cache: Optional[Dict[int, List[float]]] = None
+) -> TestResult:
+    """
+    Two-sided Wilcoxon signed-rank test of current[i] against baseline[i].
+
+    Samples of different lengths are not paired and are not tested. Zero
+    differences are dropped (Wilcoxon's method).
+    """
+    if not baseline or len(baseline) != len(current):
+        return TestResult(None, None, None)
+    diffs = [c - b for b, c in zip(baseline, current) if c != b]
+    n = len(diffs)
+    if n == 0:
+        return TestResult(0.0, 1.0, 0.0)
+
+    ranks, tie_term = _rank([abs(d) for d in diffs])
+    w_plus = sum(r for r, d in zip(ranks, diffs) if d > 0)
+    total = n * (n + 1) / 2.0
+    effect = (2.0 * w_plus - total) / total
+
+    if tie_term == 0 and n <= EXACT_WILCOXON_MAX_N:
+        cache = exact_cache if exact_cache is not None else {}
+        cdf = cache.get(n)
+        if cdf is None:
+            cdf = cache[n] = _exact_signed_rank_cdf(n)
+        w_low = int(round(min(w_plus, total - w_plus)))
+        return TestResult(w_plus, min(1.0, 2.0 * cdf[w_low]), effect)
+
+    var_w = n * (n + 1) * (2 * n + 1) / 24.0 - tie_term / 48.0
+    if var_w <= 0:
+        return TestResult(w_plus, 1.0, effect)
+    z = (abs(w_plus - total / 2.0) - 0.5) / math.sqrt(var_w)
+    return TestResult(w_plus, min(1.0, 2.0 * normal_sf(max(z, 0.0))), effect)
+
+
+# ---------------------------------------------------------------------------
+# Batch interface
+# ---------------------------------------------------------------------------
+
+def run_tests(
+    pairs: Sequence[Tuple[Sequence[float], Sequence[float]]],
+    method: str = "mannwhitney"
+) -> List[TestResult]:
+    """
+    Run one significance test per (baseline_samples, current_samples) pair.
+
+    All pairs are evaluated in one call so that per-shape work (the exact U
+    distributions) is shared across the whole comparison set. "wilcoxon"
+    pairs the samples by position.
+    """
+    if method == "mannwhitney":
+        cache: Dict[Tuple[int, int], List[float]] = {}
+        return [mann_whitney_u(b, c, cache) for b, c in pairs]
+    if method == "welch":
+        return [welch_t_test(b, c) for b, c in pairs]
+    if method == "wilcoxon":
+        signed_rank_cache: Dict[int, List[float]] = {}
+        return [wilcoxon_signed_rank(b, c, signed_rank_cache) for b, c in pairs]
+    raise ValueError(f"Unknown statistical test: {method}")
+
+
+# ---------------------------------------------------------------------------
+# Outlier test against history
+# ---------------------------------------------------------------------------
+
+# Scale factor that makes the MAD a consistent estimator of the standard
+# deviation for normally distributed data.
+MAD_SCALE = 1.4826
+
+
+def median_mad(values: Sequence[float]) -> Tuple[float, float]:
+    """Median and scaled median absolute deviation of ``values``."""
+    center = statistics.median(values)
+    return center, MAD_SCALE * statistics.median(abs(v - center) for v in values)
+
+
+def outlier_test(history: Sequence[float], value: float) -> TestResult:
+    """
+    Test whether ``value`` is an outlier of the ``history`` distribution.
+
+    Uses a robust z-score (median / scaled MAD) so one unlucky historical run
+    does not widen the reference, with a Student-t reference on len - 1
+    degrees of freedom to stay conservative for short histories. Needs at
+    least three historical values.
+    """
+    if len(history) < 3:
+        return TestResult(None, None, None)
+    center, spread = median_mad(history)
+    if spread == 0:
+        if value == center:
+            return TestResult(0.0, 1.0, 0.0)
+        z = math.copysign(math.inf, value - center)
+        return TestResult(z, 0.0, z)
+    z = (value - center) / spread
+    return TestResult(z, t_sf_two_sided(z, len(history) - 1), z)
+
+
+# ---------------------------------------------------------------------------
+# Multiple-testing correction
+# ---------------------------------------------------------------------------
+
+def adjust_p_values(
+    p_values: Sequence[Optional[float]],
+    method: str = "bh"
+) -> List[Optional[float]]:
+    """
+    Adjust p-values for multiple testing.
+
+    "bh" gives Benjamini-Hochberg q-values (false discovery rate), "holm"
+    gives Holm step-down adjusted p-values (family-wise error rate). None
+    entries (benchmarks that were not tested) are skipped and do not count
+    towards the number of tests.
+    """
+    if method not in CORRECTIONS:
+        raise ValueError(f"Unknown multiple-testing correction: {method}")
+    tested = [i for i, p in enumerate(p_values) if p is not None]
+    m = len(tested)
+    adjusted: List[Optional[float]] = [None] * len(p_values)
+    if m == 0:
+        return adjusted
+
+    if method == "bh":
+        order = sorted(tested, key=lambda i: p_values[i], reverse=True)
+        running = 1.0
+        for rank, i in zip(range(m, 0, -1), order):
+            running = min(running, p_values[i] * m / rank)
+            adjusted[i] = running
+    else:
+        order = sorted(tested, key=lambda i: p_values[i])
+        running = 0.0
+        for rank, i in enumerate(order):
+            running = max(running, min(1.0, p_values[i] * (m - rank)))
+            adjusted[i] = running
+    return adjusted
+
+
+# ---------------------------------------------------------------------------
+# Bootstrap confidence intervals
+# ---------------------------------------------------------------------------
+
+def _bootstrap_chunk(
+    start: int,
+    pairs: Sequence[Tuple[Sequence[float], Sequence[float]]],
+    confidence: float,
+    resamples: int,
+    seed: int
+) -> List[Optional[Tuple[float, float]]]:
+    """Percentile speedup intervals for one contiguous chunk of pairs."""
+    tail = (1.0 - confidence) / 2.0
+    lo_index = int(math.floor(tail * (resamples - 1)))
+    hi_index = int(math.ceil((1.0 - tail) * (resamples - 1)))
+    median = statistics.median
+    intervals = []
+    for offset, (baseline, current) in enumerate(pairs):
+        nb, nc = len(baseline), len(current)
+        if nb < 2 or nc < 2:
+            intervals.append(None)
+            continue
+        # Seeded per benchmark so results do not depend on the chunking.
+        choices = random.Random(seed * 1000003 + start + offset).choices
+        ratios = []
+        for _ in range(resamples):
+            cur = median(choices(current, k=nc))
+            ratios.append(median(choices(baseline, k=nb)) / cur if cur > 0 else math.inf)
+        ratios.sort()
+        intervals.append((ratios[lo_index], ratios[hi_index]))
+    return intervals
+
+
+def bootstrap_speedup_ci(
+    pairs: Sequence[Tuple[Sequence[float], Sequence[float]]],
+    confidence: float = 0.95,
+    resamples: int = 1000,
+    seed: int = 0,
+    workers: Optional[int] = None
+) -> List[Optional[Tuple[float, float]]]:
+    """
+    Bootstrap a confidence interval for the speedup of every benchmark.
+
+    Speedup is median(baseline) / median(current), the same statistic the
+    comparator reports. Each (baseline_samples, current_samples) pair is
+    resampled ``resamples`` times; pairs with fewer than two samples on either
+    side get None. Suites of BOOTSTRAP_PARALLEL_MIN benchmarks or more are
+    split into contiguous chunks and resampled in a process pool (``workers``
+    defaults to the CPU count; 1 disables the pool).
+    """
+    pairs = [(list(b), list(c)) for b, c in pairs]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pairs) < BOOTSTRAP_PARALLEL_MIN:
+        return _bootstrap_chunk(0, pairs, confidence, resamples, seed)
+
+    chunk = -(-len(pairs) // (workers * 4))
+    starts = range(0, len(pairs), chunk)
+    intervals: List[Optional[Tuple[float, float]]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_bootstrap_chunk, start, pairs[start:start + chunk],
+                        confidence, resamples, seed)
+            for start in starts
+        ]
+        for future in futures:
+            intervals.extend(future.result())
+    return intervals
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+benchmark_table.py - Columnar result tables for very large comparisons
+
+Usage:
+    from benchmark_table import compare_tables, load_table
+
+    baseline = load_table("baseline.json")
+    current = load_table("current.json")
+    table = compare_tables(baseline, current, threshold=0.1)
+    table.counts()                              # {ChangeType.REGRESSION: 3, ...}
+    for c in table.rows(ChangeType.REGRESSION):  # BenchmarkComparison, lazily
+        print(c.name, c.change_percent)
+
+Features:
+- Benchmark names interned once per table; every benchmark is a row id
+- ResultColumns: a whole result file (every repetition sample and
+  aggregate) as (row, value) column pairs - what load_benchmarks returns as
+  BenchmarkRun objects, from which both those objects and a ResultTable are
+  derived; benchmark_parse_cache stores it as is
+- Metrics (times, throughput, user counters) as array('d') columns with NaN
+  for missing values; iteration and repetition counts as array('q')
+- Change, speedup and classification computed column by column, without a
+  Python object per benchmark
+- Comparison objects only materialized on demand (e.g. for report rows):
+  a ComparisonTable reads like a sequence of BenchmarkComparison, so
+  benchmark_compare.compare_benchmarks returns one in threshold-only mode
+  and its report and regression gate go through counts()/rows()
+"""
+
+from array import array
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+)
+
+from benchmark_comparison import BenchmarkComparison, ChangeType
+from benchmark_loader import TIME_FIELDS, BenchmarkRun, entry_metrics, load_entries
+
+NAN = float("nan")
+
+# Column holding cpu_time, else real_time: what the comparator calls time.
+TIME = "time"
+
+# ResultColumns key: (aggregate name, or None for repetition samples, metric).
+ColumnKey = Tuple[Optional[str], str]
+
+# Classification codes stored in ComparisonTable.kind.
+KINDS = (
+    ChangeType.IMPROVEMENT,
+    ChangeType.REGRESSION,
+    ChangeType.UNCHANGED,
+    ChangeType.NEW,
+    ChangeType.REMOVED,
+)
+IMPROVEMENT, REGRESSION, UNCHANGED, NEW, REMOVED = range(len(KINDS))
+
+
+def _median_by_row(rows: array, values: array, count: int) -> array:
+    """Per-row median of ``values`` (NaN ignored), rows given by ``rows``."""
+    result = array("d", [NAN]) * count
+    if len(rows) == count and all(r == i for i, r in enumerate(rows)):
+        # One sample per row (no repetitions): the samples are the medians.
+        return values
+    groups: Dict[int, List[float]] = {}
+    for row, value in zip(rows, values):
+        if value == value:
+            groups.setdefault(row, []).append(value)
+    for row, group in groups.items():
+        group.sort()
+        mid = len(group) // 2
+        result[row] = group[mid] if len(group) % 2 else (group[mid - 1] + group[mid]) / 2.0
+    return result
+
+
+class ResultTable:
+    """
+    One result file as columns.
+
+    ``names[i]`` is the run_name of row i. ``columns`` maps a metric to one
+    representative value per row: the median over repetitions, or the
+    reported median/mean aggregate when only aggregates were written (as
+    BenchmarkRun.value does). ``columns[TIME]`` is cpu_time, else real_time.
+    ``modules`` maps the rows whose results name their module to it.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.columns: Dict[str, array] = {}
+        self.modules: Dict[int, str] = {}
+        self.iterations = array("q")
+        self.repetitions = array("q")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict]) -> "ResultTable":
+        """Build a table from slimmed entries (see benchmark_loader.iter_benchmarks)."""
+        return ResultColumns.from_entries(entries).table()
+
+    @classmethod
+    def from_runs(cls, runs: Dict, value: Callable) -> "ResultTable":
+        """
+        A table with only the TIME column, from loaded runs (name -> run) and
+        ``value``, which gives the representative time of a run.
+        """
+        table = cls()
+        table.names = list(runs)
+        table.ids = {name: row for row, name in enumerate(table.names)}
+        table.iterations = array("q", bytes(8 * len(table.names)))
+        table.repetitions = array("q", bytes(8 * len(table.names)))
+        time = array("d")
+        for row, run in enumerate(runs.values()):
+            t = value(run)
+            time.append(NAN if t is None else float(t))
+            if getattr(run, "module", None):
+                table.modules[row] = run.module
+        table.columns[TIME] = time
+        return table
+
+    def select(self, rows: Sequence[int]) -> "ResultTable":
+        """A table of the given rows only, in that order."""
+        table = ResultTable()
+        table.names = [self.names[row] for row in rows]
+        table.ids = {name: i for i, name in enumerate(table.names)}
+        for key, column in self.columns.items():
+            table.columns[key] = array("d", (column[row] for row in rows))
+        table.modules = {i: self.modules[row] for i, row in enumerate(rows)
+                         if row in self.modules}
+        table.iterations = array("q", (self.iterations[row] for row in rows))
+        table.repetitions = array("q", (self.repetitions[row] for row in rows))
+        return table
+
+    def _fill(self, samples: Dict[str, Tuple[array, array]],
+              fallbacks: Dict[str, Dict[str, Tuple[array, array]]]):
+        """
+        Set the column of every metric from its repetition ``samples``
+        (rows, values) and, for rows without samples, the (rows, values) of
+        its median, else mean, aggregate in ``fallbacks``; then TIME.
+        """
+        count = len(self)
+        keys = dict.fromkeys(samples)
+        for aggregates in fallbacks.values():
+            keys.update(dict.fromkeys(aggregates))
+        for key in keys:
+            if key in samples:
+                rows, values = samples[key]
+                column = _median_by_row(rows, values, count)
+                if column is values:
+                    column = array("d", values)
+            else:
+                column = array("d", [NAN]) * count
+            for name in ("median", "mean"):
+                fallback = fallbacks.get(name, {}).get(key)
+                if fallback is None:
+                    continue
+                # Backwards: the last value reported for a row wins.
+                rows, values = fallback
+                for row, value in zip(reversed(rows), reversed(values)):
+                    if column[row] != column[row]:
+                        column[row] = value
+            self.columns[key] = column
+
+        time = array("d", [NAN]) * count
+        for key in reversed(TIME_FIELDS):
+            column = self.columns.get(key)
+            if column is not None:
+                time = array("d", (v if v == v else t for v, t in zip(column, time)))
+        self.columns[TIME] = time
+
+    def column(self, metric: str) -> array:
+        """Values of ``metric`` per row (NaN where missing)."""
+        column = self.columns.get(metric)
+        return column if column is not None else array("d", [NAN]) * len(self)
+
+
+class ResultColumns:
+    """
+    One result file as parsed: for repetition samples and for each
+    aggregate, the (rows, values) of every metric, in file order.
+
+    It holds what load_benchmarks holds as BenchmarkRun objects, without an
+    object per benchmark; runs() and table() derive either form.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.modules: Dict[int, str] = {}
+        self.repetitions = array("q")
+        self.columns: Dict[ColumnKey, Tuple[array, array]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict]) -> "ResultColumns":
+        """Collect slimmed entries, grouped like benchmark_loader.group_runs."""
+        parsed = cls()
+        for entry in entries:
+            parsed.add(entry)
+        return parsed
+
+    def add(self, entry: Dict):
+        """Fold one slimmed entry in, like BenchmarkRun.add_entry."""
+        if entry.get("error_occurred"):
+            return
+        name = entry.get("run_name", entry["name"])
+        row = self.ids.get(name)
+        if row is None:
+            row = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.repetitions.append(0)
+        if row not in self.modules and entry.get("module"):
+            self.modules[row] = entry["module"]
+        if entry.get("run_type") == "aggregate":
+            aggregate = entry.get("aggregate_name") or entry["name"][len(name) + 1:]
+        else:
+            aggregate = None
+            self.repetitions[row] += 1
+        for key, value in entry_metrics(entry):
+            pair = self.columns.get((aggregate, key))
+            if pair is None:
+                pair = self.columns[(aggregate, key)] = (array("q"), array("d"))
+            pair[0].append(row)
+            pair[1].append(value)
+
+    def runs(self) -> Dict[str, BenchmarkRun]:
+        """The BenchmarkRun objects load_benchmarks would return."""
+        runs = [BenchmarkRun(name, module=self.modules.get(row))
+                for row, name in enumerate(self.names)]
+        for (aggregate, key), (rows, values) in self.columns.items():
+            if aggregate is not None:
+                for row, value in zip(rows, values):
+                    runs[row].aggregates.setdefault(aggregate, {})[key] = value
+                continue
+            # Samples of one run are usually adjacent: slice them out.
+            start = 0
+            for end in range(1, len(rows) + 1):
+                if end < len(rows) and rows[end] == rows[start]:
+                    continue
+                samples = runs[rows[start]].samples
+                if key in samples:
+                    samples[key].extend(values[start:end])
+                else:
+                    samples[key] = values[start:end]
+                start = end
+        return {run.name: run for run in runs}
+
+    def table(self) -> ResultTable:
+        """The ResultTable of these results (representative values per row)."""
+        table = ResultTable()
+        table.names = self.names
+        table.ids = self.ids
+        table.modules = dict(self.modules)
+        table.repetitions = array("q", self.repetitions)
+        table.iterations = array("q", bytes(8 * len(self.names)))
+        samples: Dict[str, Tuple[array, array]] = {}
+        fallbacks: Dict[str, Dict[str, Tuple[array, array]]] = {"median": {}, "mean": {}}
+        for (aggregate, key), pair in self.columns.items():
+            if aggregate is None:
+                samples[key] = pair
+            elif aggregate in fallbacks:
+                fallbacks[aggregate][key] = pair
+        table._fill(samples, fallbacks)
+        return table
+
+
+def _legacy_time(result) -> Optional[float]:
+    """Time of one result of a legacy name -> result document."""
+    if isinstance(result, dict):
+        for key in TIME_FIELDS:
+            value = result.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+    return None
+
+
+def table_of(loaded: Union[ResultColumns, Dict]) -> ResultTable:
+    """ResultTable of what load_entries returned: columns or a legacy document."""
+    if isinstance(loaded, ResultColumns):
+        return loaded.table()
+    return ResultTable.from_runs(loaded, _legacy_time)
+
+
+def load_table(filepath: str, context: Optional[Dict] = None,
+               pattern: Optional[str] = None) -> ResultTable:
+    """
+    The times of a result file as a ResultTable, streamed without a
+    BenchmarkRun per benchmark (see benchmark_loader.load_benchmarks for
+    ``context`` and ``pattern``).
+    """
+    return table_of(load_entries(filepath, ResultColumns.from_entries, context, pattern))
+
+
+class ComparisonTable:
+    """
+    Aligned baseline/current columns of one metric and their classification.
+
+    Indexing and iteration materialize a fresh BenchmarkComparison per row;
+    changes made to those objects are not kept in the table; fields set
+    through annotate() are.
+    """
+
+    def __init__(self, metric: str, higher_is_better: bool):
+        self.metric = metric
+        self.higher_is_better = higher_is_better
+        self.names: List[str] = []
+        self.baseline = array("d")
+        self.current = array("d")
+        self.change = array("d")
+        self.speedup = array("d")
+        self.kind = array("b")
+        self.annotations: Dict[int, Dict] = {}     # row -> extra fields, sparse
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("comparison table index out of range")
+        return self._row(index)
+
+    def __iter__(self) -> Iterator[BenchmarkComparison]:
+        return self.rows()
+
+    def annotate(self, index: int, **fields):
+        """Set BenchmarkComparison fields (e.g. cache_level) of one row."""
+        self.annotations.setdefault(index, {}).update(fields)
+
+    def extend(self, other: "ComparisonTable"):
+        """Append the rows of another table of the same metric."""
+        offset = len(self)
+        self.annotations.update((offset + i, f) for i, f in other.annotations.items())
+        self.names.extend(other.names)
+        for column in ("baseline", "current", "change", "speedup", "kind"):
+            getattr(self, column).extend(getattr(other, column))
+
+    def counts(self) -> Dict[ChangeType, int]:
+        """Number of rows per classification."""
+        tally = [0] * len(KINDS)
+        for code in self.kind:
+            tally[code] += 1
+        return dict(zip(KINDS, tally))
+
+    def rows(self, kind: Optional[ChangeType] = None) -> Iterator[BenchmarkComparison]:
+        """Materialize rows (optionally only one classification) one at a time."""
+        code = KINDS.index(kind) if kind is not None else None
+        for i, k in enumerate(self.kind):
+            if code is None or k == code:
+                yield self._row(i)
+
+    def _row(self, i: int) -> BenchmarkComparison:
+        base, cur = self.baseline[i], self.current[i]
+        c = BenchmarkComparison(
+            name=self.names[i],
+            baseline_time=base if base == base else None,
+            current_time=cur if cur == cur else None,
+            change_percent=self.change[i],
+            change_type=KINDS[self.kind[i]],
+            speedup=self.speedup[i],
+            metric=None if self.metric == TIME else self.metric,
+            higher_is_better=self.higher_is_better,
+        )
+        for field, value in self.annotations.get(i, {}).items():
+            setattr(c, field, value)
+        return c
+
+
+def compare_tables(
+    baseline: ResultTable,
+    current: ResultTable,
+    threshold: float = 0.1,
+    metric: str = TIME,
+    higher_is_better: bool = False
+) -> ComparisonTable:
+    """
+    Compare one metric of two tables, classifying every benchmark like
+    benchmark_compare.compare_benchmarks does in threshold-only mode.
+
+    Rows are sorted by name. Benchmarks missing the metric on both sides are
+    dropped; on one side only, they are NEW or REMOVED.
+    """
+    base_column, cur_column = baseline.column(metric), current.column(metric)
+    base_ids, cur_ids = baseline.ids, current.ids
+    # Lists rather than sets: a set of a million names costs far more.
+    names = baseline.names + [name for name in current.names if name not in base_ids]
+    names.sort()
+
+    table = ComparisonTable(metric, higher_is_better)
+    table.baseline = array("d", (
+        base_column[base_ids[n]] if n in base_ids else NAN for n in names
+    ))
+    table.current = array("d", (
+        cur_column[cur_ids[n]] if n in cur_ids else NAN for n in names
+    ))
+
+    dropped = {i for i, (b, c) in enumerate(zip(table.baseline, table.current))
+               if b != b and c != c}
+    if dropped:
+        keep = [i for i in range(len(names)) if i not in dropped]
+        names = [names[i] for i in keep]
+        table.baseline = array("d", (table.baseline[i] for i in keep))
+        table.current = array("d", (table.current[i] for i in keep))
+    table.names = names
+
+    change = array("d", bytes(8 * len(names)))
+    speedup = array("d", [1.0]) * len(names)
+    kind = array("b", [UNCHANGED]) * len(names)
+    sign = -1.0 if higher_is_better else 1.0
+    for i, (b, c) in enumerate(zip(table.baseline, table.current)):
+        if b != b:
+            kind[i] = NEW
+        elif c != c:
+            kind[i] = REMOVED
+        elif b > 0:
+            delta = (c - b) / b
+            change[i] = delta
+            if higher_is_better:
+                speedup[i] = c / b
+            else:
+                speedup[i] = b / c if c > 0 else 0.0
+            worse = sign * delta
+            if worse > threshold:
+                kind[i] = REGRESSION
+            elif worse < -threshold:
+                kind[i] = IMPROVEMENT
+    table.change, table.speedup, table.kind = change, speedup, kind
+    return table
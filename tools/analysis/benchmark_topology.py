@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+benchmark_topology.py - CPU topology for placing benchmarks on cores
+
+Usage:
+    from benchmark_topology import read_topology
+
+    topology = read_topology()          # CPUs this process may run on
+    for core in topology.cores:
+        core.cpu, core.siblings, core.llc
+    topology.llc_bytes                  # smallest last-level cache, or None
+
+    # or from the command line:
+    python benchmark_topology.py
+
+Features:
+- Reads /sys/devices/system/cpu: online CPUs, SMT siblings
+  (topology/thread_siblings_list) and the CPUs sharing each last-level
+  cache (cache/index*/shared_cpu_list of the highest level), and the size
+  of that cache
+- One Core per physical core: the CPU to pin to and all its hardware
+  threads, so a scheduler that places one job per Core never puts two
+  benchmarks on SMT siblings
+- Limited to the CPUs of the current affinity mask (cgroups, taskset)
+- None where sysfs or sched_setaffinity is unavailable (macOS), so callers
+  fall back to running one job at a time
+"""
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+SYSFS_CPU = "/sys/devices/system/cpu"
+
+
+@dataclass(frozen=True)
+class Core:
+    """A physical core: the CPU jobs are pinned to and all of its siblings."""
+    cpu: int
+    siblings: FrozenSet[int]
+    llc: int                            # lowest CPU sharing the last-level cache
+
+
+@dataclass
+class CpuTopology:
+    cores: List[Core]
+    llc_bytes: Optional[int] = None     # size of the smallest last-level cache
+
+    @property
+    def llcs(self) -> List[int]:
+        return sorted({core.llc for core in self.cores})
+
+    def cores_of(self, llc: int) -> List[Core]:
+        return [core for core in self.cores if core.llc == llc]
+
+
+def parse_cpu_list(text: str) -> Set[int]:
+    """CPUs of a sysfs list such as "0-3,8,10-11"."""
+    cpus: Set[int] = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def parse_cache_size(text: str) -> int:
+    """Bytes of a sysfs cache size such as "32K"."""
+    text = text.strip()
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text or 0)
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text()
+    except OSError:
+        return None
+
+
+def _llc(cpu_dir: Path) -> Tuple[Optional[Set[int]], Optional[int]]:
+    """CPUs sharing the highest-level cache of a CPU, and its size if known."""
+    best_level, shared, size = 0, None, None
+    for index in sorted(cpu_dir.glob("cache/index*")):
+        level, cpus = _read(index / "level"), _read(index / "shared_cpu_list")
+        if level is None or cpus is None:
+            continue
+        if (_read(index / "type") or "").strip() == "Instruction":
+            continue
+        if int(level) > best_level:
+            best_level, shared = int(level), parse_cpu_list(cpus)
+            size_text = _read(index / "size")
+            size = parse_cache_size(size_text) if size_text else None
+    return shared, size
+
+
+def read_topology(sysfs: str = SYSFS_CPU, allowed: Optional[Set[int]] = None) -> Optional[CpuTopology]:
+    """
+    Physical cores among the ``allowed`` CPUs (default: this process's
+    affinity mask), or None where the topology cannot be read.
+    """
+    if allowed is None:
+        if not hasattr(os, "sched_getaffinity"):
+            return None
+        allowed = os.sched_getaffinity(0)
+    root = Path(sysfs)
+    online = _read(root / "online")
+    if online is None:
+        return None
+    cpus = parse_cpu_list(online) & set(allowed)
+
+    cores: Dict[FrozenSet[int], Core] = {}
+    llc_sizes: Set[int] = set()
+    for cpu in sorted(cpus):
+        cpu_dir = root / f"cpu{cpu}"
+        siblings_text = _read(cpu_dir / "topology" / "thread_siblings_list")
+        siblings = frozenset(parse_cpu_list(siblings_text) if siblings_text else {cpu})
+        if siblings in cores:
+            continue
+        llc, llc_size = _llc(cpu_dir)
+        if llc_size:
+            llc_sizes.add(llc_size)
+        cores[siblings] = Core(
+            cpu=min(siblings & cpus),
+            siblings=siblings,
+            llc=min(llc) if llc else 0,
+        )
+    if not cores:
+        return None
+    return CpuTopology(sorted(cores.values(), key=lambda core: core.cpu),
+                       min(llc_sizes) if llc_sizes else None)
+
+
+def main():
+    topology = read_topology()
+    if topology is None:
+        print("CPU topology not available on this platform")
+        return
+    size = f", {topology.llc_bytes >> 20} MiB" if topology.llc_bytes else ""
+    for llc in topology.llcs:
+        cores = topology.cores_of(llc)
+        print(f"LLC {llc}: {len(cores)} core(s){size}")
+        for core in cores:
+            siblings = ",".join(map(str, sorted(core.siblings)))
+            print(f"  cpu {core.cpu:3}  threads {siblings}")
+
+
+if __name__ == "__main__":
+    main()